@@ -0,0 +1,152 @@
+"""
+Load generator for ``ffp-serve``.
+
+Sends queries with words sampled from a word list or the vocabulary of the served embeddings to
+a local ``ffp-serve`` instance over concurrent keep-alive connections. Reports the throughput
+and the latency percentiles seen by the clients, followed by the counters of the server.
+
+Usage::
+
+    ffp-serve embeddings.fifu --port 8000 &
+    python benchmarks/serve_load.py --port 8000 --embeddings embeddings.fifu \\
+        --endpoint similarity --concurrency 64 --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from finalfusion import load_finalfusion
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Generate load for a local ffp-serve instance.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix",
+                        help="Connect to a Unix socket instead of a port.")
+    words = parser.add_mutually_exclusive_group(required=True)
+    words.add_argument("--embeddings",
+                       help="Sample words from the vocab of these embeddings.")
+    words.add_argument("--words", help="Sample words from this file.")
+    parser.add_argument("--endpoint",
+                        choices=["lookup", "similarity", "analogy"],
+                        default="lookup")
+    parser.add_argument("--concurrency",
+                        type=int,
+                        default=64,
+                        help="Number of concurrent connections.")
+    parser.add_argument("--requests",
+                        type=int,
+                        default=10000,
+                        help="Total number of requests.")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                  method: str, path: str,
+                  body: Optional[Dict]) -> Tuple[int, Dict]:
+    """
+    Send a request over a keep-alive connection and read the JSON response.
+    """
+    payload = b"" if body is None else json.dumps(body).encode("utf-8")
+    writer.write(f"{method} {path} HTTP/1.1\r\n"
+                 "Host: localhost\r\n"
+                 "Content-Type: application/json\r\n"
+                 f"Content-Length: {len(payload)}\r\n"
+                 "\r\n".encode("latin-1") + payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def connect(args: argparse.Namespace
+                  ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """
+    Open a connection to the server.
+    """
+    if args.unix is not None:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+def make_queries(args: argparse.Namespace) -> List[Dict]:
+    """
+    Sample the query bodies.
+    """
+    if args.embeddings is not None:
+        words = load_finalfusion(args.embeddings, mmap=True,
+                                 mmap_vocab=True).vocab.words
+    else:
+        with open(args.words, encoding="utf-8") as inf:
+            words = [line.strip() for line in inf if line.strip()]
+    rng = np.random.default_rng(args.seed)
+    if args.endpoint == "analogy":
+        samples = rng.choice(len(words), (args.requests, 3))
+        return [{
+            "words": [words[idx] for idx in sample],
+            "k": args.k
+        } for sample in samples]
+    samples = rng.choice(len(words), args.requests)
+    if args.endpoint == "lookup":
+        return [{"word": words[idx]} for idx in samples]
+    return [{"word": words[idx], "k": args.k} for idx in samples]
+
+
+async def run(args: argparse.Namespace):  # pylint: disable=missing-function-docstring
+    queries = make_queries(args)
+    path = f"/{args.endpoint}"
+    latencies = []  # type: List[float]
+    statuses = {}  # type: Dict[int, int]
+
+    async def client(offset: int):
+        reader, writer = await connect(args)
+        try:
+            for query in queries[offset::args.concurrency]:
+                start = time.perf_counter()
+                status, _ = await request(reader, writer, "POST", path, query)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(offset)
+                           for offset in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    print(f"requests\t{len(latencies)}")
+    print(f"statuses\t{statuses}")
+    print(f"throughput\t{len(latencies) / elapsed:.0f} requests/s")
+    for percentile in [50, 90, 99]:
+        print(f"p{percentile}\t\t"
+              f"{np.percentile(latencies_ms, percentile):.2f} ms")
+    print(f"max\t\t{latencies_ms.max():.2f} ms")
+    reader, writer = await connect(args)
+    try:
+        _, stats = await request(reader, writer, "GET", "/stats", None)
+    finally:
+        writer.close()
+    print(json.dumps(stats, indent=2))
+
+
+def main():  # pylint: disable=missing-function-docstring
+    asyncio.run(run(parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Thread scaling of batched embedding lookups.
+
+Looks up batches of known and unknown words with ``Embeddings.embedding_batch`` from a thread
+pool and reports the throughput for different numbers of threads. With NdArray storage, rows
+are gathered and summed without holding the GIL, so throughput should grow with the number of
+threads up to the number of cores.
+
+Usage::
+
+    python benchmarks/thread_scaling.py embeddings.fifu --threads 1 2 4 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from finalfusion import load_finalfusion
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure the thread scaling of batched embedding lookups.")
+    parser.add_argument("embeddings", help="Embeddings in finalfusion format.")
+    parser.add_argument("--threads",
+                        type=int,
+                        nargs="+",
+                        default=[1, 2, 4, 8],
+                        help="Numbers of threads to measure.")
+    parser.add_argument("--batch-size",
+                        type=int,
+                        default=1024,
+                        help="Number of words per batch.")
+    parser.add_argument("--batches",
+                        type=int,
+                        default=256,
+                        help="Number of batches per measurement.")
+    parser.add_argument("--oov",
+                        type=float,
+                        default=0.5,
+                        help="Fraction of unknown words in the batches.")
+    parser.add_argument("--mmap",
+                        action="store_true",
+                        help="Memory map the storage.")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def main():  # pylint: disable=missing-function-docstring
+    args = parse_args()
+    embeddings = load_finalfusion(args.embeddings, mmap=args.mmap)
+    rng = np.random.default_rng(args.seed)
+    words = embeddings.vocab.words
+    batches = []
+    for _ in range(args.batches):
+        sample = rng.choice(len(words), args.batch_size)
+        oov = rng.random(args.batch_size) < args.oov
+        batches.append([
+            words[idx] + "#" if unknown else words[idx]
+            for idx, unknown in zip(sample, oov)
+        ])
+
+    def lookup(batch):
+        return embeddings.embedding_batch(batch)[1].sum()
+
+    # warm up, e.g. to page in memory-mapped storage
+    for batch in batches:
+        lookup(batch)
+    print("threads\twords/s\tspeedup")
+    baseline = None
+    for n_threads in args.threads:
+        with ThreadPoolExecutor(n_threads) as executor:
+            start = time.perf_counter()
+            list(executor.map(lookup, batches))
+            elapsed = time.perf_counter() - start
+        throughput = args.batches * args.batch_size / elapsed
+        if baseline is None:
+            baseline = throughput
+        print(f"{n_threads}\t{throughput:.0f}\t{throughput / baseline:.2f}")
+
+
+if __name__ == '__main__':
+    main()
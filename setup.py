@@ -32,7 +32,9 @@ abs_path = pathlib.Path(__file__).absolute()
 c_paths = [
     abs_path / "src/finalfusion/subword/hash_indexers.c",
     abs_path / "src/finalfusion/subword/ngrams.c",
-    abs_path / "src/finalfusion/subword/explicit_indexer.c"
+    abs_path / "src/finalfusion/subword/explicit_indexer.c",
+    abs_path / "src/finalfusion/subword/lookup.c",
+    abs_path / "src/finalfusion/vocab/items.c"
 ]
 # cython is needed if not all extensions have been cythonized
 need_cython = not all(map(os.path.exists, c_paths))
@@ -60,7 +62,11 @@ if need_cython or force or annotate:
     explicit_indexer = Extension(
         "finalfusion.subword.explicit_indexer",
         ["src/finalfusion/subword/explicit_indexer.pyx"])
-    extensions = cythonize([hash_indexers, ngrams, explicit_indexer], force=force)
+    lookup = Extension("finalfusion.subword.lookup",
+                       ["src/finalfusion/subword/lookup.pyx"])
+    items = Extension("finalfusion.vocab.items",
+                      ["src/finalfusion/vocab/items.pyx"])
+    extensions = cythonize([hash_indexers, ngrams, explicit_indexer, lookup, items], force=force)
 else:
     # sdist should include the C files so Cython isn't required
     hash_indexers = Extension(
@@ -72,7 +78,11 @@ else:
     explicit_indexer = Extension(
         "finalfusion.subword.explicit_indexer",
         ["src/finalfusion/subword/explicit_indexer.c"])
-    extensions = [hash_indexers, ngrams, explicit_indexer]
+    lookup = Extension("finalfusion.subword.lookup",
+                       ["src/finalfusion/subword/lookup.c"])
+    items = Extension("finalfusion.vocab.items",
+                      ["src/finalfusion/vocab/items.c"])
+    extensions = [hash_indexers, ngrams, explicit_indexer, lookup, items]
 
 install_requires = ["numpy", "toml"]
 if sys.version_info.major == 3 and sys.version_info.minor == 6:
@@ -109,6 +119,7 @@ setup(name='finalfusion',
           'ffp-similar=finalfusion.scripts.similar:main',
           'ffp-analogy=finalfusion.scripts.analogy:main',
           'ffp-select=finalfusion.scripts.select:main',
+          'ffp-serve=finalfusion.scripts.serve:main',
       ]),
       version="0.7.0-pre"
       )
@@ -0,0 +1,92 @@
+"""
+Batched embedding lookups.
+"""
+from typing import List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from finalfusion.storage import Storage, NdArray
+from finalfusion.subword.lookup import sum_rows
+from finalfusion.vocab import Vocab, SubwordVocab
+
+
+def _batch_segments(vocab: Vocab, words: Sequence[str]
+                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the storage rows of a batch of words as segments.
+
+    The rows of the i-th word are ``indices[indptr[i]:indptr[i + 1]]``. A known word has a
+    single row, an unknown word has the rows of its subwords. Words that can't be represented
+    have empty segments. ``normalize`` marks the segments of unknown words.
+    """
+    known_rows, known_indices, oov_rows, oov_words = _split_known(
+        vocab.word_index, words)
+    counts = np.zeros(len(words), dtype=np.int64)
+    counts[known_rows] = 1
+    normalize = np.zeros(len(words), dtype=np.uint8)
+    if oov_rows and isinstance(vocab, SubwordVocab):
+        oov_indptr, oov_indices = vocab.subword_indices_batch(oov_words)
+        oov_indptr = oov_indptr.astype(np.int64)
+        counts[oov_rows] = np.diff(oov_indptr)
+        normalize[oov_rows] = 1
+    else:
+        oov_indptr = np.zeros(len(oov_rows) + 1, dtype=np.int64)
+        oov_indices = np.zeros(0, dtype=np.uint64)
+    indptr = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    indices = np.empty(indptr[-1], dtype=np.uint64)
+    indices[indptr[known_rows]] = known_indices
+    # move the subword indices of each unknown word to its segment
+    oov_starts = indptr[oov_rows] - oov_indptr[:-1]
+    indices[np.repeat(oov_starts, counts[oov_rows]) +
+            np.arange(len(oov_indices))] = oov_indices
+    return indptr, indices, normalize
+
+
+def _split_known(word_index: Mapping[str, int], words: Sequence[str]
+                 ) -> Tuple[List[int], List[int], List[int], List[str]]:
+    """
+    Split a batch of words into known and unknown words.
+
+    Returns the batch rows and vocabulary indices of known words and the batch rows and
+    unknown words.
+    """
+    known_rows, known_indices = [], []
+    oov_rows, oov_words = [], []
+    for row, word in enumerate(words):
+        idx = word_index.get(word)
+        if idx is not None:
+            known_rows.append(row)
+            known_indices.append(idx)
+        else:
+            oov_rows.append(row)
+            oov_words.append(word)
+    return known_rows, known_indices, oov_rows, oov_words
+
+
+def _compose_rows(storage: Storage, indptr: np.ndarray, indices: np.ndarray,
+                  normalize: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """
+    Sum the storage rows of each segment into the corresponding row of ``out``.
+
+    Sums of segments marked in ``normalize`` are l2-normalized, rows of empty segments are
+    left untouched. Float32 :class:`~finalfusion.storage.ndarray.NdArray` storage is summed
+    by the compiled lookup kernel without holding the GIL, other storage types are gathered at
+    once and summed through a segmented reduction. Returns the mask of rows that hold an
+    embedding.
+    """
+    mask = indptr[1:] != indptr[:-1]  # type: np.ndarray
+    if isinstance(storage, NdArray) and storage.dtype == np.float32 and \
+            storage.flags.c_contiguous and out.dtype == np.float32 and \
+            out.flags.c_contiguous:
+        sum_rows(storage, indptr.astype(np.uint64), indices, normalize, out)
+    elif mask.any():
+        rows = np.asarray(storage[indices])
+        sums = np.add.reduceat(rows, indptr[:-1][mask].astype(np.intp), axis=0)
+        subword = normalize[mask] != 0
+        sums[subword] /= np.linalg.norm(sums[subword], axis=1, keepdims=True)
+        out[mask] = sums
+    return mask
+
+
+__all__ = []  # type: List[str]
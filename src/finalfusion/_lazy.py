@@ -0,0 +1,108 @@
+"""
+Lazy loading of the chunks of finalfusion files.
+"""
+import threading
+from os import PathLike
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from finalfusion.io import Chunk, ChunkIdentifier, FinalfusionFormatError, Header, \
+    _read_chunk_header
+from finalfusion.ivf import IVFIndex
+from finalfusion.metadata import Metadata
+from finalfusion.norms import Norms
+from finalfusion.storage import NdArray, QuantizedArray
+from finalfusion.vocab import SimpleVocab, FinalfusionBucketVocab, FastTextVocab, ExplicitVocab
+
+# Vocabulary types by the identifier of their chunk.
+_VOCAB_TYPES = {
+    ChunkIdentifier.SimpleVocab: SimpleVocab,
+    ChunkIdentifier.BucketSubwordVocab: FinalfusionBucketVocab,
+    ChunkIdentifier.FastTextSubwordVocab: FastTextVocab,
+    ChunkIdentifier.ExplicitSubwordVocab: ExplicitVocab,
+}  # type: Dict[ChunkIdentifier, Any]
+
+# Storage types by the identifier of their chunk.
+_STORAGE_TYPES = {
+    ChunkIdentifier.NdArray: NdArray,
+    ChunkIdentifier.QuantizedArray: QuantizedArray,
+}  # type: Dict[ChunkIdentifier, Any]
+
+
+class _LazyChunks:
+    """
+    Offset table of the chunks of a finalfusion file.
+
+    The chunk headers are scanned once, chunks are read from their offsets when they are loaded.
+    """
+    def __init__(self, file: Union[str, bytes, int, PathLike], mmap: bool,
+                 mmap_vocab: bool):
+        self._offsets = {}  # type: Dict[ChunkIdentifier, int]
+        with open(file, 'rb') as inf:
+            Header.read_chunk(inf)
+            chunk_header = _read_chunk_header(inf)
+            while chunk_header is not None:
+                chunk_id, chunk_size = chunk_header
+                if chunk_id is not None:
+                    self._offsets.setdefault(chunk_id, inf.tell())
+                inf.seek(chunk_size, 1)
+                chunk_header = _read_chunk_header(inf)
+            self.origin = inf.name
+        self._loaders = {
+            "metadata": [(ChunkIdentifier.Metadata, Metadata.read_chunk)],
+            "vocab": list(_VOCAB_TYPES.items()),
+            "storage": list(_STORAGE_TYPES.items()),
+            "norms": [(ChunkIdentifier.NdNorms, Norms.read_chunk)],
+            "similarity_index": [(ChunkIdentifier.IVFIndex, IVFIndex)],
+        }  # type: Dict[str, List[Tuple[ChunkIdentifier, Any]]]
+        self._mmap = {
+            "vocab": mmap_vocab,
+            "storage": mmap,
+            "similarity_index": mmap
+        }
+        for chunk in ["vocab", "storage"]:
+            if not any(chunk_id in self._offsets
+                       for chunk_id, _ in self._loaders[chunk]):
+                raise FinalfusionFormatError(f'File has no {chunk} chunk')
+        self._pending = set(self._loaders)
+        self._lock = threading.Lock()
+
+    def load_into(self, target: Any, chunk: str):
+        """
+        Load a pending chunk into the ``_<chunk>`` attribute of ``target``.
+
+        Chunks that were loaded or discarded are not pending anymore, so accessing them
+        doesn't take the lock.
+        """
+        if chunk not in self._pending:
+            return
+        with self._lock:
+            if chunk in self._pending:
+                setattr(target, f"_{chunk}", self.load(chunk))
+                self._pending.discard(chunk)
+
+    def discard(self, chunk: str):
+        """
+        Don't load a pending chunk, e.g. because it is replaced.
+        """
+        with self._lock:
+            self._pending.discard(chunk)
+
+    def load(self, chunk: str) -> Optional[Chunk]:
+        """
+        Read the first chunk of the given kind, return None if the file has no such chunk.
+        """
+        for chunk_id, loader in self._loaders[chunk]:
+            offset = self._offsets.get(chunk_id)
+            if offset is None:
+                continue
+            with open(self.origin, 'rb') as inf:
+                inf.seek(offset)
+                if chunk in self._mmap:
+                    loaded = loader.load(inf, self._mmap[chunk])  # type: Chunk
+                else:
+                    loaded = loader(inf)
+                return loaded
+        return None
+
+
+__all__ = []  # type: List[str]
@@ -0,0 +1,476 @@
+"""
+Top-k similarity queries over the rows of a storage.
+"""
+import abc
+from dataclasses import field, dataclass
+from typing import List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from finalfusion.ivf import IVFIndex, _recall
+from finalfusion.storage import Storage, QuantizedArray
+from finalfusion.vocab import Vocab
+
+# Number of storage rows that are scored by one matrix multiplication in similarity queries
+# if no memory budget is set.
+_SIMILARITY_BLOCK_ROWS = 16384
+
+
+@dataclass(order=True)
+class SimilarityResult:
+    """
+    Container for a Similarity result.
+
+    The word can be accessed through ``result.word``, the similarity through ``result.similarity``.
+    """
+    word: str = field(compare=False)
+    similarity: float
+
+
+class _SimilarityQueries(abc.ABC):
+    """
+    Similarity queries of :class:`~finalfusion.embeddings.Embeddings`.
+    """
+    @property
+    @abc.abstractmethod
+    def dims(self) -> int:
+        """
+        Get the embedding dimensionality.
+        """
+    @property
+    @abc.abstractmethod
+    def storage(self) -> Storage:
+        """
+        Get the storage.
+        """
+    @property
+    @abc.abstractmethod
+    def vocab(self) -> Vocab:
+        """
+        Get the vocabulary.
+        """
+    @property
+    @abc.abstractmethod
+    def similarity_index(self) -> Optional[IVFIndex]:
+        """
+        Get the similarity index, None if similarity queries are exact.
+        """
+    @property
+    @abc.abstractmethod
+    def similarity_memory_budget(self) -> Optional[int]:
+        """
+        Get the memory budget of exact similarity queries in bytes.
+        """
+    @abc.abstractmethod
+    def embedding(self,
+                  word: str,
+                  out: Optional[np.ndarray] = None,
+                  default: Optional[np.ndarray] = None
+                  ) -> Optional[np.ndarray]:
+        """
+        Get the embedding of a word, ``default`` if it can't be represented.
+        """
+    def similarity_index_recall(self,
+                                queries: np.ndarray,
+                                k: int = 10,
+                                skips: Optional[Sequence[Set[str]]] = None
+                                ) -> float:
+        """
+        Measure the recall of the similarity index.
+
+        The ``k`` nearest neighbours retrieved through :attr:`~Embeddings.similarity_index` are
+        compared to the exact ``k`` nearest neighbours.
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            The query matrix with shape ``(n_queries, dims)``.
+        k : int
+            The number of neighbors per query, defaults to 10.
+        skips : Sequence[Set[str]], optional
+            One set of strings per query that should not be considered as neighbours.
+
+        Returns
+        -------
+        recall : float
+            The fraction of exact nearest neighbours that were retrieved through the index.
+
+        Raises
+        ------
+        ValueError
+            If no index is set, the queries are not 2-dimensional with ``dims`` columns or the
+            number of skip sets does not match the number of queries.
+        """
+        if self.similarity_index is None:
+            raise ValueError("embeddings have no similarity index")
+        queries, skip_indices = self._prepare_similarity_batch(queries, skips)
+        approx_indices, _ = self._similarity_batch(queries, k, skip_indices)
+        exact_indices, exact_sims = self._exact_similarity_batch(
+            queries, k, skip_indices)
+        return _recall(approx_indices, exact_indices, exact_sims)
+
+    def analogy(  # pylint: disable=too-many-arguments
+            self,
+            word1: str,
+            word2: str,
+            word3: str,
+            k: int = 1,
+            skip: Optional[Set[str]] = None
+    ) -> Optional[List['SimilarityResult']]:
+        """
+        Perform an analogy query.
+
+        This method returns words that are close in vector space the analogy
+        query `word1` is to `word2` as `word3` is to `?`. More concretely,
+        it searches embeddings that are similar to:
+
+        ``embedding(word2) - embedding(word1) + embedding(word3)``
+
+        Words specified in ``skip`` are not considered as answers. If ``skip``
+        is None, the query words ``word1``, ``word2`` and ``word3`` are
+        excluded.
+
+        At most, ``k`` results are returned. ``None`` is returned when no
+        embedding could be computed for any of the tokens.
+
+        Parameters
+        ----------
+        word1 : str
+            Word1 is to...
+        word2 : str
+            word2 like...
+        word3 : str
+            word3 is to the return value
+        skip : Set[str]
+            Set of strings which should not be considered as answers. Defaults
+            to ``None`` which excludes the query strings. To allow the query
+            strings as answers, pass an empty set.
+        k : int
+            Number of answers to return, defaults to 1.
+
+        Returns
+        -------
+        answers : List[SimilarityResult]
+            List of answers.
+        """
+        embed_a = self.embedding(word1)
+        embed_b = self.embedding(word2)
+        embed_c = self.embedding(word3)
+        if embed_a is None or embed_b is None or embed_c is None:
+            return None
+        diff = embed_b - embed_a
+        embed_d = embed_c + diff
+        embed_d /= np.linalg.norm(embed_d)
+        return self._similarity(
+            embed_d, k, {word1, word2, word3} if skip is None else skip)
+
+    def word_similarity(self, query: str,
+                        k: int = 10) -> Optional[List['SimilarityResult']]:
+        """
+        Retrieves the nearest neighbors of the query string.
+
+        The similarity between the embedding of the query and other embeddings
+        is defined by the dot product of the embeddings. If the vectors are
+        unit vectors, this is the cosine similarity.
+
+        At most, ``k`` results are returned.
+
+        Parameters
+        ----------
+        query : str
+            The query string
+        k : int
+            The number of neighbors to return, defaults to 10.
+
+        Returns
+        -------
+        neighbours : List[Tuple[str, float], optional
+            List of tuples with neighbour and similarity measure. None if no
+            embedding can be found for ``query``.
+        """
+        embed = self.embedding(query)
+        if embed is None:
+            return None
+        return self._similarity(embed, k, {query})
+
+    def embedding_similarity(self,
+                             query: np.ndarray,
+                             k: int = 10,
+                             skip: Optional[Set[str]] = None
+                             ) -> Optional[List['SimilarityResult']]:
+        """
+        Retrieves the nearest neighbors of the query embedding.
+
+        The similarity between the query embedding and other embeddings is
+        defined by the dot product of the embeddings. If the vectors are unit
+        vectors, this is the cosine similarity.
+
+        At most, ``k`` results are returned.
+
+        Parameters
+        ----------
+        query : str
+            The query array.
+        k : int
+            The number of neighbors to return, defaults to 10.
+        skip : Set[str], optional
+            Set of strings that should not be considered as neighbours.
+
+        Returns
+        -------
+        neighbours : List[Tuple[str, float], optional
+            List of tuples with neighbour and similarity measure. None if no
+            embedding can be found for ``query``.
+        """
+        return self._similarity(query, k, set() if skip is None else skip)
+
+    def embedding_similarity_batch(self,
+                                   queries: np.ndarray,
+                                   k: int = 10,
+                                   skips: Optional[Sequence[Set[str]]] = None
+                                   ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retrieves the nearest neighbors of a batch of query embeddings.
+
+        The similarity between the query embeddings and other embeddings is defined by the dot
+        product of the embeddings. If the vectors are unit vectors, this is the cosine
+        similarity.
+
+        The similarities of all queries are computed through one matrix multiplication per
+        block of vocabulary rows, the ``k`` best candidates are kept per query. The block size
+        is bounded by :attr:`~Embeddings.similarity_memory_budget`.
+
+        At most, ``k`` results are returned per query. If fewer than ``k`` candidates remain
+        after skipping, the remaining entries are ``None`` with similarity ``-inf``.
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            The query matrix with shape ``(n_queries, dims)``.
+        k : int
+            The number of neighbors to return per query, defaults to 10.
+        skips : Sequence[Set[str]], optional
+            One set of strings per query that should not be considered as neighbours.
+
+        Returns
+        -------
+        (words, similarities) : Tuple[numpy.ndarray, numpy.ndarray]
+            Object array holding the neighbours and float32 array holding the similarities, both
+            with shape ``(n_queries, k)`` and sorted by decreasing similarity.
+
+        Raises
+        ------
+        ValueError
+            If the queries are not 2-dimensional with ``dims`` columns or the number of skip sets
+            does not match the number of queries.
+
+        Examples
+        --------
+        >>> from finalfusion import Embeddings
+        >>> from finalfusion.storage import NdArray
+        >>> from finalfusion.vocab import SimpleVocab
+        >>> matrix = np.array([[1., 0.], [0.8, 0.6], [0., 1.]], dtype=np.float32)
+        >>> embeddings = Embeddings(storage=NdArray(matrix),
+        ...                         vocab=SimpleVocab(["a", "b", "c"]))
+        >>> words, sims = embeddings.embedding_similarity_batch(matrix[[0, 2]], k=2,
+        ...                                                     skips=[{"a"}, set()])
+        >>> words
+        array([['b', 'c'],
+               ['c', 'b']], dtype=object)
+        >>> np.allclose(sims, [[0.8, 0.], [1., 0.6]])
+        True
+        """
+        queries, skip_indices = self._prepare_similarity_batch(queries, skips)
+        indices, sims = self._similarity_batch(queries, k, skip_indices)
+        words = np.full(indices.shape, None, dtype=object)
+        # skipped candidates have -inf similarity and are not returned
+        found = ~np.isneginf(sims)
+        words[found] = [self.vocab.words[idx] for idx in indices[found]]
+        return words, sims
+
+    def _similarity(self, query: np.ndarray, k: int,
+                    skips: Set[str]) -> List['SimilarityResult']:
+        if query.ndim != 1 or query.shape[0] != self.dims:
+            raise ValueError(
+                f"expected query with shape ({self.dims},), not {query.shape}")
+        queries = query.astype(np.float32, copy=False)[None]
+        indices, sims = self._similarity_batch(
+            queries, k, _skip_indices(self.vocab.word_index, [skips]))
+        return [
+            SimilarityResult(self.vocab.words[idx], sim)
+            for idx, sim in zip(indices[0], sims[0]) if sim != -np.inf
+        ]
+
+    def _prepare_similarity_batch(
+            self, queries: np.ndarray, skips: Optional[Sequence[Set[str]]]
+    ) -> Tuple[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Validate batched similarity queries.
+
+        Returns the float32 queries and the skipped ``(query, word)`` pairs.
+        """
+        if queries.ndim != 2 or queries.shape[1] != self.dims:
+            raise ValueError(
+                f"expected queries with shape (n, {self.dims}), not {queries.shape}"
+            )
+        if skips is None:
+            skips = [set()] * len(queries)
+        if len(skips) != len(queries):
+            raise ValueError(
+                f"expected {len(queries)} skip sets, not {len(skips)}")
+        return queries.astype(np.float32, copy=False), _skip_indices(
+            self.vocab.word_index, skips)
+
+    def _similarity_batch(self, queries: np.ndarray, k: int,
+                          skips: Tuple[np.ndarray, np.ndarray]
+                          ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k similarity search, approximate if a similarity index is set.
+
+        Returns the vocabulary indices and similarities of the ``k`` most similar rows per
+        query, sorted by decreasing similarity.
+        """
+        if self.similarity_index is None:
+            return self._exact_similarity_batch(queries, k, skips)
+        return self.similarity_index.search(self.storage, queries,
+                                            min(k, len(self.vocab)), skips)
+
+    def _exact_similarity_batch(self, queries: np.ndarray, k: int,
+                                skips: Tuple[np.ndarray, np.ndarray]
+                                ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact top-k similarity search over the rows of known words.
+
+        Returns the vocabulary indices and similarities of the ``k`` most similar rows per
+        query, sorted by decreasing similarity.
+        """
+        block_rows = _block_rows(self.similarity_memory_budget, self.dims,
+                                 len(queries))
+        return _exact_top_k(self.storage[:len(self.vocab)], queries, k, skips,
+                            block_rows)
+
+
+def _skip_indices(word_index: Mapping[str, int],
+                  skips: Sequence[Set[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the skipped ``(query, word)`` pairs of batched similarity queries.
+
+    Returns an array of query indices and an array of the corresponding vocabulary indices.
+    Words that are not in the vocabulary are ignored.
+    """
+    skip_queries, skip_indices = [], []
+    for query_idx, skip in enumerate(skips):
+        for word in skip:
+            idx = word_index.get(word)
+            if idx is not None:
+                skip_queries.append(query_idx)
+                skip_indices.append(idx)
+    return np.array(skip_queries, dtype=np.intp), np.array(skip_indices,
+                                                           dtype=np.intp)
+
+
+def _block_rows(memory_budget: Optional[int], dims: int,
+                n_queries: int) -> int:
+    """
+    Get the number of storage rows that are scored at once.
+
+    A block holds the float32 rows and, per query, the similarities and partition indices
+    of each row.
+    """
+    if memory_budget is None:
+        return _SIMILARITY_BLOCK_ROWS
+    row_bytes = 4 * dims + 12 * n_queries
+    return max(1, memory_budget // row_bytes)
+
+
+def _exact_top_k(storage: Union[Storage, np.ndarray], queries: np.ndarray,
+                 k: int, skips: Tuple[np.ndarray, np.ndarray],
+                 block_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Blocked top-k similarity search over all rows of the storage.
+
+    Each block of rows is scored through one matrix multiplication, skipped ``(query, row)``
+    pairs are masked and the running top-k of each query is merged with the block's top-k
+    through a row-wise partition.
+
+    Quantized storage is scored through lookup tables of the queries without reconstructing
+    the blocks, only the top-k candidates are reconstructed and rescored.
+
+    Returns the row indices and similarities of the ``k`` most similar rows per query, sorted
+    by decreasing similarity.
+    """
+    n_rows = storage.shape[0]
+    k = min(k, n_rows)
+    lookup_tables = None
+    if isinstance(storage, QuantizedArray):
+        lookup_tables = storage.quantizer.lookup_tables(queries)
+    top_indices = np.empty((len(queries), 0), dtype=np.intp)
+    top_sims = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, n_rows, block_rows):
+        sims = _score_block(storage[start:start + block_rows], queries,
+                            lookup_tables)
+        _mask_skips(sims, skips, start)
+        top_indices, top_sims = _merge_top_k(top_indices, top_sims, sims,
+                                             start, k)
+    if lookup_tables is not None:
+        # rerank the candidates with their reconstructed embeddings
+        found = np.nonzero(~np.isneginf(top_sims))
+        top_sims[found] = np.einsum('ij,ij->i',
+                                    np.asarray(storage[top_indices[found]]),
+                                    queries[found[0]])
+    order = np.argsort(-top_sims, axis=1, kind="stable")
+    top_indices = np.take_along_axis(top_indices, order, axis=1)
+    return top_indices, np.take_along_axis(top_sims, order, axis=1)
+
+
+def _score_block(block: Union[Storage, np.ndarray], queries: np.ndarray,
+                 lookup_tables: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Compute the similarities of the queries and a block of rows.
+    """
+    if lookup_tables is None:
+        # float16 blocks are upcast, so similarities accumulate in float32
+        sims = queries.dot(np.asarray(block,
+                                      dtype=np.float32).T)  # type: np.ndarray
+    else:
+        assert isinstance(block, QuantizedArray)
+        sims = block.lookup_dot(lookup_tables)
+    return sims
+
+
+def _mask_skips(sims: np.ndarray, skips: Tuple[np.ndarray, np.ndarray],
+                start: int):
+    """
+    Set the similarities of skipped ``(query, row)`` pairs in a block to ``-inf``.
+
+    ``start`` is the row index of the first column of the block.
+    """
+    skip_queries, skip_indices = skips
+    in_block = (skip_indices >= start) & (skip_indices < start + sims.shape[1])
+    sims[skip_queries[in_block], skip_indices[in_block] - start] = -np.inf
+
+
+def _merge_top_k(top_indices: np.ndarray, top_sims: np.ndarray,
+                 sims: np.ndarray, start: int,
+                 k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge the top-k of a block of similarities into the running top-k.
+
+    ``start`` is the row index of the first column of the block.
+    """
+    indices = np.broadcast_to(np.arange(start, start + sims.shape[1]),
+                              sims.shape)
+    if sims.shape[1] > k:
+        part = np.argpartition(sims, -k, axis=1)[:, -k:]
+        sims = np.take_along_axis(sims, part, axis=1)
+        indices = part + start
+    top_sims = np.concatenate((top_sims, sims), axis=1)
+    top_indices = np.concatenate((top_indices, indices), axis=1)
+    if top_sims.shape[1] > k:
+        part = np.argpartition(top_sims, -k, axis=1)[:, -k:]
+        top_sims = np.take_along_axis(top_sims, part, axis=1)
+        top_indices = np.take_along_axis(top_indices, part, axis=1)
+    return top_indices, top_sims
+
+
+__all__ = []  # type: List[str]
@@ -1,5 +1,5 @@
 # pylint: disable=missing-module-docstring
-from typing import List
+from typing import List, Optional, Iterator, Any
 
 import numpy as np
 
@@ -12,4 +12,72 @@ def _normalize_matrix(storage: np.ndarray) -> Norms:
     return Norms(norms)
 
 
+def _kmeans(data: np.ndarray,
+            n_clusters: int,
+            n_iterations: int,
+            rng: np.random.RandomState,
+            centroids: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Cluster the rows of data with k-means and return the centroids.
+
+    Unless initial centroids are passed, centroids are initialized with randomly drawn rows.
+    Empty clusters are reseeded with random rows.
+    """
+    if centroids is None:
+        centroids = data[rng.choice(len(data), n_clusters, replace=False)]
+    else:
+        centroids = centroids.copy()
+    for _ in range(n_iterations):
+        assignments = _nearest_centroids(data, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        order = np.argsort(assignments, kind="stable")
+        nonempty = counts != 0
+        starts = np.cumsum(counts) - counts
+        centroids[nonempty] = np.add.reduceat(
+            data[order], starts[nonempty], axis=0) / counts[nonempty, None]
+        n_empty = n_clusters - nonempty.sum()
+        if n_empty:
+            centroids[~nonempty] = data[rng.choice(len(data), n_empty)]
+    return centroids
+
+
+def _nearest_centroids(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Get the index of the centroid with the smallest euclidean distance for every row of data.
+
+    Rows are processed in blocks to bound the size of the distance matrix.
+    """
+    # argmin |x - c|^2 = argmax x.c - |c|^2 / 2
+    half_sq_norms = 0.5 * np.square(centroids).sum(1)
+    assignments = np.empty(len(data), dtype=np.intp)
+    for start in range(0, len(data), _ASSIGNMENT_BLOCK_ROWS):
+        end = min(start + _ASSIGNMENT_BLOCK_ROWS, len(data))
+        scores = data[start:end].dot(centroids.T)
+        scores -= half_sq_norms
+        assignments[start:end] = scores.argmax(1)
+    return assignments
+
+
+def _denormalized_blocks(storage: Any, norms: Optional[np.ndarray],
+                         n_rows: int) -> Iterator[np.ndarray]:
+    """
+    Iterate over blocks of the first ``n_rows`` rows of a storage, scaled by their norms.
+
+    Only one block is materialized at a time, so memory stays bounded for memory-mapped and
+    quantized storage.
+    """
+    for start in range(0, n_rows, _WRITE_BLOCK_ROWS):
+        end = min(start + _WRITE_BLOCK_ROWS, n_rows)
+        block = np.asarray(storage[start:end]).astype(np.float32, copy=False)
+        if norms is not None:
+            block = block * norms[start:end, None]
+        yield block
+
+
+# Number of rows that are assigned to centroids at once.
+_ASSIGNMENT_BLOCK_ROWS = 16384
+
+# Number of rows that are written at once.
+_WRITE_BLOCK_ROWS = 8192
+
 __all__ = []  # type: List[str]
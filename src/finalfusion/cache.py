@@ -0,0 +1,220 @@
+"""
+Embedding caches
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of embeddings.
+
+    Embeddings and their norms are stored in a preallocated arena with one row per entry. Once
+    the cache is full, inserting a new entry evicts the least recently used entry and reuses its
+    row. Hits, misses and evictions are counted. All operations are guarded by a lock, so a cache
+    can be shared between threads. Pickled caches are restored empty.
+
+    Caches are used by :class:`~finalfusion.embeddings.Embeddings` to store embeddings of
+    unknown words that were composed from subword embeddings, see
+    :attr:`Embeddings.oov_cache <finalfusion.embeddings.Embeddings.oov_cache>`.
+
+    Examples
+    --------
+    >>> cache = EmbeddingCache(dims=2, capacity=1)
+    >>> cache.put("a", np.array([1., 0.]), 2.)
+    >>> cache.get("a")
+    (array([1., 0.], dtype=float32), 2.0)
+    >>> cache.put("b", np.array([0., 1.]), 1.)
+    >>> cache.get("a") is None
+    True
+    >>> cache.hits, cache.misses, cache.evictions
+    (1, 1, 1)
+    """
+    def __init__(self,
+                 dims: int,
+                 capacity: Optional[int] = None,
+                 memory_budget: Optional[int] = None):
+        """
+        Initialize an EmbeddingCache.
+
+        The size of the cache is given either as the number of entries or as the memory budget
+        of the arena in bytes.
+
+        Parameters
+        ----------
+        dims : int
+            Dimensionality of the cached embeddings.
+        capacity : int, optional
+            Maximum number of entries.
+        memory_budget : int, optional
+            Size of the arena in bytes. Each entry takes ``4 * dims + 4`` bytes.
+
+        Raises
+        ------
+        ValueError
+            If not exactly one of ``capacity`` and ``memory_budget`` is given, ``dims`` is not
+            positive or the size doesn't allow for a single entry.
+        """
+        if dims <= 0:
+            raise ValueError(f"dims needs to be positive, not {dims}")
+        if (capacity is None) == (memory_budget is None):
+            raise ValueError(
+                "Exactly one of capacity and memory_budget is required")
+        if memory_budget is not None:
+            capacity = memory_budget // (4 * dims + 4)
+        assert capacity is not None
+        if capacity <= 0:
+            raise ValueError(
+                f"Cache needs room for at least one entry, capacity: {capacity}"
+            )
+        self._embeddings = np.zeros((capacity, dims), dtype=np.float32)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._slots = OrderedDict()  # type: OrderedDict[str, int]
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: str, out: Optional[np.ndarray] = None
+            ) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        Get an embedding and its norm.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+        out : numpy.ndarray, optional
+            Optional output array to write the embedding into.
+
+        Returns
+        -------
+        (embedding, norm) : Tuple[numpy.ndarray, float], optional
+            A copy of the cached embedding and its norm, None if the key is not cached.
+        """
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                self._misses += 1
+                return None
+            self._slots.move_to_end(key)
+            self._hits += 1
+            if out is None:
+                out = self._embeddings[slot].copy()
+            else:
+                out[:] = self._embeddings[slot]
+            return out, self._norms[slot]
+
+    def put(self, key: str, embedding: np.ndarray, norm: float):
+        """
+        Insert an embedding and its norm.
+
+        If the cache is full, the least recently used entry is evicted.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+        embedding : numpy.ndarray
+            The embedding, it is copied into the arena.
+        norm : float
+            The norm of the embedding.
+        """
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None:
+                self._slots.move_to_end(key)
+            elif len(self._slots) < len(self._embeddings):
+                slot = len(self._slots)
+                self._slots[key] = slot
+            else:
+                _, slot = self._slots.popitem(last=False)
+                self._evictions += 1
+                self._slots[key] = slot
+            self._embeddings[slot] = embedding
+            self._norms[slot] = norm
+
+    def clear(self):
+        """
+        Remove all entries.
+
+        The counters are not reset.
+        """
+        with self._lock:
+            self._slots.clear()
+
+    @property
+    def dims(self) -> int:
+        """
+        Get the dimensionality of the cached embeddings.
+
+        Returns
+        -------
+        dims : int
+            The dimensionality.
+        """
+        return self._embeddings.shape[1]
+
+    @property
+    def capacity(self) -> int:
+        """
+        Get the maximum number of entries.
+
+        Returns
+        -------
+        capacity : int
+            The maximum number of entries.
+        """
+        return len(self._embeddings)
+
+    @property
+    def hits(self) -> int:
+        """
+        Get the number of lookups of cached keys.
+
+        Returns
+        -------
+        hits : int
+            The number of hits.
+        """
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """
+        Get the number of lookups of keys that were not cached.
+
+        Returns
+        -------
+        misses : int
+            The number of misses.
+        """
+        return self._misses
+
+    @property
+    def evictions(self) -> int:
+        """
+        Get the number of entries that were evicted to make room for new entries.
+
+        Returns
+        -------
+        evictions : int
+            The number of evictions.
+        """
+        return self._evictions
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __reduce__(self):
+        # entries and counters are not pickled
+        return EmbeddingCache, (self.dims, self.capacity)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._slots
+
+
+__all__ = ['EmbeddingCache']
@@ -3,12 +3,13 @@ Fasttext IO compat module.
 """
 
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from os import PathLike
-from typing import Union, BinaryIO, cast, List
+from typing import Union, BinaryIO, List
 
 import numpy as np
 
-from finalfusion._util import _normalize_matrix
+from finalfusion._util import _normalize_matrix, _denormalized_blocks
 from finalfusion.embeddings import Embeddings
 from finalfusion.io import _read_required_binary, _write_binary, _serialize_array_as_le
 from finalfusion.metadata import Metadata
@@ -18,9 +19,16 @@ from finalfusion.vocab import FastTextVocab, Vocab, SimpleVocab
 
 _FT_MAGIC = 793_712_314
 
+# Number of bytes of vocabulary entries that are read at once.
+_FT_VOCAB_BLOCK_BYTES = 1 << 20
+
+# Number of words whose vectors are precomputed together.
+_PRECOMPUTE_BLOCK_WORDS = 8192
+
 
 def load_fasttext(file: Union[str, bytes, int, PathLike],
-                  lossy: bool = False) -> Embeddings:
+                  lossy: bool = False,
+                  n_threads: int = 1) -> Embeddings:
     """
     Read embeddings from a file in fastText format.
 
@@ -38,18 +46,27 @@ def load_fasttext(file: Union[str, bytes, int, PathLike],
     lossy : bool
         If set to true, malformed UTF8 sequences in words will be replaced with the `U+FFFD`
         REPLACEMENT character.
+    n_threads : int
+        Number of threads that precompute the word embeddings.
 
     Returns
     -------
     embeddings : Embeddings
         The embeddings from the input file.
+
+    Raises
+    ------
+    ValueError
+        If ``n_threads`` is not positive.
     """
+    if n_threads <= 0:
+        raise ValueError(f"n_threads needs to be positive, not {n_threads}")
     with open(file, 'rb') as inf:
         _read_ft_header(inf)
         metadata = _read_ft_cfg(inf)
         vocab = _read_ft_vocab(inf, metadata['buckets'], metadata['min_n'],
                                metadata['max_n'], lossy)
-        storage = _read_ft_storage(inf, vocab)
+        storage = _read_ft_storage(inf, vocab, n_threads)
         norms = _normalize_matrix(storage[:len(vocab)])
     return Embeddings(storage=storage,
                       vocab=vocab,
@@ -94,12 +111,21 @@ def write_fasttext(file: Union[str, bytes, int, PathLike], embeds: Embeddings):
         Output file
     embeds : Embeddings
         Embeddings to write
+
+    Raises
+    ------
+    ValueError
+        If the vocab is not a FastTextVocab or the storage is not an NdArray.
     """
     with open(file, 'wb') as outf:
         vocab = embeds.vocab
         if not isinstance(vocab, FastTextVocab):
             raise ValueError(
                 f'Expected FastTextVocab, not: {type(embeds.vocab).__name__}')
+        storage = embeds.storage
+        if not isinstance(storage, NdArray):
+            raise ValueError(
+                f'Expected NdArray storage, not: {type(storage).__name__}')
         _write_binary(outf, "<ii", _FT_MAGIC, 12)
         _write_ft_cfg(outf, embeds.dims, vocab.subword_indexer.n_buckets,
                       vocab.min_n, vocab.max_n)
@@ -109,7 +135,7 @@ def write_fasttext(file: Union[str, bytes, int, PathLike], embeds: Embeddings):
             _write_ft_storage_simple(outf, embeds)
         else:
             _write_ft_storage_subwords(outf, embeds)
-        _serialize_array_as_le(outf, embeds.storage)
+        _serialize_array_as_le(outf, storage)
 
 
 def _read_ft_header(file: BinaryIO):
@@ -154,33 +180,46 @@ def _read_ft_vocab(file: BinaryIO, buckets: int, min_n: int, max_n: int,
     if prune_idx_size >= 0:
         raise NotImplementedError("Pruned vocabs are not supported")
 
-    words = [_read_binary_word(file, lossy) for _ in range(vocab_size)]
+    words = _read_binary_words(file, vocab_size, lossy)
     indexer = FastTextIndexer(buckets, min_n, max_n)
     return FastTextVocab(words, indexer)
 
 
-def _read_binary_word(file: BinaryIO, lossy: bool) -> str:
+def _read_binary_words(file: BinaryIO, vocab_size: int,
+                       lossy: bool) -> List[str]:
     """
-    Helper method to read null-terminated binary strings.
+    Helper method to read the null-terminated words of vocab entries.
+
+    Entries are parsed from blocks of the file, afterwards the file is positioned after the last
+    entry.
     """
-    word = bytearray()
-    while True:
-        byte = file.read(1)
-        if byte == b'\x00':
-            break
-        if byte == b'':
+    errors = 'replace' if lossy else 'strict'
+    words = []  # type: List[str]
+    buffer = b''
+    pos = 0
+    while len(words) < vocab_size:
+        block = file.read(_FT_VOCAB_BLOCK_BYTES)
+        if not block:
             raise EOFError
-        word.extend(byte)
-    # discard frequency
-    _ = _read_required_binary(file, "<q")
-    entry_type = _read_required_binary(file, "b")[0]
-    if entry_type != 0:
-        raise ValueError(f'Non word entry: {word}')
-
-    return word.decode('utf8', errors='replace' if lossy else 'strict')
-
-
-def _read_ft_storage(file: BinaryIO, vocab: Vocab) -> NdArray:
+        buffer = buffer[pos:] + block
+        pos = 0
+        while len(words) < vocab_size:
+            end = buffer.find(b'\x00', pos)
+            # the word is followed by an i64 frequency and an i8 entry type
+            if end == -1 or end + 10 > len(buffer):
+                break
+            word = buffer[pos:end]
+            if buffer[end + 9] != 0:
+                raise ValueError(
+                    f"Non word entry: {word.decode('utf8', errors='replace')}")
+            words.append(word.decode('utf8', errors=errors))
+            pos = end + 10
+    file.seek(pos - len(buffer), 1)
+    return words
+
+
+def _read_ft_storage(file: BinaryIO, vocab: Vocab,
+                     n_threads: int = 1) -> NdArray:
     """
     Helper method to read fastText storage.
 
@@ -198,24 +237,43 @@ def _read_ft_storage(file: BinaryIO, vocab: Vocab) -> NdArray:
     if sys.byteorder == 'big':
         matrix.byteswap(inplace=True)
     if isinstance(vocab, FastTextVocab):
-        _precompute_word_vecs(vocab, matrix)
+        _precompute_word_vecs(vocab, matrix, n_threads)
     return NdArray(matrix)
 
 
-def _precompute_word_vecs(vocab: FastTextVocab, matrix: np.ndarray):
+def _precompute_word_vecs(vocab: FastTextVocab,
+                          matrix: np.ndarray,
+                          n_threads: int = 1):
     """
     Helper method to precompute word vectors.
 
     Averages the distinct word representation and the corresponding ngram
-    embeddings.
+    embeddings. The subword indices of all words are extracted at once, the
+    ngram embeddings are summed per word with ``np.add.reduceat`` in blocks of
+    words.
     """
-    for i, word in enumerate(vocab):
-        indices = [i]
-        if isinstance(vocab, FastTextVocab):
-            subword_indices = cast(
-                List[int], vocab.subword_indices(word, with_ngrams=False))
-            indices += subword_indices
-        matrix[i] = matrix[indices].mean(0, keepdims=False)
+    indptr, indices = vocab.subword_indices_batch(vocab.words)
+    indptr = indptr.astype(np.int64)
+
+    def precompute(start: int):
+        end = min(start + _PRECOMPUTE_BLOCK_WORDS, len(vocab))
+        block_indptr = indptr[start:end + 1] - indptr[start]
+        block_indices = indices[indptr[start]:indptr[end]]
+        counts = np.diff(block_indptr)
+        sums = matrix[start:end].copy()
+        # reduceat can't produce empty sums, only reduce the words with ngrams
+        found = counts != 0
+        if block_indices.size != 0:
+            sums[found] += np.add.reduceat(matrix[block_indices],
+                                           block_indptr[:-1][found],
+                                           axis=0)
+        # only rows of this block are written, ngram rows are never modified
+        matrix[start:end] = sums / (counts + 1).astype(np.float32)[:, None]
+
+    with ThreadPoolExecutor(n_threads) as executor:
+        list(
+            executor.map(precompute,
+                         range(0, len(vocab), _PRECOMPUTE_BLOCK_WORDS)))
 
 
 def _write_ft_cfg(file: BinaryIO, dims: int, n_buckets: int, min_n: int,
@@ -279,21 +337,32 @@ def _write_ft_storage_subwords(outf: BinaryIO, embeds: Embeddings):
     Helper method to write a storage with subwords.
 
     Restores the original embedding format of fastText, i.e. precomputation is
-    undone and unnormalizes the embeddings.
+    undone and unnormalizes the embeddings. The subword indices of all words are
+    extracted at once, the ngram embeddings are summed per word with
+    ``np.add.reduceat`` in blocks of words.
     """
     vocab = embeds.vocab
     assert isinstance(vocab, FastTextVocab)
     storage = embeds.storage
-    norms = embeds.norms
-    for i, word in enumerate(vocab):
-        indices = vocab.subword_indices(word)
-        embed = storage[i]  # type: np.ndarray
-        embed = embed * (len(indices) + 1)
-        if norms is not None:
-            embed *= norms[i]
-        sw_embeds = storage[indices]  # type: np.ndarray
-        embed -= sw_embeds.sum(0, keepdims=False)
-        _serialize_array_as_le(outf, embed)
+    assert isinstance(storage, NdArray)
+    indptr, indices = vocab.subword_indices_batch(vocab.words)
+    indptr = indptr.astype(np.int64)
+    start = 0
+    for block in _denormalized_blocks(storage, embeds.norms, len(vocab)):
+        end = start + len(block)
+        block_indptr = indptr[start:end + 1] - indptr[start]
+        block_indices = indices[indptr[start]:indptr[end]]
+        counts = np.diff(block_indptr)
+        # the block can be a view of the storage, don't modify it in-place
+        block = block * (counts + 1).astype(np.float32)[:, None]
+        # reduceat can't produce empty sums, only reduce the words with ngrams
+        found = counts != 0
+        if block_indices.size != 0:
+            block[found] -= np.add.reduceat(storage[block_indices],
+                                            block_indptr[:-1][found],
+                                            axis=0)
+        _serialize_array_as_le(outf, block)
+        start = end
 
     _serialize_array_as_le(outf, storage[len(vocab):])
 
@@ -305,12 +374,8 @@ def _write_ft_storage_simple(outf: BinaryIO, embeds: Embeddings):
     Unnormalizes embeddings.
     """
     storage = embeds.storage
-    norms = embeds.norms
-    for i in range(storage.shape[0]):
-        embed = storage[i]  # type: np.ndarray
-        if norms is not None:
-            embed = norms[i] * embed
-        _serialize_array_as_le(outf, embed)
+    for block in _denormalized_blocks(storage, embeds.norms, storage.shape[0]):
+        _serialize_array_as_le(outf, block)
 
 
 _FT_REQUIRED_CFG_KEYS = [
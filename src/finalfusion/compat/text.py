@@ -2,22 +2,38 @@
 Text based embedding formats.
 """
 
+import mmap
+import os
 import re
+import stat
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from os import PathLike
-from typing import Union, TextIO
+from typing import Union, List, Tuple, Optional, BinaryIO, Iterable, Iterator, TextIO, IO, \
+    cast, TYPE_CHECKING
 
 import numpy as np
 
 from finalfusion.embeddings import Embeddings
-from finalfusion._util import _normalize_matrix
+from finalfusion._util import _normalize_matrix, _denormalized_blocks
 from finalfusion.storage import NdArray
 from finalfusion.vocab import SimpleVocab
 
-_ASCII_WHITESPACE_PAT = re.compile(r'(?a)\s+')
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+
+_ASCII_WHITESPACE_PAT = re.compile(rb'\s+')
+
+# Approximate number of bytes that are parsed as one block.
+_TEXT_BLOCK_BYTES = 1 << 24
+
+# Size of the output buffer of the writers.
+_WRITE_BUFFER_BYTES = 1 << 20
 
 
 def load_text_dims(file: Union[str, bytes, int, PathLike],
-                   lossy: bool = False) -> Embeddings:
+                   lossy: bool = False,
+                   n_workers: int = 1) -> Embeddings:
     """
     Read emebddings in text-dims format.
 
@@ -34,20 +50,29 @@ def load_text_dims(file: Union[str, bytes, int, PathLike],
     lossy : bool
         If set to true, malformed UTF-8 sequences in words will be replaced with the `U+FFFD`
         REPLACEMENT character.
+    n_workers : int
+        Number of worker processes that parse the file. The file is split into blocks on line
+        boundaries, with more than one worker, the blocks are parsed in parallel into a shared
+        matrix. Parallel parsing requires Python 3.8, on older versions the file is parsed by
+        the calling process.
 
     Returns
     -------
     embeddings : Embeddings
         The embeddings from the input file.
+
+    Raises
+    ------
+    ValueError
+        If the file is empty, a line does not have the expected number of components or
+        ``n_workers`` is not positive.
     """
-    with open(file, encoding='utf8',
-              errors='replace' if lossy else 'strict') as inf:
-        rows, cols = next(inf).split()
-        return _load_text(inf, int(rows), int(cols))
+    return _load_text(file, True, lossy, n_workers)
 
 
 def load_text(file: Union[str, bytes, int, PathLike],
-              lossy: bool = False) -> Embeddings:
+              lossy: bool = False,
+              n_workers: int = 1) -> Embeddings:
     """
     Read embeddings in text format.
 
@@ -67,24 +92,80 @@ def load_text(file: Union[str, bytes, int, PathLike],
     lossy : bool
         If set to true, malformed UTF-8 sequences in words will be replaced with the `U+FFFD`
         REPLACEMENT character.
+    n_workers : int
+        Number of worker processes that parse the file. The file is split into blocks on line
+        boundaries, with more than one worker, the blocks are parsed in parallel into a shared
+        matrix. Parallel parsing requires Python 3.8, on older versions the file is parsed by
+        the calling process.
 
     Returns
     -------
     embeddings : Embeddings
         Embeddings from the input file. The resulting Embeddings will have a
         SimpleVocab, NdArray and Norms.
+
+    Raises
+    ------
+    ValueError
+        If the file is empty, a line does not have the expected number of components or
+        ``n_workers`` is not positive.
     """
-    with open(file, encoding='utf8',
-              errors='replace' if lossy else 'strict') as inf:
-        try:
-            first = next(inf)
-        except StopIteration:
-            raise ValueError("Can't read from empty embeddings file.")
-        line = _ASCII_WHITESPACE_PAT.split(first.rstrip())
-        cols = len(line[1:])
-        rows = sum(1 for _ in inf) + 1
-        inf.seek(0)
-        return _load_text(inf, rows, cols)
+    return _load_text(file, False, lossy, n_workers)
+
+
+def load_text_stream(
+        stream: Union[BinaryIO, TextIO, Iterable[Union[str, bytes]]],
+        dims: bool = False,
+        lossy: bool = False) -> Embeddings:
+    """
+    Read embeddings in text or text-dims format from a stream.
+
+    The stream is read once, so this also works for inputs that can't be seeked such as pipes or
+    ``sys.stdin``. Lines are parsed in blocks, the embedding matrix is assembled from the parsed
+    blocks after the stream is exhausted.
+
+    The returned embeddings have a SimpleVocab, NdArray storage and a Norms chunk. The storage is
+    l2-normalized per default and the corresponding norms are stored in the Norms.
+
+    >>> import io
+    >>> embeds = load_text_stream(io.BytesIO(b"one 1 0\\ntwo 0 2\\n"))
+    >>> embeds.vocab.words
+    ['one', 'two']
+    >>> embeds.norms
+    Norms([1., 2.], dtype=float32)
+
+    Parameters
+    ----------
+    stream : BinaryIO, TextIO, Iterable[Union[str, bytes]]
+        A file object or an iterable of lines, e.g. a generator. Lines do not need to be newline
+        terminated.
+    dims : bool
+        Toggles the text-dims format, i.e. whether the first line contains the number of rows
+        and columns.
+    lossy : bool
+        If set to true, malformed UTF-8 sequences in words will be replaced with the `U+FFFD`
+        REPLACEMENT character.
+
+    Returns
+    -------
+    embeddings : Embeddings
+        The embeddings from the stream.
+
+    Raises
+    ------
+    ValueError
+        If the stream is empty or a line does not have the expected number of components.
+    """
+    if hasattr(stream, 'buffer'):
+        # read text streams such as sys.stdin from their underlying binary buffer
+        blocks = _read_blocks(cast(TextIO, stream).buffer)
+    elif hasattr(stream, 'read') and isinstance(
+            cast(IO, stream).read(0), bytes):
+        blocks = _read_blocks(cast(BinaryIO, stream))
+    else:
+        # text streams without a binary buffer, e.g. io.StringIO, are read line by line
+        blocks = _join_lines(stream)
+    return _load_text_blocks(blocks, dims, lossy, getattr(stream, 'name', ''))
 
 
 def write_text(file: Union[str, bytes, int, PathLike],
@@ -140,34 +221,299 @@ def write_text_dims(file: Union[str, bytes, int, PathLike],
     _write_text(file, embeddings, True, sep=sep)
 
 
-def _load_text(file: TextIO, rows: int, cols: int) -> Embeddings:
-    words = []
-    matrix = np.zeros((rows, cols), dtype=np.float32)
-    for row, line in zip(matrix, file):
-        parts = _ASCII_WHITESPACE_PAT.split(line.rstrip())
-        words.append(parts[0])
-        row[:] = parts[1:]
+def _load_text(file: Union[str, bytes, int, PathLike], dims: bool, lossy: bool,
+               n_workers: int) -> Embeddings:
+    if n_workers < 1:
+        raise ValueError(f"n_workers must be positive, got {n_workers}")
+    with open(file, 'rb') as inf:
+        origin = inf.name
+        if not stat.S_ISREG(os.fstat(inf.fileno()).st_mode):
+            # pipes and other special files can only be read once
+            return _load_text_blocks(_read_blocks(inf), dims, lossy, origin)
+        first = inf.readline()
+        if not first:
+            raise ValueError("Can't read from empty embeddings file.")
+        with mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if dims:
+                rows, cols = map(int, first.split())
+                blocks = _text_blocks(buf, len(first), n_workers, rows)
+            else:
+                cols = len(_ASCII_WHITESPACE_PAT.split(first.rstrip())) - 1
+                blocks = _text_blocks(buf, 0, n_workers)
+                rows = sum(n_rows for _, _, _, n_rows in blocks)
+            # multiprocessing.shared_memory was added in Python 3.8
+            if n_workers > 1 and sys.version_info >= (3, 8):
+                words, matrix = _parse_text_blocks_parallel(
+                    origin, blocks, (rows, cols), lossy, n_workers)
+            else:
+                words, matrix = _parse_text_blocks(buf, blocks, (rows, cols),
+                                                   lossy)
+    return _text_embeddings(words, matrix, origin)
+
+
+def _text_embeddings(words: List[str], matrix: np.ndarray,
+                     origin: Union[str, bytes, int, PathLike]) -> Embeddings:
+    """
+    Create embeddings from parsed words and vectors, the vectors are l2-normalized.
+    """
     storage = NdArray(matrix)
     return Embeddings(storage=storage,
                       norms=_normalize_matrix(storage),
                       vocab=SimpleVocab(words),
-                      origin=file.name)
+                      origin=str(origin))
+
+
+def _text_blocks(buf: mmap.mmap,
+                 offset: int,
+                 n_workers: int,
+                 rows: Optional[int] = None
+                 ) -> List[Tuple[int, int, int, int]]:
+    """
+    Split the lines after ``offset`` into blocks.
+
+    Returns ``(start, end, row, n_rows)`` tuples with the byte range of each block, the matrix row
+    of its first line and its number of lines. If ``rows`` is given, lines after the first
+    ``rows`` lines are dropped.
+    """
+    size = len(buf) - offset
+    n_blocks = max(n_workers, -(-size // _TEXT_BLOCK_BYTES))
+    bounds = [offset]
+    for i in range(1, n_blocks):
+        newline = buf.find(b'\n', offset + size * i // n_blocks - 1)
+        bound = len(buf) if newline == -1 else newline + 1
+        if bound > bounds[-1]:
+            bounds.append(bound)
+    if bounds[-1] < len(buf):
+        bounds.append(len(buf))
+    blocks = []
+    row = 0
+    for start, end in zip(bounds, bounds[1:]):
+        n_rows = _count_lines(buf, start, end)
+        if rows is not None:
+            n_rows = min(n_rows, rows - row)
+            if n_rows <= 0:
+                break
+        blocks.append((start, end, row, n_rows))
+        row += n_rows
+    if rows is not None and row != rows:
+        raise ValueError(f"Expected {rows} embeddings, file contains {row}")
+    return blocks
+
+
+def _count_lines(buf: mmap.mmap, start: int, end: int) -> int:
+    """
+    Count the lines in ``buf[start:end]``, the last line may not be newline terminated.
+    """
+    newlines = np.frombuffer(buf,
+                             dtype=np.uint8,
+                             count=end - start,
+                             offset=start) == ord('\n')
+    return int(np.count_nonzero(newlines)) + (buf[end - 1] != ord('\n'))
+
+
+def _read_blocks(inf: BinaryIO) -> Iterator[bytes]:
+    """
+    Read blocks of newline terminated lines from a binary file.
+    """
+    remainder = b''
+    while True:
+        data = inf.read(_TEXT_BLOCK_BYTES)
+        if not data:
+            break
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            remainder += data
+            continue
+        yield remainder + data[:end]
+        remainder = data[end:]
+    if remainder:
+        yield remainder + b'\n'
+
+
+def _join_lines(lines: Iterable[Union[str, bytes]]) -> Iterator[bytes]:
+    """
+    Join lines into blocks of newline terminated lines.
+    """
+    block = []  # type: List[bytes]
+    block_size = 0
+    for line in lines:
+        if isinstance(line, str):
+            line = line.encode('utf8')
+        if not line.endswith(b'\n'):
+            line += b'\n'
+        block.append(line)
+        block_size += len(line)
+        if block_size >= _TEXT_BLOCK_BYTES:
+            yield b''.join(block)
+            block = []
+            block_size = 0
+    if block:
+        yield b''.join(block)
+
+
+def _load_text_blocks(blocks: Iterator[bytes], dims: bool, lossy: bool,
+                      origin: Union[str, bytes, int, PathLike]) -> Embeddings:
+    """
+    Parse embeddings from blocks of newline terminated lines in a single pass.
+    """
+    words = []  # type: List[str]
+    arrays = []  # type: List[np.ndarray]
+    rows, cols = None, None  # type: Optional[int], Optional[int]
+    for block in blocks:
+        if cols is None:
+            first_end = block.index(b'\n') + 1
+            if dims:
+                rows, cols = map(int, block[:first_end].split())
+                block = block[first_end:]
+            else:
+                cols = len(
+                    _ASCII_WHITESPACE_PAT.split(
+                        block[:first_end].rstrip())) - 1
+        n_rows = block.count(b'\n')
+        if rows is not None:
+            n_rows = min(n_rows, rows - len(words))
+        arrays.append(np.empty((n_rows, cols), dtype=np.float32))
+        words.extend(_parse_text_block(block, arrays[-1], lossy))
+    if cols is None:
+        raise ValueError("Can't read from empty embeddings file.")
+    if rows is not None and len(words) != rows:
+        raise ValueError(
+            f"Expected {rows} embeddings, file contains {len(words)}")
+    matrix = np.concatenate(arrays) if arrays else np.zeros(
+        (0, cols), dtype=np.float32)
+    return _text_embeddings(words, matrix, origin)
+
+
+def _parse_text_block(data: bytes, out: np.ndarray, lossy: bool) -> List[str]:
+    """
+    Parse the first ``len(out)`` lines of data into ``out``, returns the words.
+    """
+    errors = 'replace' if lossy else 'strict'
+    words = []
+    components = []
+    for line in data.split(b'\n', len(out))[:len(out)]:
+        parts = _ASCII_WHITESPACE_PAT.split(line.rstrip(), 1)
+        words.append(parts[0].decode('utf8', errors=errors))
+        components.append(parts[1] if len(parts) > 1 else b'')
+        n_components = len(components[-1].split())
+        if n_components != out.shape[1]:
+            raise ValueError(
+                f"Expected {out.shape[1]} components for {words[-1]!r}, "
+                f"found {n_components}")
+    try:
+        values = np.array(b' '.join(components).split(), dtype=np.float32)
+    except ValueError:
+        raise ValueError(
+            f"Found components that are not numbers in block of {len(out)} lines"
+        ) from None
+    out[:] = values.reshape(out.shape)
+    return words
+
+
+def _parse_text_blocks(buf: mmap.mmap, blocks: List[Tuple[int, int, int, int]],
+                       shape: Tuple[int, int],
+                       lossy: bool) -> Tuple[List[str], np.ndarray]:
+    """
+    Parse the blocks of a file in the calling process.
+    """
+    words = []  # type: List[str]
+    matrix = np.zeros(shape, dtype=np.float32)
+    for start, end, row, n_rows in blocks:
+        words.extend(
+            _parse_text_block(buf[start:end], matrix[row:row + n_rows], lossy))
+    return words, matrix
+
+
+def _parse_text_blocks_parallel(file: Union[str, bytes, int, PathLike],
+                                blocks: List[Tuple[int, int, int, int]],
+                                shape: Tuple[int, int], lossy: bool,
+                                n_workers: int
+                                ) -> Tuple[List[str], np.ndarray]:
+    from multiprocessing import shared_memory  # pylint: disable=import-outside-toplevel
+    size = max(shape[0] * shape[1] * np.dtype(np.float32).itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(_parse_text_block_shared, file, shm.name,
+                                shape, block, lossy) for block in blocks
+            ]
+            words = []  # type: List[str]
+            for future in futures:
+                words.extend(future.result())
+        # the workers wrote the matrix into the segment, it is used without copying
+        matrix = np.asarray(_SharedMatrix(shm, shape))
+    except BaseException:
+        shm.close()
+        raise
+    finally:
+        # the segment stays mapped until the matrix is gone
+        shm.unlink()
+    return words, matrix
+
+
+class _SharedMatrix:  # pylint: disable=too-few-public-methods
+    """
+    Array interface of a float32 matrix in a shared memory segment.
+
+    Arrays created from the matrix keep the segment mapped, it is closed once the last array is
+    gone.
+    """
+    def __init__(self, shm: 'SharedMemory', shape: Tuple[int, int]):
+        self._shm = shm
+        self._matrix = np.frombuffer(cast(memoryview, shm.buf),
+                                     dtype=np.float32,
+                                     count=shape[0] * shape[1]).reshape(shape)
+        self.__array_interface__ = dict(self._matrix.__array_interface__)
+
+    def __del__(self):
+        del self._matrix
+        self._shm.close()
+
+
+def _parse_text_block_shared(file: Union[str, bytes, int, PathLike],
+                             shm_name: str, shape: Tuple[int, int],
+                             block: Tuple[int, int, int, int],
+                             lossy: bool) -> List[str]:
+    from multiprocessing import shared_memory  # pylint: disable=import-outside-toplevel
+    start, end, row, n_rows = block
+    with open(file, 'rb') as inf:
+        inf.seek(start)
+        data = inf.read(end - start)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.float32,
+                            buffer=shm.buf)  # type: np.ndarray
+        words = _parse_text_block(data, matrix[row:row + n_rows], lossy)
+        del matrix
+    finally:
+        shm.close()
+    return words
 
 
 def _write_text(file: Union[str, bytes, int, PathLike],
                 embeddings: Embeddings,
                 dims: bool,
                 sep=" "):
-    vocab = embeddings.vocab
-    matrix = embeddings.storage[:len(vocab)]
-    with open(file, 'w', encoding='utf8') as outf:
+    words = embeddings.vocab.words
+    n_rows, cols = len(words), embeddings.storage.shape[1]
+    with open(file, 'w', encoding='utf8',
+              buffering=_WRITE_BUFFER_BYTES) as outf:
         if dims:
-            print(*matrix.shape, file=outf)
-        for idx, word in enumerate(vocab):
-            row = matrix[idx]  # type: np.ndarray
-            if embeddings.norms is not None:
-                row = row * embeddings.norms[idx]
-            print(word, ' '.join(map(str, row)), sep=sep, file=outf)
-
-
-__all__ = ['load_text', 'load_text_dims', 'write_text', 'write_text_dims']
+            print(n_rows, cols, file=outf)
+        start = 0
+        for block in _denormalized_blocks(embeddings.storage, embeddings.norms,
+                                          n_rows):
+            # components are formatted like str(np.float32), i.e. with the shortest
+            # representation that round-trips
+            rows = block.astype(str).tolist()
+            block_words = words[start:start + len(rows)]
+            outf.write("".join(f"{word}{sep}{' '.join(row)}\n"
+                               for word, row in zip(block_words, rows)))
+            start += len(rows)
+
+
+__all__ = [
+    'load_text', 'load_text_dims', 'load_text_stream', 'write_text',
+    'write_text_dims'
+]
@@ -2,18 +2,24 @@
 Word2vec binary format.
 """
 
-import sys
+import mmap
+import re
 from os import PathLike
-from typing import Union, BinaryIO, AnyStr
+from typing import Union, List, Tuple
 
 import numpy as np
 
 from finalfusion.embeddings import Embeddings
-from finalfusion.io import _serialize_array_as_le
 from finalfusion.storage import NdArray
-from finalfusion._util import _normalize_matrix
+from finalfusion._util import _normalize_matrix, _denormalized_blocks
 from finalfusion.vocab import SimpleVocab
 
+# Number of rows that are copied by one gather.
+_GATHER_BLOCK_ROWS = 4096
+
+# Size of the output buffer of the writer.
+_WRITE_BUFFER_BYTES = 1 << 20
+
 
 def load_word2vec(file: Union[str, bytes, int, PathLike],
                   lossy: bool = False) -> Embeddings:
@@ -40,16 +46,12 @@ def load_word2vec(file: Union[str, bytes, int, PathLike],
     embeddings : Embeddings
         The embeddings from the input file.
     """
-    words = []
     with open(file, 'rb') as inf:
-        rows, cols = map(int, inf.readline().decode("ascii").split())
-        matrix = np.zeros((rows, cols), dtype=np.float32)
-        for row in matrix:
-            words.append(_read_binary_word(inf, b' ', lossy).strip())
-            array = np.fromfile(file=inf, count=cols, dtype=np.float32)
-            if sys.byteorder == "big":
-                array.byteswap(inplace=True)
-            row[:] = array
+        header = inf.readline()
+        rows, cols = map(int, header.decode("ascii").split())
+        with mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            words, offsets = _scan_rows(buf, len(header), rows, cols, lossy)
+            matrix = _gather_rows(buf, offsets, cols)
     storage = NdArray(matrix)
     return Embeddings(storage=storage,
                       norms=_normalize_matrix(storage),
@@ -85,32 +87,67 @@ def write_word2vec(file: Union[str, bytes, int, PathLike],
     embeddings : Embeddings
         The embeddings to serialize.
     """
-    vocab = embeddings.vocab
-    matrix = embeddings.storage[:len(vocab)]
-    with open(file, 'wb') as outf:
-        outf.write(f'{matrix.shape[0]} {matrix.shape[1]}\n'.encode('ascii'))
-        for idx, word in enumerate(vocab):
-            row = matrix[idx]  # type: np.ndarray
-            if embeddings.norms is not None:
-                row = row * embeddings.norms[idx]
-            b_word = word.encode('utf-8')
-            outf.write(b_word)
-            outf.write(b' ')
-            _serialize_array_as_le(outf, row)
-            outf.write(b'\n')
-
-
-def _read_binary_word(inf: BinaryIO, delim: AnyStr, lossy: bool):
-    word = []
-    while True:
-        byte = inf.read(1)
-        if byte == delim:
-            break
-        if byte == b'':
-            raise EOFError
-        word.append(byte)
-    return b''.join(word).decode('utf-8',
-                                 errors='replace' if lossy else 'strict')
+    words = embeddings.vocab.words
+    n_rows, cols = len(words), embeddings.storage.shape[1]
+    row_size = cols * 4
+    with open(file, 'wb', buffering=_WRITE_BUFFER_BYTES) as outf:
+        outf.write(f'{n_rows} {cols}\n'.encode('ascii'))
+        start = 0
+        for block in _denormalized_blocks(embeddings.storage, embeddings.norms,
+                                          n_rows):
+            data = memoryview(block.astype('<f4').tobytes())
+            lines = []  # type: List[Union[bytes, memoryview]]
+            for row, word in enumerate(words[start:start + len(block)]):
+                lines.extend(
+                    (word.encode('utf-8'), b' ',
+                     data[row * row_size:(row + 1) * row_size], b'\n'))
+            outf.write(b''.join(lines))
+            start += len(block)
+
+
+def _scan_rows(buf: mmap.mmap, offset: int, rows: int, cols: int,
+               lossy: bool) -> Tuple[List[str], np.ndarray]:
+    """
+    Find the words and the byte offsets of their embeddings.
+
+    The rows are matched by a single scan of a regular expression over the buffer, the offsets
+    follow from the lengths of the words.
+    """
+    errors = 'replace' if lossy else 'strict'
+    row_size = cols * 4
+    # rows may be separated by a newline that ends up before the next word
+    row_pat = re.compile(rb'([^ ]*) .{%d}' % row_size, re.DOTALL)
+    prefixes = row_pat.findall(buf, offset)[:rows]  # type: List[bytes]
+    if len(prefixes) < rows:
+        raise EOFError
+    words = [
+        prefix.strip().decode('utf-8', errors=errors) for prefix in prefixes
+    ]
+    prefix_lens = np.fromiter(map(len, prefixes), dtype=np.int64, count=rows)
+    row_ends = offset + np.cumsum(prefix_lens + 1 + row_size)
+    return words, row_ends - row_size
+
+
+def _gather_rows(buf: mmap.mmap, offsets: np.ndarray, cols: int) -> np.ndarray:
+    """
+    Copy the little-endian float32 rows starting at the byte offsets into a matrix.
+
+    Rows are gathered through a strided view of the buffer with one window of bytes per
+    possible offset, so only the copied rows are materialized.
+    """
+    row_size = cols * 4
+    matrix = np.empty((len(offsets), cols), dtype=np.float32)
+    data = np.frombuffer(buf, dtype=np.uint8)
+    n_windows = max(len(data) - row_size + 1, 0)
+    windows = np.lib.stride_tricks.as_strided(data,
+                                              shape=(n_windows, row_size),
+                                              strides=(1, 1),
+                                              writeable=False)
+    for start in range(0, len(offsets), _GATHER_BLOCK_ROWS):
+        block = offsets[start:start + _GATHER_BLOCK_ROWS]
+        matrix[start:start + len(block)] = windows[block].view('<f4')
+    del windows, data
+    return matrix
 
 
 __all__ = ['load_word2vec', 'write_word2vec']
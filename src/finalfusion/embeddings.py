@@ -1,23 +1,26 @@
 """
 Finalfusion Embeddings
 """
-import heapq
-from dataclasses import field, dataclass
 from os import PathLike
-from typing import Optional, Tuple, List, Union, Any, Iterator, Set
+from typing import Optional, Tuple, List, Union, Any, Iterator, Sequence, BinaryIO, cast
 
 import numpy as np
 
+from finalfusion._batch import _batch_segments, _compose_rows
+from finalfusion._lazy import _LazyChunks, _VOCAB_TYPES, _STORAGE_TYPES
+from finalfusion._similarity import SimilarityResult, _SimilarityQueries
+from finalfusion.cache import EmbeddingCache
 from finalfusion.io import Chunk, Header, _read_chunk_header, ChunkIdentifier, \
     FinalfusionFormatError, _read_required_chunk_header
+from finalfusion.ivf import IVFIndex
 from finalfusion.metadata import Metadata
 from finalfusion.norms import Norms
-from finalfusion.storage import Storage, NdArray, QuantizedArray
-from finalfusion.vocab import Vocab, SimpleVocab, FinalfusionBucketVocab, FastTextVocab, \
-    ExplicitVocab
+from finalfusion.storage import Storage, NdArray
+from finalfusion.vocab import Vocab, FinalfusionBucketVocab, FastTextVocab
+from finalfusion.vocab.subword import _bucket_to_explicit
 
 
-class Embeddings:  # pylint: disable=too-many-instance-attributes
+class Embeddings(_SimilarityQueries):  # pylint: disable=too-many-instance-attributes
     """
     Embeddings class.
 
@@ -52,9 +55,14 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
     3. :class:`~finalfusion.metadata.Metadata`
     4. :class:`~finalfusion.norms.Norms`
 
+    Embeddings can be pickled, e.g. to pass them to a process pool. Memory-mapped storages, norms,
+    vocabularies and similarity indices are pickled as references to their file and mapped again
+    when unpickled, so sending them to another process does not copy the embeddings.
+
     Examples
     --------
     >>> storage = NdArray(np.float32(np.random.rand(2, 10)))
+    >>> from finalfusion.vocab import SimpleVocab
     >>> vocab = SimpleVocab(["Some", "words"])
     >>> metadata = Metadata({"Some": "value", "numerical": 0})
     >>> norms = Norms(np.float32(np.random.rand(2)))
@@ -114,11 +122,16 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
 
         """
         Embeddings._check_requirements(storage, vocab, norms, metadata)
-        self._storage = storage
-        self._vocab = vocab
+        # storage and vocab are None until lazily loaded chunks are loaded
+        self._storage = storage  # type: Optional[Storage]
+        self._vocab = vocab  # type: Optional[Vocab]
         self._norms = norms
         self._metadata = metadata
         self._origin = origin
+        self._similarity_memory_budget = None  # type: Optional[int]
+        self._similarity_index = None  # type: Optional[IVFIndex]
+        self._lazy_chunks = None  # type: Optional[_LazyChunks]
+        self._oov_cache = None  # type: Optional[EmbeddingCache]
 
     def __getitem__(self, item: str) -> np.ndarray:
         """
@@ -144,8 +157,13 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         :func:`~Embeddings.embedding`
         :func:`~Embeddings.embedding_with_norm`
         """
+        if self._oov_cache is not None:
+            embedding = self.embedding(item)
+            if embedding is None:
+                raise KeyError(f"No indices found for {item}")
+            return embedding
         # no need to check for none since Vocab raises KeyError if it can't produce indices
-        idx = self._vocab[item]
+        idx = self.vocab[item]
         return self._embedding(idx)[0]
 
     def embedding(self,
@@ -185,6 +203,7 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         --------
         >>> matrix = np.float32(np.random.rand(2, 10))
         >>> storage = NdArray(matrix)
+        >>> from finalfusion.vocab import SimpleVocab
         >>> vocab = SimpleVocab(["Some", "words"])
         >>> embeddings = Embeddings(storage=storage, vocab=vocab)
         >>> np.allclose(embeddings.embedding("Some"), matrix[0])
@@ -209,13 +228,13 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         :func:`~Embeddings.embedding_with_norm`
         :func:`~Embeddings.__getitem__`
         """
-        idx = self._vocab.idx(word)
-        if idx is None:
+        val = self._lookup(word, out)
+        if val is None:
             if out is not None and default is not None:
                 out[:] = default
                 return out
             return default
-        return self._embedding(idx, out)[0]
+        return val[0]
 
     def embedding_with_norm(self,
                             word: str,
@@ -255,19 +274,89 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         :func:`~Embeddings.embedding`
         :func:`~Embeddings.__getitem__`
         """
-        if self._norms is None:
+        if self.norms is None:
             raise TypeError("embeddings don't contain norms chunk")
-        idx = self._vocab.idx(word)
-        if idx is None:
+        # declare the norm as Any, self._lookup returns Optional[float], but above its
+        # ensured norms are present, the norm is guaranteed to be float, not Optional[float]
+        val = self._lookup(word, out)  # type: Optional[Tuple[np.ndarray, Any]]
+        if val is None:
             if out is not None and default is not None:
                 out[:] = default[0]
                 return out, default[1]
             return default
-        # declare the norm as Any, self._embedding returns Optional[float], but above its
-        # ensured norms are present, the norm is guaranteed to be float, not Optional[float]
-        val = self._embedding(idx, out)  # type: Tuple[np.ndarray, Any]
         return val
 
+    def embedding_batch(self,
+                        words: Sequence[str],
+                        out: Optional[np.ndarray] = None,
+                        default: Optional[np.ndarray] = None
+                        ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batched embedding lookup.
+
+        Looks up the embeddings for all input words and writes them into a single
+        ``(len(words), dims)`` matrix. Embeddings of known words are retrieved through a single
+        gather from the storage. For subword vocabularies, the subword indices of all unknown
+        words are extracted in bulk through
+        :meth:`~finalfusion.vocab.subword.SubwordVocab.subword_indices_batch` and their
+        embeddings are composed through one segmented sum over all subword embeddings. For
+        float32 :class:`~finalfusion.storage.ndarray.NdArray` storage, the rows are gathered and
+        summed by :func:`~finalfusion.subword.lookup.sum_rows` without holding the GIL, so
+        concurrent lookups from multiple threads run in parallel.
+
+        If an `out` matrix is specified, the embeddings are written into the matrix.
+
+        Rows of words for which no embedding can be retrieved are set to `default`. If no default
+        is given, these rows are left untouched, i.e. they are zero if no `out` matrix is passed.
+        The returned mask can be used to tell these rows apart.
+
+        Parameters
+        ----------
+        words : Sequence[str]
+            The query words.
+        out : numpy.ndarray, optional
+            Optional output matrix with shape ``(len(words), dims)`` to write the embeddings into.
+        default : numpy.ndarray, optional
+            Optional default value for rows without an embedding.
+
+        Returns
+        -------
+        (embeddings, mask) : Tuple[numpy.ndarray, numpy.ndarray]
+            Matrix holding the embeddings and a boolean mask which is ``True`` for all rows that
+            hold an embedding.
+
+        Raises
+        ------
+        AssertionError
+            If `out` does not have the shape ``(len(words), dims)``.
+
+        Examples
+        --------
+        >>> matrix = np.float32(np.random.rand(2, 10))
+        >>> from finalfusion.vocab import SimpleVocab
+        >>> embeddings = Embeddings(storage=NdArray(matrix), vocab=SimpleVocab(["Some", "words"]))
+        >>> batch, mask = embeddings.embedding_batch(["words", "oov", "Some"])
+        >>> mask
+        array([ True, False,  True])
+        >>> np.allclose(batch[[0, 2]], matrix[[1, 0]])
+        True
+        >>> np.allclose(batch[1], 0)
+        True
+
+        See Also
+        --------
+        :func:`~Embeddings.embedding`
+        """
+        if out is None:
+            out = np.zeros((len(words), self.dims), dtype=np.float32)
+        assert out.shape == (len(words), self.dims), \
+            f"out needs to have shape {(len(words), self.dims)}, not {out.shape}"
+        indptr, indices, normalize = _batch_segments(self.vocab, words)
+        mask = _compose_rows(self.storage, indptr, indices, normalize, out)
+        if default is not None:
+            out[~mask] = default
+        return out, mask
+
     @property
     def dims(self) -> int:
         """
@@ -302,7 +391,8 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         storage : Storage
             The embeddings storage.
         """
-        return self._storage
+        self._load_lazy("storage")
+        return cast(Storage, self._storage)
 
     @property
     def vocab(self) -> Vocab:
@@ -314,7 +404,8 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         vocab : Vocab
             The vocabulary
         """
-        return self._vocab
+        self._load_lazy("vocab")
+        return cast(Vocab, self._vocab)
 
     @property
     def norms(self) -> Optional[Norms]:
@@ -337,10 +428,12 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         TypeError
             If ``norms`` is neither Norms nor None.
         """
+        self._load_lazy("norms")
         return self._norms
 
     @norms.setter
     def norms(self, norms: Optional[Norms]):
+        self._discard_lazy("norms")
         if norms is None:
             self._norms = None
         else:
@@ -365,10 +458,12 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         TypeError
             If ``metadata`` is neither Metadata nor None.
         """
+        self._load_lazy("metadata")
         return self._metadata
 
     @metadata.setter
     def metadata(self, metadata: Optional[Metadata]):
+        self._discard_lazy("metadata")
         if metadata is None:
             self._metadata = None
         elif isinstance(metadata, Metadata):
@@ -388,6 +483,143 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         """
         return self._origin
 
+    @property
+    def similarity_memory_budget(self) -> Optional[int]:
+        """
+        The memory budget of similarity queries in bytes.
+
+        Similarity queries score the vocabulary in blocks of rows and keep a running top-k of
+        the candidates. The budget bounds the size of these blocks: it covers the block's rows,
+        which are paged in from memory-mapped storage, or the codes of quantized storage,
+        and the block's similarities. Queries therefore never materialize the complete
+        embedding matrix. If no budget is set, blocks of a fixed number of rows are used.
+
+        :Getter: Returns None or the memory budget.
+        :Setter: Set the memory budget.
+
+        Returns
+        -------
+        budget : int, optional
+            The memory budget in bytes or None.
+
+        Raises
+        ------
+        ValueError
+            If the budget is not a positive number.
+        """
+        return self._similarity_memory_budget
+
+    @similarity_memory_budget.setter
+    def similarity_memory_budget(self, budget: Optional[int]):
+        if budget is not None and budget <= 0:
+            raise ValueError(
+                f"memory budget needs to be positive, not {budget}")
+        self._similarity_memory_budget = budget
+
+    @property
+    def oov_cache(self) -> Optional[EmbeddingCache]:
+        """
+        The cache of embeddings of unknown words.
+
+        Embeddings of unknown words are composed from their subword embeddings on every lookup.
+        If a cache is set, :meth:`~Embeddings.__getitem__`, :meth:`~Embeddings.embedding` and
+        :meth:`~Embeddings.embedding_with_norm` store composed embeddings in the cache and
+        return cached embeddings for repeated lookups of the same word.
+
+        :Getter: Returns None or the cache.
+        :Setter: Set the cache. Setting None disables caching.
+
+        Returns
+        -------
+        cache : EmbeddingCache, optional
+            The cache or None.
+
+        Raises
+        ------
+        TypeError
+            If the cache is not an EmbeddingCache.
+        ValueError
+            If the dimensionality of the cache does not match the embeddings.
+
+        Examples
+        --------
+        >>> from finalfusion.subword import FinalfusionHashIndexer
+        >>> embeddings = Embeddings(NdArray(np.ones((10, 2), dtype=np.float32)),
+        ...                         FinalfusionBucketVocab(["one", "two"],
+        ...                                                FinalfusionHashIndexer(3)))
+        >>> embeddings.oov_cache = EmbeddingCache(embeddings.dims, capacity=100)
+        >>> embeddings["three"]
+        array([0.70710677, 0.70710677], dtype=float32)
+        >>> embeddings["three"]
+        array([0.70710677, 0.70710677], dtype=float32)
+        >>> embeddings.oov_cache.hits, embeddings.oov_cache.misses
+        (1, 1)
+        """
+        return self._oov_cache
+
+    @oov_cache.setter
+    def oov_cache(self, cache: Optional[EmbeddingCache]):
+        if cache is None:
+            self._oov_cache = None
+            return
+        if not isinstance(cache, EmbeddingCache):
+            raise TypeError(
+                f"Expected 'None' or 'EmbeddingCache', not '{type(cache).__name__}'"
+            )
+        if cache.dims != self.dims:
+            raise ValueError(
+                f"cache dims {cache.dims} don't match embedding dims {self.dims}"
+            )
+        self._oov_cache = cache
+
+    @property
+    def similarity_index(self) -> Optional[IVFIndex]:
+        """
+        The approximate nearest neighbour index of similarity queries.
+
+        If an index is set, :meth:`~Embeddings.word_similarity`,
+        :meth:`~Embeddings.embedding_similarity`, :meth:`~Embeddings.analogy` and
+        :meth:`~Embeddings.embedding_similarity_batch` only score the candidates retrieved
+        through the index instead of the complete vocabulary. The results are approximate, their
+        recall can be measured with :meth:`~Embeddings.similarity_index_recall`.
+
+        :Getter: Returns None or the index.
+        :Setter: Set the index. Setting None restores exact similarity queries.
+
+        Returns
+        -------
+        index : IVFIndex, optional
+            The index or None.
+
+        Raises
+        ------
+        TypeError
+            If the index is not an IVFIndex.
+        ValueError
+            If the index does not cover the vocabulary.
+        """
+        self._load_lazy("similarity_index")
+        return self._similarity_index
+
+    @similarity_index.setter
+    def similarity_index(self, index: Optional[IVFIndex]):
+        self._discard_lazy("similarity_index")
+        if index is None:
+            self._similarity_index = None
+            return
+        if not isinstance(index, IVFIndex):
+            raise TypeError(
+                f"Expected 'None' or 'IVFIndex', not '{type(index).__name__}'")
+        if index.n_rows != len(self.vocab):
+            raise ValueError(
+                f"index covers {index.n_rows} rows, vocab has {len(self.vocab)} words"
+            )
+        if index.centroids.shape[1] != self.dims:
+            raise ValueError(
+                f"index has {index.centroids.shape[1]} dims, storage has {self.dims}"
+            )
+        self._similarity_index = index
+
     def chunks(self) -> List[Chunk]:
         """
         Get the Embeddings Chunks as a list.
@@ -398,6 +630,7 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
             2. Vocabulary
             3. Storage
             4. Norms (optional)
+            5. Similarity index (optional)
 
         Returns
         -------
@@ -411,6 +644,8 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         chunks.append(self.storage)
         if self.norms is not None:
             chunks.append(self.norms)
+        if self.similarity_index is not None:
+            chunks.append(self.similarity_index)
         return chunks
 
     def write(self, file: Union[str, bytes, int, PathLike]):
@@ -457,139 +692,81 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
         if not isinstance(self.vocab, bucket_vocabs):
             raise TypeError(
                 "Only bucketed embeddings can be converted to explicit.")
-        vocab = self.vocab.to_explicit()
-        storage = np.zeros((vocab.upper_bound, self._storage.shape[1]),
-                           dtype=np.float32)
-        storage[:len(vocab)] = self._storage[:len(vocab)]
-        for ngram in vocab.subword_indexer:
-            storage[len(vocab) + vocab.subword_indexer[ngram]] = self._storage[
-                len(vocab) + self.vocab.subword_indexer(ngram)]
+        vocab, buckets = _bucket_to_explicit(self.vocab)
+        dtype = np.float32
+        if isinstance(self.storage, NdArray):
+            dtype = self.storage.dtype
+        storage = np.zeros((vocab.upper_bound, self.storage.shape[1]),
+                           dtype=dtype)
+        storage[:len(vocab)] = self.storage[:len(vocab)]
+        storage[len(vocab):] = self.storage[len(vocab) + buckets]
         return Embeddings(vocab=vocab,
                           storage=NdArray(storage),
                           norms=self.norms)
 
-    def analogy(  # pylint: disable=too-many-arguments
+    def quantize(  # pylint: disable=too-many-arguments
             self,
-            word1: str,
-            word2: str,
-            word3: str,
-            k: int = 1,
-            skip: Set[str] = None) -> Optional[List['SimilarityResult']]:
+            n_subquantizers: Optional[int] = None,
+            n_centroids: int = 256,
+            n_iterations: int = 25,
+            sample_size: Optional[int] = None,
+            opq: bool = False,
+            normalize: bool = True,
+            n_threads: int = 1,
+            seed: Optional[int] = None) -> 'Embeddings':
         """
-        Perform an analogy query.
+        Quantize the embeddings.
 
-        This method returns words that are close in vector space the analogy
-        query `word1` is to `word2` as `word3` is to `?`. More concretely,
-        it searches embeddings that are similar to:
+        The storage is quantized with a product quantizer, see :meth:`NdArray.quantize
+        <finalfusion.storage.ndarray.NdArray.quantize>` for a description of the parameters.
+        The vocabulary and norms are shared with the new embeddings.
 
-        ``embedding(word2) - embedding(word1) + embedding(word3)``
-
-        Words specified in ``skip`` are not considered as answers. If ``skip``
-        is None, the query words ``word1``, ``word2`` and ``word3`` are
-        excluded.
-
-        At most, ``k`` results are returned. ``None`` is returned when no
-        embedding could be computed for any of the tokens.
-
-        Parameters
-        ----------
-        word1 : str
-            Word1 is to...
-        word2 : str
-            word2 like...
-        word3 : str
-            word3 is to the return value
-        skip : Set[str]
-            Set of strings which should not be considered as answers. Defaults
-            to ``None`` which excludes the query strings. To allow the query
-            strings as answers, pass an empty set.
-        k : int
-            Number of answers to return, defaults to 1.
-
-        Returns
-        -------
-        answers : List[SimilarityResult]
-            List of answers.
-        """
-        embed_a = self.embedding(word1)
-        embed_b = self.embedding(word2)
-        embed_c = self.embedding(word3)
-        if embed_a is None or embed_b is None or embed_c is None:
-            return None
-        diff = embed_b - embed_a
-        embed_d = embed_c + diff
-        embed_d /= np.linalg.norm(embed_d)
-        return self._similarity(
-            embed_d, k, {word1, word2, word3} if skip is None else skip)
-
-    def word_similarity(self, query: str,
-                        k: int = 10) -> Optional[List['SimilarityResult']]:
-        """
-        Retrieves the nearest neighbors of the query string.
-
-        The similarity between the embedding of the query and other embeddings
-        is defined by the dot product of the embeddings. If the vectors are
-        unit vectors, this is the cosine similarity.
-
-        At most, ``k`` results are returned.
-
-        Parameters
-        ----------
-        query : str
-            The query string
-        k : int
-            The number of neighbors to return, defaults to 10.
+        Metadata is **not** copied to the new embeddings since it doesn't reflect the
+        changes. You can manually set the metadata and update the values accordingly.
 
         Returns
         -------
-        neighbours : List[Tuple[str, float], optional
-            List of tuples with neighbour and similarity measure. None if no
-            embedding can be found for ``query``.
-        """
-        embed = self.embedding(query)
-        if embed is None:
-            return None
-        return self._similarity(embed, k, {query})
-
-    def embedding_similarity(self,
-                             query: np.ndarray,
-                             k: int = 10,
-                             skip: Optional[Set[str]] = None
-                             ) -> Optional[List['SimilarityResult']]:
-        """
-        Retrieves the nearest neighbors of the query embedding.
-
-        The similarity between the query embedding and other embeddings is
-        defined by the dot product of the embeddings. If the vectors are unit
-        vectors, this is the cosine similarity.
-
-        At most, ``k`` results are returned.
-
-        Parameters
-        ----------
-        query : str
-            The query array.
-        k : int
-            The number of neighbors to return, defaults to 10.
-        skip : Set[str], optional
-            Set of strings that should not be considered as neighbours.
+        embeddings : Embeddings
+            Embeddings with QuantizedArray storage.
 
-        Returns
-        -------
-        neighbours : List[Tuple[str, float], optional
-            List of tuples with neighbour and similarity measure. None if no
-            embedding can be found for ``query``.
-        """
-        return self._similarity(query, k, set() if skip is None else skip)
+        Raises
+        ------
+        TypeError
+            If the storage is not an NdArray.
+        ValueError
+            If the quantizer configuration is invalid.
+        """
+        if not isinstance(self.storage, NdArray):
+            raise TypeError("Only NdArray storage can be quantized.")
+        storage = self.storage.quantize(n_subquantizers=n_subquantizers,
+                                        n_centroids=n_centroids,
+                                        n_iterations=n_iterations,
+                                        sample_size=sample_size,
+                                        opq=opq,
+                                        normalize=normalize,
+                                        n_threads=n_threads,
+                                        seed=seed)
+        return Embeddings(vocab=self.vocab, storage=storage, norms=self.norms)
 
     def __contains__(self, item):
-        return item in self._vocab
+        return item in self.vocab
 
     def __iter__(self) -> Union[Iterator[Tuple[str, np.ndarray]], Iterator[
             Tuple[str, np.ndarray, float]]]:
-        if self._norms is not None:
-            return zip(self._vocab, self._storage, self._norms)
-        return zip(self._vocab, self._storage)
+        if self.norms is not None:
+            return zip(self.vocab, self.storage, self.norms)
+        return zip(self.vocab, self.storage)
+
+    def __reduce__(self):
+        # chunks that are still pending are loaded, memory-mapped chunks are pickled as
+        # references to the file
+        state = {
+            "_similarity_memory_budget": self._similarity_memory_budget,
+            "_similarity_index": self.similarity_index,
+            "_oov_cache": self._oov_cache,
+        }
+        return type(self), (self.storage, self.vocab, self.norms,
+                            self.metadata, self.origin), state
 
     def __repr__(self):
         return f"{type(self).__name__}(\n" \
@@ -602,36 +779,43 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
                f"\torigin='{self.origin}',\n" \
                f")"
 
-    def _similarity(self, query: np.ndarray, k: int,
-                    skips: Set[str]) -> List['SimilarityResult']:
-        words = self.storage[:len(self.vocab)]  # type: np.ndarray
-        sims = words.dot(query)
-        skip_indices = set(skip for skip in (self.vocab.word_index.get(skip)
-                                             for skip in skips)
-                           if skip is not None)
-        partition = sims.argpartition(-k -
-                                      len(skip_indices))[-k -
-                                                         len(skip_indices):]
-
-        heap = []  # type: List[SimilarityResult]
-        for idx in partition:
-            if idx not in skip_indices:
-                heapq.heappush(
-                    heap, SimilarityResult(self.vocab.words[idx], sims[idx]))
-        return heapq.nlargest(k, heap)
+    def _lookup(self, word: str, out: Optional[np.ndarray] = None
+                ) -> Optional[Tuple[np.ndarray, Optional[float]]]:
+        """
+        Look up the embedding of a word and its norm, None if the word can't be represented.
+
+        Embeddings of unknown words are taken from and stored in the OOV cache if one is set.
+        """
+        cache = self._oov_cache
+        if cache is None:
+            idx = self.vocab.idx(word)
+            return None if idx is None else self._embedding(idx, out)
+        idx = self.vocab.word_index.get(word)
+        if idx is not None:
+            return self._embedding(idx, out)
+        cached = cache.get(word, out)
+        if cached is not None:
+            return cached
+        idx = self.vocab.idx(word)
+        if idx is None:
+            return None
+        embedding, norm = self._embedding(idx, out)
+        # unknown words are composed from subwords, their norm is always computed
+        cache.put(word, embedding, cast(float, norm))
+        return embedding, norm
 
     def _embedding(self,
                    idx: Union[int, List[int]],
                    out: Optional[np.ndarray] = None
                    ) -> Tuple[np.ndarray, Optional[float]]:
-        res = self._storage[idx]  # type: np.ndarray
+        res = self.storage[idx]  # type: np.ndarray
         if res.ndim == 1:
             if out is not None:
                 out[:] = res
             else:
                 out = res
-            if self._norms is not None:
-                norm = self._norms[idx]  # type: Optional[float]
+            if self.norms is not None:
+                norm = self.norms[idx]  # type: Optional[float]
             else:
                 norm = None
         else:
@@ -640,6 +824,37 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
             out /= norm
         return out, norm
 
+    @classmethod
+    def _from_lazy_chunks(cls, lazy_chunks: '_LazyChunks') -> 'Embeddings':
+        """
+        Create Embeddings whose chunks are loaded on first access.
+        """
+        embeddings = cls.__new__(cls)
+        embeddings._storage = None
+        embeddings._vocab = None
+        embeddings._norms = None
+        embeddings._metadata = None
+        embeddings._origin = lazy_chunks.origin
+        embeddings._similarity_memory_budget = None
+        embeddings._similarity_index = None
+        embeddings._lazy_chunks = lazy_chunks
+        embeddings._oov_cache = None
+        return embeddings
+
+    def _load_lazy(self, chunk: str):
+        """
+        Load a lazily loaded chunk on first access.
+        """
+        if self._lazy_chunks is not None:
+            self._lazy_chunks.load_into(self, chunk)
+
+    def _discard_lazy(self, chunk: str):
+        """
+        Don't load a lazily loaded chunk, e.g. because it is replaced.
+        """
+        if self._lazy_chunks is not None:
+            self._lazy_chunks.discard(chunk)
+
     @staticmethod
     def _check_requirements(storage: Storage, vocab: Vocab,
                             norms: Optional[Norms],
@@ -664,7 +879,9 @@ class Embeddings:  # pylint: disable=too-many-instance-attributes
 
 
 def load_finalfusion(file: Union[str, bytes, int, PathLike],
-                     mmap: bool = False) -> Embeddings:
+                     mmap: bool = False,
+                     mmap_vocab: bool = False,
+                     lazy: bool = False) -> Embeddings:
     """
     Read embeddings from a file in finalfusion format.
 
@@ -673,63 +890,83 @@ def load_finalfusion(file: Union[str, bytes, int, PathLike],
     file : str, bytes, int, PathLike
         Path to a file with embeddings in finalfusoin format.
     mmap : bool
-        Toggles memory mapping the storage buffer.
+        Toggles memory mapping the storage buffer and the similarity index.
+    mmap_vocab : bool
+        Toggles memory mapping the words of the vocabulary. Words are then decoded on access
+        and looked up through a hash table that is built on the first lookup, see
+        :meth:`Vocab.mmap_chunk <finalfusion.vocab.vocab.Vocab.mmap_chunk>`.
+    lazy : bool
+        Toggles lazy loading. Only the chunk headers are read while loading, each chunk is read
+        from the file on first access of the corresponding attribute, e.g.
+        :attr:`Embeddings.vocab`. Lazily loaded chunks are not checked for compatibility with
+        each other.
 
     Returns
     -------
     embeddings : Embeddings
         The embeddings from the input file.
+
+    Raises
+    ------
+    FinalfusionFormatError
+        If the file is not a valid finalfusion file or lacks a vocab or storage chunk.
     """
+    if lazy:
+        return Embeddings._from_lazy_chunks(  # pylint: disable=protected-access
+            _LazyChunks(file, mmap, mmap_vocab))
     with open(file, 'rb') as inf:
         _ = Header.read_chunk(inf)
         chunk_id, _ = _read_required_chunk_header(inf)
-        norms = None
         metadata = None
 
         if chunk_id == ChunkIdentifier.Metadata:
             metadata = Metadata.read_chunk(inf)
             chunk_id, _ = _read_required_chunk_header(inf)
 
-        if chunk_id == ChunkIdentifier.SimpleVocab:
-            vocab = SimpleVocab.read_chunk(inf)  # type: Vocab
-        elif chunk_id == ChunkIdentifier.BucketSubwordVocab:
-            vocab = FinalfusionBucketVocab.read_chunk(inf)
-        elif chunk_id == ChunkIdentifier.FastTextSubwordVocab:
-            vocab = FastTextVocab.read_chunk(inf)
-        elif chunk_id == ChunkIdentifier.ExplicitSubwordVocab:
-            vocab = ExplicitVocab.read_chunk(inf)
-        else:
+        vocab_type = None if chunk_id is None else _VOCAB_TYPES.get(chunk_id)
+        if vocab_type is None:
             raise FinalfusionFormatError(
                 f'Expected vocab chunk, not {str(chunk_id)}')
+        vocab = vocab_type.load(inf, mmap_vocab)  # type: Vocab
 
         chunk_id, _ = _read_required_chunk_header(inf)
-        if chunk_id == ChunkIdentifier.NdArray:
-            storage = NdArray.load(inf, mmap)  # type: Storage
-        elif chunk_id == ChunkIdentifier.QuantizedArray:
-            storage = QuantizedArray.load(inf, mmap)
-        else:
+        storage_type = None if chunk_id is None else _STORAGE_TYPES.get(
+            chunk_id)
+        if storage_type is None:
             raise FinalfusionFormatError(
                 f'Expected storage chunk, not {str(chunk_id)}')
-        maybe_chunk_id = _read_chunk_header(inf)
-        if maybe_chunk_id is not None:
-            if maybe_chunk_id[0] == ChunkIdentifier.NdNorms:
-                norms = Norms.read_chunk(inf)
-            else:
-                raise FinalfusionFormatError(
-                    f'Expected norms chunk, not {str(chunk_id)}')
+        storage = storage_type.load(inf, mmap)  # type: Storage
+        norms, similarity_index = _read_trailing_chunks(inf, mmap)
+        embeddings = Embeddings(storage, vocab, norms, metadata, inf.name)
+        embeddings.similarity_index = similarity_index
+        return embeddings
 
-        return Embeddings(storage, vocab, norms, metadata, inf.name)
 
-
-@dataclass(order=True)
-class SimilarityResult:
+def _read_trailing_chunks(inf: BinaryIO, mmap: bool
+                          ) -> Tuple[Optional[Norms], Optional[IVFIndex]]:
     """
-    Container for a Similarity result.
+    Read the optional norms and similarity index chunks that follow the storage.
 
-    The word can be accessed through ``result.word``, the similarity through ``result.similarity``.
+    Unknown chunks are skipped.
     """
-    word: str = field(compare=False)
-    similarity: float
+    norms = None
+    similarity_index = None
+    while True:
+        chunk_header = _read_chunk_header(inf)
+        if chunk_header is None:
+            break
+        chunk_id, chunk_size = chunk_header
+        chunk_end = inf.tell() + chunk_size
+        if chunk_id == ChunkIdentifier.NdNorms and norms is None:
+            norms = Norms.read_chunk(inf)
+        elif chunk_id == ChunkIdentifier.IVFIndex and similarity_index is None:
+            similarity_index = IVFIndex.load(inf, mmap)
+        elif chunk_id is not None:
+            raise FinalfusionFormatError(
+                f'Expected norms or index chunk, not {str(chunk_id)}')
+        # skip unknown chunks and padding
+        inf.seek(chunk_end)
+    return norms, similarity_index
 
 
 __all__ = ['Embeddings', 'SimilarityResult', 'load_finalfusion']
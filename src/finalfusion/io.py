@@ -13,6 +13,7 @@ The :class:`Header` handles the preamble of finalfusion files.
 :class:`FinalfusionFormatError` is raised upon reading from malformed finalfusion
 files.
 """
+import mmap
 import struct
 import sys
 from abc import ABC, abstractmethod
@@ -192,6 +193,7 @@ class ChunkIdentifier(IntEnum):
     NdNorms = 6
     FastTextSubwordVocab = 7
     ExplicitSubwordVocab = 8
+    IVFIndex = 10
 
 
 @unique
@@ -200,6 +202,7 @@ class TypeId(IntEnum):
     Known finalfusion data types.
     """
     u8 = 1
+    f16 = 9
     f32 = 10
 
 
@@ -276,7 +279,7 @@ def _read_required_binary(file: BinaryIO, struct_fmt: str) -> Tuple[Any, ...]:
 
 
 def _read_chunk_header(file: BinaryIO
-                       ) -> Optional[Tuple['ChunkIdentifier', int]]:
+                       ) -> Optional[Tuple[Optional['ChunkIdentifier'], int]]:
     """
     Reads the chunk header.
 
@@ -284,6 +287,9 @@ def _read_chunk_header(file: BinaryIO
     :class:`.ChunkIdentifier` and and integer specifying the chunk size in
     bytes are returned.
 
+    The identifier of an unknown chunk is None, such chunks can be skipped by
+    seeking over their size.
+
     Parameters
     ----------
     file : BinaryIO
@@ -291,7 +297,7 @@ def _read_chunk_header(file: BinaryIO
 
     Returns
     -------
-    chunk_header : Optional[(ChunkIdentifier, int)]
+    chunk_header : Optional[(Optional[ChunkIdentifier], int)]
         None is returned iff the reader is at EOF.
 
     Raises
@@ -302,10 +308,15 @@ def _read_chunk_header(file: BinaryIO
     val = _read_binary(file, "<IQ")
     if val is None:
         return None
-    return ChunkIdentifier(val[0]), val[1]
+    chunk_id, chunk_size = val
+    try:
+        return ChunkIdentifier(chunk_id), chunk_size
+    except ValueError:
+        return None, chunk_size
 
 
-def _read_required_chunk_header(file: BinaryIO) -> Tuple[ChunkIdentifier, int]:
+def _read_required_chunk_header(file: BinaryIO
+                                ) -> Tuple[Optional[ChunkIdentifier], int]:
     val = _read_chunk_header(file)
     if val is None:
         raise FinalfusionFormatError('could not read chunk header.')
@@ -327,12 +338,71 @@ def _serialize_array_as_le(file: BinaryIO, array: np.ndarray):
 
 
 def _read_array_as_native(file: BinaryIO, dtype: np.dtype,
-                          count: int) -> np.array:
+                          count: int) -> np.ndarray:
     array = np.fromfile(file=file, count=count, dtype=dtype)
     if sys.byteorder == "big":
         array.byteswap(inplace=True)
     return array
 
 
+def _mmap_source(array: np.ndarray
+                 ) -> Optional[Tuple[str, int, Tuple[int, ...], str]]:
+    """
+    Helper method to find the file region of an array that views a read-only memory map.
+
+    Returns the path, offset, shape and dtype of the region if the array is C-contiguous and
+    views a file that was mapped with ``mode='r'``, otherwise None is returned.
+    """
+    if array.size == 0 or not array.flags.c_contiguous:
+        return None
+    # the base of an array need not be an array, e.g. for arrays that view a buffer
+    base = array  # type: Any
+    while isinstance(base, np.ndarray) and not (isinstance(
+            base, np.memmap) and isinstance(base.base, mmap.mmap)):
+        base = base.base
+    if not isinstance(base, np.memmap) or base.mode != 'r' or \
+            base.filename is None:
+        return None
+    delta = array.__array_interface__['data'][0] - \
+        base.__array_interface__['data'][0]
+    return base.filename, base.offset + delta, array.shape, array.dtype.str
+
+
+def _reopen_mmap(path: str, offset: int, shape: Tuple[int, ...],
+                 dtype: str) -> np.memmap:
+    """
+    Helper method to memory map a file region that was described by :func:`_mmap_source`.
+    """
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+class _PickledMmap:  # pylint: disable=too-few-public-methods
+    """
+    Stand-in that pickles an array as the file region of its memory map.
+
+    Unpickling the stand-in maps the region again instead of restoring a copy of the array.
+    """
+    def __init__(self, source: Tuple[str, int, Tuple[int, ...], str]):
+        self._source = source
+
+    def __reduce__(self):
+        return _reopen_mmap, self._source
+
+
+def _pickle_array(array: Optional[np.ndarray]) -> Any:
+    """
+    Helper method to prepare an array for pickling.
+
+    Arrays that view a read-only memory map are replaced by a :class:`_PickledMmap`, other
+    values are returned unchanged.
+    """
+    if array is None:
+        return None
+    source = _mmap_source(array)
+    if source is None:
+        return array
+    return _PickledMmap(source)
+
+
 # export nothing from this module since it's not part of the public API
 __all__ = []  # type: List[str]
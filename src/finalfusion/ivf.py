@@ -0,0 +1,485 @@
+"""
+Approximate nearest neighbour search.
+
+This module contains the :class:`IVFIndex`, an inverted file index that speeds up similarity
+queries on large vocabularies by only scoring the embeddings in the clusters closest to a query.
+"""
+import struct
+import sys
+from os import PathLike
+from typing import Optional, Sequence, Tuple, BinaryIO, Union
+
+import numpy as np
+
+from finalfusion._util import _kmeans, _nearest_centroids
+from finalfusion.io import Chunk, ChunkIdentifier, TypeId, FinalfusionFormatError, find_chunk, \
+    _read_required_binary, _write_binary, _serialize_array_as_le, _read_array_as_native, \
+    _pickle_array
+from finalfusion.storage import Storage
+
+
+class IVFIndex(Chunk):
+    """
+    Inverted file index.
+
+    The index partitions embeddings into ``n_lists`` clusters through k-means. Each cluster
+    stores the indices of its embeddings in an inverted list. Queries are only compared with the
+    embeddings in the ``n_probe`` clusters whose centroids are closest to the query.
+
+    ``n_probe`` trades recall for latency: probing more lists finds more of the exact nearest
+    neighbours but scores more embeddings. Probing all lists is equivalent to exact search.
+
+    An index is attached to :class:`~finalfusion.embeddings.Embeddings` through
+    :attr:`~finalfusion.embeddings.Embeddings.similarity_index`, afterwards
+    :meth:`~finalfusion.embeddings.Embeddings.word_similarity`,
+    :meth:`~finalfusion.embeddings.Embeddings.embedding_similarity`,
+    :meth:`~finalfusion.embeddings.Embeddings.analogy` and the batched similarity queries use the
+    index.
+
+    The index is serialized as its own chunk after the norms, so it does not need to be rebuilt
+    when the embeddings are loaded again. Files with an index chunk can only be loaded by
+    finalfusion versions that support it, older versions reject the unknown chunk.
+
+    Examples
+    --------
+    >>> from finalfusion import Embeddings
+    >>> from finalfusion.storage import NdArray
+    >>> from finalfusion.vocab import SimpleVocab
+    >>> matrix = np.float32(np.random.rand(100, 10))
+    >>> matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    >>> embeddings = Embeddings(NdArray(matrix), SimpleVocab([str(i) for i in range(100)]))
+    >>> index = IVFIndex.build(embeddings.storage[:embeddings.n_words], n_lists=10, n_probe=10)
+    >>> embeddings.similarity_index = index
+    >>> len(embeddings.word_similarity("0", k=5))
+    5
+    >>> embeddings.similarity_index_recall(matrix[:10], k=5)
+    1.0
+    """
+    def __init__(self,
+                 centroids: np.ndarray,
+                 list_indptr: np.ndarray,
+                 list_indices: np.ndarray,
+                 n_probe: int = 8):
+        """
+        Initialize an IVFIndex.
+
+        The embeddings in the i-th inverted list are
+        ``list_indices[list_indptr[i]:list_indptr[i + 1]]``.
+
+        Parameters
+        ----------
+        centroids : numpy.ndarray
+            2-d float32 array holding one centroid per inverted list.
+        list_indptr : numpy.ndarray
+            1-d integer array with ``n_lists + 1`` offsets into ``list_indices``.
+        list_indices : numpy.ndarray
+            1-d integer array holding the embedding indices of all inverted lists.
+        n_probe : int
+            Number of inverted lists that are scored per query.
+
+        Raises
+        ------
+        AssertionError
+            If the inverted lists don't match the number of centroids.
+        ValueError
+            If ``n_probe`` is not positive.
+        """
+        assert centroids.ndim == 2, "centroids need to be a 2-d array"
+        assert list_indptr.shape == (len(centroids) + 1,), \
+            "list_indptr needs to have n_lists + 1 entries"
+        assert list_indptr[-1] == len(list_indices), \
+            "list_indptr needs to cover list_indices"
+        self._centroids = centroids.astype(np.float32, copy=False)
+        self._list_indptr = list_indptr
+        self._list_indices = list_indices
+        self._n_probe = 1
+        self.n_probe = n_probe
+
+    @staticmethod
+    def build(  # pylint: disable=too-many-arguments
+            storage: Storage,
+            n_lists: Optional[int] = None,
+            n_probe: int = 8,
+            n_iterations: int = 10,
+            sample_size: Optional[int] = None,
+            seed: Optional[int] = None) -> 'IVFIndex':
+        """
+        Build an index over the rows of a storage.
+
+        The centroids are trained through k-means on a sample of the rows, afterwards every row is
+        assigned to its closest centroid. Rows are processed in blocks, so memory-mapped and
+        quantized storages are not materialized as a whole.
+
+        Usually, the index is built over the known words, i.e. ``embeddings.storage[:n_words]``.
+
+        Parameters
+        ----------
+        storage : Storage
+            The storage to index.
+        n_lists : int, optional
+            Number of inverted lists. Defaults to the square root of the number of rows.
+        n_probe : int
+            Number of inverted lists that are scored per query.
+        n_iterations : int
+            Number of k-means iterations.
+        sample_size : int, optional
+            Number of rows that the centroids are trained on. Defaults to ``256 * n_lists``.
+        seed : int, optional
+            Seed for sampling rows and initializing centroids.
+
+        Returns
+        -------
+        index : IVFIndex
+            The index.
+        """
+        n_rows = storage.shape[0]
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(n_rows)))
+        assert 0 < n_lists <= n_rows, \
+            f"n_lists needs to be between 1 and the number of rows ({n_rows})"
+        if sample_size is None:
+            sample_size = 256 * n_lists
+        rng = np.random.RandomState(seed)
+        sample_size = max(n_lists, min(sample_size, n_rows))
+        sample = np.sort(rng.choice(n_rows, sample_size, replace=False))
+        centroids = _kmeans(
+            np.asarray(storage[sample]).astype(np.float32, copy=False),
+            n_lists, n_iterations, rng)
+        assignments = np.empty(n_rows, dtype=np.intp)
+        for start in range(0, n_rows, _BUILD_BLOCK_ROWS):
+            end = min(start + _BUILD_BLOCK_ROWS, n_rows)
+            assignments[start:end] = _nearest_centroids(
+                np.asarray(storage[start:end]).astype(np.float32, copy=False),
+                centroids)
+        list_indptr = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists),
+                  out=list_indptr[1:])
+        list_indices = np.argsort(assignments, kind="stable")
+        return IVFIndex(centroids, list_indptr, list_indices, n_probe)
+
+    @classmethod
+    def load(cls, file: BinaryIO, mmap: bool = False) -> 'IVFIndex':
+        """
+        Load an IVFIndex chunk from the given file.
+
+        Parameters
+        ----------
+        file : BinaryIO
+            Finalfusion file positioned after the header of an IVFIndex chunk.
+        mmap : bool
+            Toggles memory mapping the inverted lists and centroids.
+
+        Returns
+        -------
+        index : IVFIndex
+            The index.
+        """
+        return cls.mmap_chunk(file) if mmap else cls.read_chunk(file)
+
+    @staticmethod
+    def chunk_identifier() -> ChunkIdentifier:
+        return ChunkIdentifier.IVFIndex
+
+    @staticmethod
+    def read_chunk(file: BinaryIO) -> 'IVFIndex':
+        n_rows, n_lists, dims, n_probe = IVFIndex._read_index_header(file)
+        list_indptr = _read_array_as_native(file, np.dtype(np.uint64),
+                                            n_lists + 1)
+        list_indices = _read_array_as_native(file, np.dtype(np.uint64), n_rows)
+        centroids = _read_array_as_native(file, np.dtype(np.float32),
+                                          n_lists * dims)
+        return IVFIndex(centroids.reshape(n_lists, dims), list_indptr,
+                        list_indices, n_probe)
+
+    @staticmethod
+    def mmap_chunk(file: BinaryIO) -> 'IVFIndex':
+        """
+        Memory map an IVFIndex chunk.
+
+        Parameters
+        ----------
+        file : BinaryIO
+            Finalfusion file positioned after the header of an IVFIndex chunk.
+
+        Returns
+        -------
+        index : IVFIndex
+            The index backed by memory maps of the file.
+        """
+        if sys.byteorder == "big":
+            raise NotImplementedError(
+                "Memmapping arrays is not supported on big endian platforms")
+        n_rows, n_lists, dims, n_probe = IVFIndex._read_index_header(file)
+        offset = file.tell()
+        list_indptr = np.memmap(file.name,
+                                dtype='<u8',
+                                mode='r',
+                                offset=offset,
+                                shape=(n_lists + 1, ))
+        offset += list_indptr.nbytes
+        list_indices = np.memmap(file.name,
+                                 dtype='<u8',
+                                 mode='r',
+                                 offset=offset,
+                                 shape=(n_rows, ))
+        offset += list_indices.nbytes
+        centroids = np.memmap(file.name,
+                              dtype='<f4',
+                              mode='r',
+                              offset=offset,
+                              shape=(n_lists, dims))
+        file.seek(offset + centroids.nbytes)
+        return IVFIndex(centroids, list_indptr, list_indices, n_probe)
+
+    def write_chunk(self, file: BinaryIO):
+        _write_binary(file, "<I", int(self.chunk_identifier()))
+        n_lists, dims = self._centroids.shape
+        header_size = struct.calcsize("<QIIII")
+        padding = _pad_uint64(file.tell() + struct.calcsize("<Q") +
+                              header_size)
+        chunk_len = header_size + padding + struct.calcsize(
+            f"<{n_lists + 1 + self.n_rows}Q{self._centroids.size}f")
+        _write_binary(file, f"<QQIIII{padding}x", chunk_len, self.n_rows,
+                      n_lists, dims, self._n_probe, int(TypeId.f32))
+        _serialize_array_as_le(file, self._list_indptr.astype(np.uint64))
+        _serialize_array_as_le(file, self._list_indices.astype(np.uint64))
+        _serialize_array_as_le(file, self._centroids)
+
+    @staticmethod
+    def _read_index_header(file: BinaryIO) -> Tuple[int, int, int, int]:
+        """
+        Helper method to read the header of an IVFIndex chunk.
+
+        Reads the number of rows, lists, dimensions and probes, verifies the TypeId of the
+        centroids and seeks the file to the start of the inverted lists.
+        """
+        n_rows, n_lists, dims, n_probe, type_id = _read_required_binary(
+            file, "<QIIII")
+        if type_id != TypeId.f32:
+            raise FinalfusionFormatError(
+                f"Invalid Type, expected {TypeId.f32}, got {type_id}")
+        file.seek(_pad_uint64(file.tell()), 1)
+        return n_rows, n_lists, dims, n_probe
+
+    @property
+    def centroids(self) -> np.ndarray:
+        """
+        The centroids of the inverted lists.
+
+        Returns
+        -------
+        centroids : numpy.ndarray
+            2-d float32 array with shape ``(n_lists, dims)``.
+        """
+        return self._centroids
+
+    @property
+    def list_indptr(self) -> np.ndarray:
+        """
+        The offsets of the inverted lists in :attr:`~IVFIndex.list_indices`.
+
+        Returns
+        -------
+        list_indptr : numpy.ndarray
+            1-d array with ``n_lists + 1`` entries.
+        """
+        return self._list_indptr
+
+    @property
+    def list_indices(self) -> np.ndarray:
+        """
+        The embedding indices of all inverted lists.
+
+        Returns
+        -------
+        list_indices : numpy.ndarray
+            1-d array with one entry per indexed embedding.
+        """
+        return self._list_indices
+
+    @property
+    def n_lists(self) -> int:
+        """
+        The number of inverted lists.
+
+        Returns
+        -------
+        n_lists : int
+            Number of inverted lists.
+        """
+        return len(self._centroids)
+
+    @property
+    def n_rows(self) -> int:
+        """
+        The number of indexed embeddings.
+
+        Returns
+        -------
+        n_rows : int
+            Number of indexed embeddings.
+        """
+        return len(self._list_indices)
+
+    @property
+    def n_probe(self) -> int:
+        """
+        The number of inverted lists that are scored per query.
+
+        :Getter: Returns the number of probed lists.
+        :Setter: Set the number of probed lists. Values greater than ``n_lists`` are capped.
+
+        Returns
+        -------
+        n_probe : int
+            Number of probed lists.
+
+        Raises
+        ------
+        ValueError
+            If ``n_probe`` is not positive.
+        """
+        return self._n_probe
+
+    @n_probe.setter
+    def n_probe(self, n_probe: int):
+        if n_probe <= 0:
+            raise ValueError(f"n_probe needs to be positive, not {n_probe}")
+        self._n_probe = min(n_probe, self.n_lists)
+
+    def search(self, storage: Storage, queries: np.ndarray, k: int,
+               skips: Tuple[np.ndarray, np.ndarray]
+               ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k search.
+
+        Parameters
+        ----------
+        storage : Storage
+            The storage that the index was built for.
+        queries : numpy.ndarray
+            2-d float32 query matrix.
+        k : int
+            Number of neighbours per query.
+        skips : Tuple[numpy.ndarray, numpy.ndarray]
+            Skipped ``(query, row)`` pairs as an array of query indices and an array of row
+            indices.
+
+        Returns
+        -------
+        (indices, similarities) : Tuple[numpy.ndarray, numpy.ndarray]
+            Row indices and similarities with shape ``(n_queries, k)``, sorted by decreasing
+            similarity. Entries without a candidate have similarity ``-inf``.
+        """
+        indices = np.zeros((len(queries), k), dtype=np.intp)
+        sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        probes = self._probe(queries)
+        skip_queries, skip_indices = skips
+        for query_idx, (query, query_probes) in enumerate(zip(queries,
+                                                              probes)):
+            candidates, candidate_sims = self._search_lists(
+                storage, query, query_probes,
+                skip_indices[skip_queries == query_idx], k)
+            indices[query_idx, :len(candidates)] = candidates
+            sims[query_idx, :len(candidates)] = candidate_sims
+        return indices, sims
+
+    def _search_lists(self, storage: Storage, query: np.ndarray,
+                      probes: np.ndarray, skipped: np.ndarray,
+                      k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the top-k rows of the probed inverted lists for one query.
+
+        Returns at most ``k`` row indices and similarities, sorted by decreasing similarity.
+        """
+        candidates = np.concatenate([
+            self._list_indices[self._list_indptr[probe]:self._list_indptr[probe
+                                                                          + 1]]
+            for probe in probes
+        ])
+        candidate_sims = np.asarray(storage[candidates]).dot(query)
+        candidate_sims[np.isin(candidates, skipped)] = -np.inf
+        if len(candidates) > k:
+            part = np.argpartition(candidate_sims, -k)[-k:]
+            candidates, candidate_sims = candidates[part], candidate_sims[part]
+        order = np.argsort(-candidate_sims, kind="stable")
+        return candidates[order], candidate_sims[order]
+
+    def _probe(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Get the ``n_probe`` closest inverted lists per query.
+        """
+        if self._n_probe == self.n_lists:
+            return np.broadcast_to(np.arange(self.n_lists),
+                                   (len(queries), self.n_lists))
+        scores = queries.dot(self._centroids.T)
+        scores -= 0.5 * np.square(self._centroids).sum(1)
+        return np.argpartition(scores, -self._n_probe,
+                               axis=1)[:, -self._n_probe:]
+
+    def __reduce__(self):
+        return IVFIndex, (_pickle_array(self._centroids),
+                          _pickle_array(self._list_indptr),
+                          _pickle_array(self._list_indices), self._n_probe)
+
+    def __repr__(self) -> str:
+        return f"IVFIndex(n_lists={self.n_lists}, n_probe={self.n_probe}, " \
+               f"n_rows={self.n_rows})"
+
+
+def load_ivf_index(file: Union[str, bytes, int, PathLike],
+                   mmap: bool = False) -> IVFIndex:
+    """
+    Load an IVFIndex from a finalfusion file.
+
+    Loads the first IVFIndex chunk from a finalfusion file.
+
+    Parameters
+    ----------
+    file: str, bytes, int, PathLike
+        Path to finalfusion file containing an IVFIndex chunk.
+    mmap : bool
+        Toggles memory mapping the index.
+
+    Returns
+    -------
+    index : IVFIndex
+        First IVFIndex in the file.
+
+    Raises
+    ------
+    ValueError
+        If the file did not contain an IVFIndex.
+    """
+    with open(file, "rb") as inf:
+        chunk = find_chunk(inf, [ChunkIdentifier.IVFIndex])
+        if chunk is None:
+            raise ValueError('File did not contain an IVFIndex.')
+        return IVFIndex.load(inf, mmap)
+
+
+def _pad_uint64(pos: int) -> int:
+    """
+    Helper method to compute the padding to the next 8 byte boundary from a given position.
+    """
+    return -pos % struct.calcsize('<Q')
+
+
+def _recall(approximate: np.ndarray, exact: np.ndarray,
+            exact_sims: np.ndarray) -> float:
+    """
+    Helper method to compute the fraction of exact neighbours that were found.
+    """
+    found = 0
+    total = 0
+    for approx_row, exact_row, sims_row in zip(approximate, exact, exact_sims):
+        exact_row = exact_row[sims_row != -np.inf]
+        found += np.isin(exact_row, approx_row).sum()
+        total += len(exact_row)
+    return found / total if total else 1.
+
+
+# Number of rows that are assigned to their closest centroids at once when building indices.
+_BUILD_BLOCK_ROWS = 16384
+
+__all__ = ['IVFIndex', 'load_ivf_index']  # type: Sequence[str]
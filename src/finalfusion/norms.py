@@ -10,7 +10,8 @@ from typing import BinaryIO, Union, List, Collection
 import numpy as np
 
 from finalfusion.io import Chunk, ChunkIdentifier, find_chunk, TypeId, FinalfusionFormatError, \
-    _pad_float32, _write_binary, _read_required_binary, _serialize_array_as_le
+    _pad_float32, _write_binary, _read_required_binary, _serialize_array_as_le, _mmap_source, \
+    _PickledMmap
 
 
 class Norms(np.ndarray, Chunk, Collection[float]):
@@ -79,6 +80,13 @@ class Norms(np.ndarray, Chunk, Collection[float]):
         norm = super().__getitem__(key)  # type: float
         return norm
 
+    def __reduce__(self):
+        # memory-mapped norms are pickled as their file region and mapped again when unpickled
+        source = _mmap_source(self)
+        if source is None:
+            return super().__reduce__()
+        return Norms, (_PickledMmap(source), )
+
 
 def load_norms(file: Union[str, bytes, int, PathLike]):
     """
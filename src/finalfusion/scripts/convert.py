@@ -10,9 +10,16 @@ Offers conversion from and to any combination of:
 
 Conversion of finalfusion files with FinalfusionBucketVocab or ExplicitVocab to fastText
 fails.
+
+With ``--float16``, the embedding matrix is rounded to float16. finalfusion output keeps the
+float16 storage, which halves the size of the matrix.
 """
 import argparse
 
+import numpy as np
+
+from finalfusion import Embeddings
+from finalfusion.storage import NdArray
 from finalfusion.scripts.util import Format, add_input_output_args, add_format_args, add_common_args
 
 
@@ -24,9 +31,20 @@ def main() -> None:  # pylint: disable=missing-function-docstring
     add_format_args(parser, "f", "from", formats, "word2vec")
     add_format_args(parser, "t", "to", formats, "finalfusion")
     add_common_args(parser)
+    parser.add_argument(
+        "--float16",
+        action="store_true",
+        default=False,
+        help="Round the embedding matrix to float16. finalfusion output keeps "
+        "the float16 storage.")
     args = parser.parse_args()
     embeds = Format(getattr(args, 'from')).load(args.input, args.lossy,
                                                 args.mmap)
+    if args.float16:
+        if not isinstance(embeds.storage, NdArray):
+            parser.error("only array storage can be converted to float16")
+        embeds = Embeddings(NdArray(embeds.storage.astype(np.float16)),
+                            embeds.vocab, embeds.norms, embeds.metadata)
     Format(args.to).write(args.output, embeds)
 
 
@@ -0,0 +1,639 @@
+"""
+Embedding server.
+
+Serves embedding lookups, similarity and analogy queries as JSON over HTTP on a TCP or Unix
+socket. Concurrent requests are coalesced into micro-batches, so each batch is answered by one
+batched lookup and one similarity search over the storage.
+
+Endpoints:
+
+* ``POST /lookup`` with ``{"word": str}``
+* ``POST /similarity`` with ``{"word": str, "k": int}``
+* ``POST /analogy`` with ``{"words": [str, str, str], "k": int, "skip": [str, ...]}``
+* ``GET /stats`` returns the latency and throughput counters
+
+The server requires Python 3.7 or later.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from finalfusion import Embeddings
+from finalfusion.scripts.util import Format, add_embeddings_args, add_common_args
+
+# number of latencies per endpoint that percentiles are computed over
+_LATENCY_WINDOW = 10000
+# largest accepted request body in bytes
+_MAX_BODY_BYTES = 1 << 20
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class ServerStats:
+    """
+    Latency and throughput counters of an :class:`EmbeddingServer`.
+
+    Requests and batches are counted per endpoint. Latency percentiles are computed over the
+    most recent requests.
+    """
+    def __init__(self, window: int = _LATENCY_WINDOW):
+        self._start = time.monotonic()
+        self._window = window
+        # counters per endpoint: requests, errors, batches, batched requests and batch seconds
+        self._counters = {}  # type: Dict[str, Dict[str, float]]
+        self._latencies = {}  # type: Dict[str, Deque[float]]
+
+    def record_request(self, endpoint: str, latency: float, error: bool):
+        """
+        Record an answered request.
+
+        Parameters
+        ----------
+        endpoint : str
+            The endpoint of the request.
+        latency : float
+            Seconds from reading the request to writing the response.
+        error : bool
+            Whether the request failed.
+        """
+        counters = self._endpoint_counters(endpoint)
+        counters["requests"] += 1
+        counters["errors"] += error
+        self._latencies.setdefault(endpoint,
+                                   deque(maxlen=self._window)).append(latency)
+
+    def record_batch(self, endpoint: str, size: int, seconds: float):
+        """
+        Record a processed batch.
+
+        Parameters
+        ----------
+        endpoint : str
+            The endpoint of the batched requests.
+        size : int
+            Number of requests in the batch.
+        seconds : float
+            Processing time of the batch.
+        """
+        counters = self._endpoint_counters(endpoint)
+        counters["batches"] += 1
+        counters["batched"] += size
+        counters["batch_seconds"] += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current counters.
+
+        Returns
+        -------
+        stats : Dict[str, Any]
+            Uptime and, per endpoint, the number of requests and errors, the throughput since
+            the start, the number and mean size of batches, the mean batch processing time and
+            latency percentiles in milliseconds.
+        """
+        uptime = time.monotonic() - self._start
+        endpoints = {}
+        for endpoint, latencies in self._latencies.items():
+            counters = self._counters[endpoint]
+            latencies_ms = np.array(latencies) * 1000
+            p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+            batches = int(counters["batches"])
+            endpoints[endpoint] = {
+                "requests": int(counters["requests"]),
+                "errors": int(counters["errors"]),
+                "requests_per_second": counters["requests"] / uptime,
+                "batches": batches,
+                "mean_batch_size": counters["batched"] / max(batches, 1),
+                "mean_batch_ms":
+                counters["batch_seconds"] * 1000 / max(batches, 1),
+                "latency_ms": {
+                    "mean": float(latencies_ms.mean()),
+                    "p50": float(p50),
+                    "p90": float(p90),
+                    "p99": float(p99),
+                    "max": float(latencies_ms.max()),
+                },
+            }
+        return {"uptime_seconds": uptime, "endpoints": endpoints}
+
+    def _endpoint_counters(self, endpoint: str) -> Dict[str, float]:
+        return self._counters.setdefault(
+            endpoint, {
+                "requests": 0,
+                "errors": 0,
+                "batches": 0,
+                "batched": 0,
+                "batch_seconds": 0.
+            })
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches.
+
+    Submitted items are queued. A batch is closed once it holds ``max_batch_size`` items or
+    ``max_wait`` seconds passed since its first item arrived. Batches are processed one at a
+    time in an executor thread, items that arrive in the meantime are collected into the next
+    batch.
+    """
+    def __init__(  # pylint: disable=too-many-arguments
+            self, name: str, process: Callable[[List[Any]], List[Any]],
+            max_batch_size: int, max_wait: float, *,
+            executor: ThreadPoolExecutor, stats: ServerStats):
+        """
+        Initialize a MicroBatcher.
+
+        Parameters
+        ----------
+        name : str
+            Name of the batched endpoint for the stats.
+        process : Callable[[List[Any]], List[Any]]
+            Function that maps a batch of items to a list with one result per item.
+        max_batch_size : int
+            Maximum number of items per batch.
+        max_wait : float
+            Maximum number of seconds that the first item of a batch waits for more items.
+        executor : ThreadPoolExecutor
+            Executor that runs ``process``.
+        stats : ServerStats
+            Counters to record the batches in.
+
+        Raises
+        ------
+        ValueError
+            If ``max_batch_size`` is not positive or ``max_wait`` is negative.
+        """
+        if max_batch_size <= 0:
+            raise ValueError(
+                f"max_batch_size needs to be positive, not {max_batch_size}")
+        if max_wait < 0:
+            raise ValueError(f"max_wait cannot be negative, not {max_wait}")
+        self._name = name
+        self._process = process
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._executor = executor
+        self._stats = stats
+        self._queue = None  # type: Optional[asyncio.Queue]
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Submit an item and wait for its result.
+
+        Parameters
+        ----------
+        item : Any
+            The item to process.
+
+        Returns
+        -------
+        result : Any
+            The result of the item.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._get_queue().put((item, future))
+        return await future
+
+    async def run(self) -> None:
+        """
+        Process batches until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        queue = self._get_queue()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            items = [item for item, _ in batch]
+            start = time.monotonic()
+            try:
+                results = await loop.run_in_executor(self._executor,
+                                                     self._process, items)
+            except Exception as exc:  # pylint: disable=broad-except
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            self._stats.record_batch(self._name, len(batch),
+                                     time.monotonic() - start)
+
+    def _get_queue(self) -> asyncio.Queue:
+        # the queue is created on first use, so that it belongs to the running loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+
+class EmbeddingServer:
+    """
+    Asyncio server for embedding queries.
+
+    Requests to the query endpoints are coalesced by one :class:`MicroBatcher` per endpoint.
+    Lookups are answered through :meth:`Embeddings.embedding_batch
+    <finalfusion.embeddings.Embeddings.embedding_batch>`, similarity and analogy queries
+    additionally through one :meth:`Embeddings.embedding_similarity_batch
+    <finalfusion.embeddings.Embeddings.embedding_similarity_batch>` per batch.
+    """
+    def __init__(self,
+                 embeddings: Embeddings,
+                 max_batch_size: int = 64,
+                 max_wait: float = 0.002):
+        """
+        Initialize an EmbeddingServer.
+
+        Parameters
+        ----------
+        embeddings : Embeddings
+            The served embeddings.
+        max_batch_size : int
+            Maximum number of requests per batch.
+        max_wait : float
+            Maximum number of seconds that a request waits for other requests to batch with.
+        """
+        self._embeddings = embeddings
+        self.stats = ServerStats()
+        self._executor = ThreadPoolExecutor(3)
+        self._batchers = {
+            name: MicroBatcher(name,
+                               process,
+                               max_batch_size,
+                               max_wait,
+                               executor=self._executor,
+                               stats=self.stats)
+            for name, process in [(
+                "lookup",
+                self._lookup_batch), (
+                    "similarity",
+                    self._similarity_batch), ("analogy", self._analogy_batch)]
+        }
+        self._tasks = []  # type: List[asyncio.Task]
+
+    async def start(self,
+                    host: str = "127.0.0.1",
+                    port: int = 8000,
+                    unix: Optional[str] = None) -> asyncio.AbstractServer:
+        """
+        Start serving.
+
+        Parameters
+        ----------
+        host : str
+            Host to listen on.
+        port : int
+            TCP port to listen on, 0 picks a free port.
+        unix : str, optional
+            Path of a Unix socket to listen on instead of a TCP socket.
+
+        Returns
+        -------
+        server : asyncio.AbstractServer
+            The listening server.
+        """
+        self._tasks = [
+            asyncio.ensure_future(batcher.run())
+            for batcher in self._batchers.values()
+        ]
+        if unix is not None:
+            return await asyncio.start_unix_server(self._handle_connection,
+                                                   unix)
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def stop(self) -> None:
+        """
+        Stop the batchers and the executor.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.monotonic()
+                keep_alive, endpoint, status, response = await self._handle_request(
+                    request_line, reader)
+                payload = json.dumps(response).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    "\r\n".encode("latin-1") + payload)
+                await writer.drain()
+                if endpoint is not None:
+                    self.stats.record_request(endpoint,
+                                              time.monotonic() - start,
+                                              status != 200)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line: bytes,
+                              reader: asyncio.StreamReader
+                              ) -> Tuple[bool, Optional[str], int, Any]:
+        """
+        Read and answer a request.
+
+        Returns whether the connection is kept alive, the endpoint for the stats, the status code
+        and the JSON response.
+        """
+        parts = request_line.decode("latin-1").split()
+        headers = await _read_headers(reader)
+        if len(parts) != 3:
+            return False, None, 400, {"error": "malformed request line"}
+        method, target, version = parts
+        keep_alive = version == "HTTP/1.1" and headers.get(
+            "connection", "").lower() != "close"
+        try:
+            body = await _read_body(reader, headers)
+        except _RequestError as exc:
+            return False, None, exc.status, {"error": str(exc)}
+        endpoint = target.split("?", 1)[0].strip("/")
+        # only requests to the query endpoints are recorded in the stats
+        recorded = endpoint if endpoint in self._batchers else None
+        try:
+            if endpoint == "stats":
+                response = self._handle_stats(method)
+            elif recorded is not None:
+                response = await self._handle_query(endpoint, method, body)
+            else:
+                raise _RequestError(404, f"unknown endpoint: {target}")
+        except _RequestError as exc:
+            return keep_alive, recorded, exc.status, {"error": str(exc)}
+        return keep_alive, recorded, 200, response
+
+    def _handle_stats(self, method: str) -> Dict[str, Any]:
+        """
+        Answer a request to the stats endpoint.
+        """
+        if method != "GET":
+            raise _RequestError(405, "use GET")
+        return self.stats.snapshot()
+
+    async def _handle_query(self, endpoint: str, method: str,
+                            body: bytes) -> Any:
+        """
+        Answer a request to a query endpoint through its batcher.
+        """
+        if method != "POST":
+            raise _RequestError(405, "use POST")
+        try:
+            query = _parse_query(endpoint, body)
+        except ValueError as exc:
+            raise _RequestError(400, str(exc)) from None
+        try:
+            result = await self._batchers[endpoint].submit(query)
+        except Exception as exc:  # pylint: disable=broad-except
+            raise _RequestError(500, str(exc)) from exc
+        if result is None:
+            raise _RequestError(404, "no embedding for the query")
+        return result
+
+    def _lookup_batch(self, queries: List[Dict[str, Any]]
+                      ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Look up the embeddings of a batch of words through one batched lookup.
+        """
+        matrix, mask = self._embeddings.embedding_batch(
+            [query["word"] for query in queries])
+        return [{
+            "embedding": row.tolist()
+        } if found else None for row, found in zip(matrix, mask)]
+
+    def _similarity_batch(self, queries: List[Dict[str, Any]]
+                          ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Answer a batch of similarity queries through one batched similarity search.
+        """
+        words = [query["word"] for query in queries]
+        matrix, mask = self._embeddings.embedding_batch(words)
+        return self._neighbours(queries, matrix, mask,
+                                [{word} for word in words])
+
+    def _analogy_batch(self, queries: List[Dict[str, Any]]
+                       ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Answer a batch of analogy queries through one batched similarity search.
+        """
+        words = [word for query in queries for word in query["words"]]
+        matrix, mask = self._embeddings.embedding_batch(words)
+        matrix = matrix.reshape(len(queries), 3, -1)
+        targets = matrix[:, 2] + matrix[:, 1] - matrix[:, 0]
+        norms = np.linalg.norm(targets, axis=1, keepdims=True)
+        targets /= np.where(norms == 0, 1, norms)
+        skips = [
+            set(query["words"] if query["skip"] is None else query["skip"])
+            for query in queries
+        ]
+        return self._neighbours(queries, targets,
+                                mask.reshape(len(queries), 3).all(axis=1),
+                                skips)
+
+    def _neighbours(self, queries: List[Dict[str, Any]], targets: np.ndarray,
+                    mask: np.ndarray,
+                    skips: List[set]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Helper method to search the neighbours of all targets with a set mask.
+        """
+        results = [None] * len(queries)  # type: List[Optional[Dict[str, Any]]]
+        found = np.flatnonzero(mask)
+        if len(found) == 0:
+            return results
+        k = max(queries[idx]["k"] for idx in found)
+        words, sims = self._embeddings.embedding_similarity_batch(
+            targets[found], k, [skips[idx] for idx in found])
+        for row, idx in enumerate(found):
+            results[idx] = {
+                "neighbours": [{
+                    "word": word,
+                    "similarity": float(sim)
+                } for word, sim in zip(words[row, :queries[idx]["k"]],
+                                       sims[row, :queries[idx]["k"]])
+                               if word is not None]
+            }
+        return results
+
+
+class _RequestError(Exception):
+    """
+    Error that is answered with the given status code.
+    """
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+    """
+    Helper method to read the headers of a request, header names are lowercased.
+    """
+    headers = {}  # type: Dict[str, str]
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+async def _read_body(reader: asyncio.StreamReader,
+                     headers: Dict[str, str]) -> bytes:
+    """
+    Helper method to read the body of a request.
+
+    Raises
+    ------
+    _RequestError
+        If the Content-Length is invalid or too large.
+    """
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise _RequestError(400, "invalid Content-Length") from None
+    if length < 0:
+        raise _RequestError(400, "invalid Content-Length")
+    if length > _MAX_BODY_BYTES:
+        raise _RequestError(413, "request body too large")
+    return await reader.readexactly(length)
+
+
+def _parse_query(endpoint: str, body: bytes) -> Dict[str, Any]:
+    """
+    Helper method to parse and validate the JSON body of a query.
+
+    Raises
+    ------
+    ValueError
+        If the body is not valid JSON or doesn't match the endpoint.
+    """
+    try:
+        query = json.loads(body.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ValueError(f"invalid JSON: {exc}") from None
+    if not isinstance(query, dict):
+        raise ValueError("expected a JSON object")
+    if endpoint == "analogy":
+        words = query.get("words")
+        if not isinstance(words, list) or len(words) != 3 or not all(
+                isinstance(word, str) for word in words):
+            raise ValueError("'words' needs to be a list of 3 strings")
+        skip = query.get("skip")
+        if skip is not None and not (isinstance(skip, list) and all(
+                isinstance(word, str) for word in skip)):
+            raise ValueError("'skip' needs to be a list of strings")
+        parsed = {"words": words, "skip": skip}  # type: Dict[str, Any]
+    else:
+        if not isinstance(query.get("word"), str):
+            raise ValueError("'word' needs to be a string")
+        parsed = {"word": query["word"]}
+    if endpoint != "lookup":
+        k = query.get("k", 10)
+        if not isinstance(k, int) or isinstance(k, bool) or k <= 0:
+            raise ValueError("'k' needs to be a positive integer")
+        parsed["k"] = k
+    return parsed
+
+
+async def serve(server: EmbeddingServer, host: str, port: int,
+                unix: Optional[str]):
+    """
+    Serve until cancelled.
+
+    Parameters
+    ----------
+    server : EmbeddingServer
+        The server.
+    host : str
+        Host to listen on.
+    port : int
+        TCP port to listen on.
+    unix : str, optional
+        Path of a Unix socket to listen on instead of a TCP socket.
+    """
+    listening = await server.start(host, port, unix)
+    try:
+        async with listening:
+            await listening.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main() -> None:  # pylint: disable=missing-function-docstring
+    if sys.version_info < (3, 7):
+        sys.exit("ffp-serve requires Python 3.7 or later")
+    formats = ["word2vec", "finalfusion", "fasttext", "text", "textdims"]
+    parser = argparse.ArgumentParser(
+        prog="ffp-serve",
+        description="Serve lookups, similarity and analogy queries.")
+    add_embeddings_args(parser, formats)
+    parser.add_argument("--host",
+                        type=str,
+                        default="127.0.0.1",
+                        help="Host to listen on. Default: 127.0.0.1")
+    parser.add_argument("--port",
+                        type=int,
+                        default=8000,
+                        help="Port to listen on. Default: 8000")
+    parser.add_argument(
+        "--unix",
+        type=str,
+        help="Listen on a Unix socket at the given path instead of a port.",
+        metavar="PATH")
+    parser.add_argument("--max-batch-size",
+                        type=int,
+                        default=64,
+                        help="Maximum number of requests per batch. "
+                        "Default: 64")
+    parser.add_argument(
+        "--max-wait",
+        type=float,
+        default=2.,
+        help="Maximum time in milliseconds that a request waits for other "
+        "requests to batch with. Default: 2")
+    add_common_args(parser)
+    args = parser.parse_args()
+    embeds = Format(args.format).load(args.embeddings, args.lossy, args.mmap)
+    server = EmbeddingServer(embeds, args.max_batch_size, args.max_wait / 1000)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -4,18 +4,14 @@ Similarity queries for embeddings.
 import argparse
 import sys
 
-from finalfusion.scripts.util import Format, add_format_args, add_common_args
+from finalfusion.scripts.util import Format, add_embeddings_args, add_common_args
 
 
 def main() -> None:  # pylint: disable=missing-function-docstring
     formats = ["word2vec", "finalfusion", "fasttext", "text", "textdims"]
     parser = argparse.ArgumentParser(prog="ffp-similar",
                                      description="Similarity queries.")
-    parser.add_argument("embeddings",
-                        type=str,
-                        help="Input embeddings",
-                        metavar="EMBEDDINGS")
-    add_format_args(parser, "f", "format", formats, "finalfusion")
+    add_embeddings_args(parser, formats)
     parser.add_argument("-k",
                         type=int,
                         help="Number of neighbours. Default: 10",
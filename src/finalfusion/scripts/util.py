@@ -19,6 +19,14 @@ def add_input_output_args(parser: ArgumentParser):
                         metavar="OUTPUT")
 
 
+def add_embeddings_args(parser: ArgumentParser, formats: List[str]):
+    parser.add_argument("embeddings",
+                        type=str,
+                        help="Input embeddings",
+                        metavar="EMBEDDINGS")
+    add_format_args(parser, "f", "format", formats, "finalfusion")
+
+
 def add_format_args(parser: ArgumentParser, short: str, name: str,
                     formats: List[str], default: str):
     parser.add_argument(f"-{short}",
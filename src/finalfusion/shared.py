@@ -0,0 +1,431 @@
+"""
+Shared-memory embeddings
+
+Embeddings can be published to a :mod:`multiprocessing.shared_memory` segment once and attached
+to by name from any number of worker processes. Attached embeddings are read-only views of the
+segment, so the memory used for the storage, the norms and the vocabulary does not grow with the
+number of workers.
+
+Shared memory segments require Python 3.8 or later.
+"""
+import json
+import struct
+import sys
+from typing import Dict, Optional, Tuple, Any, Union, TYPE_CHECKING
+
+import numpy as np
+import toml
+
+from finalfusion.embeddings import Embeddings
+from finalfusion.ivf import IVFIndex
+from finalfusion.metadata import Metadata
+from finalfusion.norms import Norms
+from finalfusion.storage import NdArray, QuantizedArray, Storage
+from finalfusion.storage.quantized import PQ
+from finalfusion.subword import ExplicitIndexer, FastTextIndexer, FinalfusionHashIndexer
+from finalfusion.vocab import Vocab, SimpleVocab, FinalfusionBucketVocab, FastTextVocab, \
+    ExplicitVocab
+from finalfusion.vocab.vocab import _MmapWords
+
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+
+# marks the start of a segment holding shared embeddings
+_MAGIC = b"FiFuShm\x00"
+# arrays in a segment start at multiples of this many bytes
+_ALIGNMENT = 64
+
+
+class SharedEmbeddings:
+    """
+    Embeddings published to shared memory.
+
+    Returned by :func:`share_embeddings`. Other processes attach to the segment through
+    :func:`attach_embeddings` with :attr:`SharedEmbeddings.name`.
+
+    The segment exists until :meth:`SharedEmbeddings.unlink` is called, embeddings that are
+    attached at that point stay valid. Used as a context manager, the segment is closed and
+    unlinked on exit.
+
+    Examples
+    --------
+    >>> storage = NdArray(np.float32(np.random.rand(2, 10)))  # doctest: +SKIP
+    >>> vocab = SimpleVocab(["Some", "words"])  # doctest: +SKIP
+    >>> with share_embeddings(Embeddings(storage, vocab)) as shared:  # doctest: +SKIP
+    ...     attached = attach_embeddings(shared.name)
+    ...     np.allclose(attached["Some"], storage[0])
+    True
+    """
+    def __init__(self, shm: 'SharedMemory'):
+        """
+        Initialize SharedEmbeddings.
+
+        Parameters
+        ----------
+        shm : SharedMemory
+            The segment holding the published embeddings.
+        """
+        self._shm = shm
+
+    @property
+    def name(self) -> str:
+        """
+        Get the name of the segment.
+
+        Returns
+        -------
+        name : str
+            The name to attach to the embeddings with.
+        """
+        return self._shm.name
+
+    @property
+    def size(self) -> int:
+        """
+        Get the size of the segment.
+
+        Returns
+        -------
+        size : int
+            The size of the segment in bytes.
+        """
+        return self._shm.size
+
+    def close(self) -> None:
+        """
+        Close the segment in this process.
+
+        The segment stays available to other processes.
+        """
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """
+        Remove the segment.
+
+        Embeddings that are attached keep working, but no process can attach to the segment
+        afterwards. The memory is released once all attached embeddings are gone.
+        """
+        self._shm.unlink()
+
+    def __enter__(self) -> 'SharedEmbeddings':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        self.unlink()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(name={self.name!r}, size={self.size})"
+
+
+def share_embeddings(embeddings: Embeddings,
+                     name: Optional[str] = None) -> SharedEmbeddings:
+    """
+    Publish embeddings to shared memory.
+
+    The storage, the norms, the similarity index and the vocabulary are copied into a new shared
+    memory segment. Words are stored as concatenated UTF-8 strings together with a sorted hash
+    table, so attaching processes neither decode the words nor build a word index. Only the
+    n-grams of an :class:`~finalfusion.vocab.subword.ExplicitVocab` are read into each attaching
+    process.
+
+    Embeddings in any format can be published, e.g. embeddings read through
+    :func:`~finalfusion.compat.load_word2vec` or with a
+    :class:`~finalfusion.storage.quantized.QuantizedArray` storage.
+
+    Publish the embeddings before starting the workers: on Python versions before 3.13, the
+    segment is registered with the resource tracker of the attaching process, which removes it
+    when the tracker exits. Processes started through :mod:`multiprocessing` share the tracker of
+    their parent.
+
+    Parameters
+    ----------
+    embeddings : Embeddings
+        The embeddings to publish.
+    name : str, optional
+        The name of the segment. A unique name is generated if no name is given.
+
+    Returns
+    -------
+    shared : SharedEmbeddings
+        The published embeddings.
+
+    Raises
+    ------
+    TypeError
+        If the storage or the vocabulary of the embeddings can't be shared.
+    FileExistsError
+        If a segment with the given name exists.
+    RuntimeError
+        If Python is older than 3.8.
+    """
+    description, arrays = _describe_embeddings(embeddings)
+    layout = {}  # type: Dict[str, Tuple[int, str, Tuple[int, ...]]]
+    size = 0
+    for key, array in arrays.items():
+        size = _align(size)
+        layout[key] = (size, array.dtype.str, array.shape)
+        size += array.nbytes
+    description["arrays"] = layout
+    header = json.dumps(description).encode("utf-8")
+    data_start = _align(len(_MAGIC) + struct.calcsize("<Q") + len(header))
+    shm = _open_segment(name, data_start + size)
+    try:
+        buf = _buffer(shm)
+        buf[:len(_MAGIC)] = _MAGIC
+        struct.pack_into("<Q", buf, len(_MAGIC), len(header))
+        header_start = len(_MAGIC) + struct.calcsize("<Q")
+        buf[header_start:header_start + len(header)] = header
+        for key, array in arrays.items():
+            target = np.ndarray(array.shape,
+                                dtype=array.dtype,
+                                buffer=buf,
+                                offset=data_start +
+                                layout[key][0])  # type: np.ndarray
+            target[...] = array
+            del target
+        del buf
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    return SharedEmbeddings(shm)
+
+
+def attach_embeddings(name: str) -> Embeddings:
+    """
+    Attach to embeddings in shared memory.
+
+    The storage, the norms, the similarity index and the words of the returned embeddings are
+    read-only views of the segment. The segment stays attached until the embeddings and all
+    arrays taken from them are gone.
+
+    Parameters
+    ----------
+    name : str
+        The name of a segment that was created by :func:`share_embeddings`.
+
+    Returns
+    -------
+    embeddings : Embeddings
+        The attached embeddings.
+
+    Raises
+    ------
+    FileNotFoundError
+        If no segment with the given name exists.
+    ValueError
+        If the segment doesn't hold shared embeddings.
+    RuntimeError
+        If Python is older than 3.8.
+    """
+    raw = np.asarray(_Segment(_open_segment(name)))
+    header_start = len(_MAGIC) + struct.calcsize("<Q")
+    if len(raw) < header_start or bytes(raw[:len(_MAGIC)]) != _MAGIC:
+        raise ValueError(f"Segment '{name}' does not hold shared embeddings")
+    header_len = struct.unpack_from("<Q", raw.data, len(_MAGIC))[0]
+    description = json.loads(
+        bytes(raw[header_start:header_start + header_len]).decode("utf-8"))
+    data_start = _align(header_start + header_len)
+    arrays = {}
+    for key, (offset, dtype, shape) in description["arrays"].items():
+        dtype = np.dtype(dtype)
+        start = data_start + offset
+        end = start + int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        arrays[key] = raw[start:end].view(dtype).reshape(shape)
+    return _restore_embeddings(description, arrays, name)
+
+
+class _Segment:  # pylint: disable=too-few-public-methods
+    """
+    Read-only array interface of an attached shared memory segment.
+
+    Arrays created from the segment keep it attached, it is closed once the last array is gone.
+    """
+    def __init__(self, shm: 'SharedMemory'):
+        self._shm = shm
+        self._raw = np.frombuffer(_buffer(shm), dtype=np.uint8)
+        interface = dict(self._raw.__array_interface__)
+        interface["data"] = (interface["data"][0], True)
+        self.__array_interface__ = interface
+
+    def __del__(self):
+        del self._raw
+        self._shm.close()
+
+
+def _describe_embeddings(embeddings: Embeddings
+                         ) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Helper method to split embeddings into a JSON serializable description and arrays.
+    """
+    description = {}  # type: Dict[str, Any]
+    arrays = {}  # type: Dict[str, np.ndarray]
+    description["storage"] = _describe_storage(embeddings.storage, arrays)
+    description["vocab"] = _describe_vocab(embeddings.vocab, arrays)
+    if embeddings.norms is not None:
+        arrays["norms"] = np.asarray(embeddings.norms)
+    description["metadata"] = None
+    if embeddings.metadata is not None:
+        description["metadata"] = toml.dumps(embeddings.metadata)
+    description["n_probe"] = None
+    index = embeddings.similarity_index
+    if index is not None:
+        description["n_probe"] = index.n_probe
+        arrays["ivf_centroids"] = index.centroids
+        arrays["ivf_indptr"] = index.list_indptr
+        arrays["ivf_indices"] = index.list_indices
+    return description, arrays
+
+
+def _describe_storage(storage: Storage, arrays: Dict[str, np.ndarray]) -> str:
+    """
+    Helper method to add the arrays of a storage, returns the storage type.
+    """
+    if isinstance(storage, NdArray):
+        arrays["storage"] = np.asarray(storage)
+        return "ndarray"
+    if isinstance(storage, QuantizedArray):
+        arrays["quantized_embeddings"] = storage.quantized_embeddings
+        arrays["quantizers"] = storage.quantizer.subquantizers
+        if storage.quantizer.projection is not None:
+            arrays["projection"] = storage.quantizer.projection
+        if storage.norms is not None:
+            arrays["storage_norms"] = storage.norms
+        return "quantized"
+    raise TypeError(f"Cannot share storage of type '{type(storage).__name__}'")
+
+
+def _describe_vocab(vocab: Vocab,
+                    arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """
+    Helper method to add the words of a vocab, returns the vocab type and indexer settings.
+    """
+    indexer = None  # type: Union[None, FinalfusionHashIndexer, FastTextIndexer, ExplicitIndexer]
+    if isinstance(vocab, SimpleVocab):
+        description = {"type": "simple"}  # type: Dict[str, Any]
+    elif isinstance(vocab, FinalfusionBucketVocab):
+        indexer = vocab.subword_indexer
+        description = {
+            "type": "bucket",
+            "indexer": [indexer.buckets_exp, indexer.min_n, indexer.max_n]
+        }
+    elif isinstance(vocab, FastTextVocab):
+        indexer = vocab.subword_indexer
+        description = {
+            "type": "fasttext",
+            "indexer": [indexer.upper_bound, indexer.min_n, indexer.max_n]
+        }
+    elif isinstance(vocab, ExplicitVocab):
+        indexer = vocab.subword_indexer
+        description = {
+            "type":
+            "explicit",
+            "indexer": [indexer.min_n, indexer.max_n],
+            "ngrams":
+            indexer.ngrams,
+            "ngram_indices":
+            [int(indexer.ngram_index[ngram]) for ngram in indexer.ngrams]
+        }
+    else:
+        raise TypeError(f"Cannot share vocab of type '{type(vocab).__name__}'")
+    encoded = [word.encode("utf-8") for word in vocab.words]
+    lengths = np.fromiter(map(len, encoded),
+                          dtype=np.int64,
+                          count=len(encoded))
+    starts = np.zeros(len(encoded), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    words = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    sorted_hashes, order = _MmapWords(words, starts, lengths).hash_table()
+    arrays["words"] = words
+    arrays["word_starts"] = starts
+    arrays["word_lengths"] = lengths
+    arrays["word_hashes"] = sorted_hashes
+    arrays["word_order"] = order
+    return description
+
+
+def _restore_embeddings(description: Dict[str, Any],
+                        arrays: Dict[str, np.ndarray],
+                        origin: str) -> Embeddings:
+    """
+    Helper method to construct embeddings from a description and arrays.
+    """
+    if description["storage"] == "ndarray":
+        storage = NdArray(arrays["storage"])  # type: Storage
+    else:
+        pq = PQ(arrays["quantizers"], arrays.get("projection"))
+        storage = QuantizedArray(pq, arrays["quantized_embeddings"],
+                                 arrays.get("storage_norms"))
+    words = _MmapWords(arrays["words"], arrays["word_starts"],
+                       arrays["word_lengths"],
+                       (arrays["word_hashes"], arrays["word_order"]))
+    vocab_description = description["vocab"]
+    vocab_type = vocab_description["type"]
+    if vocab_type == "simple":
+        vocab = SimpleVocab(words)  # type: Vocab
+    elif vocab_type == "bucket":
+        vocab = FinalfusionBucketVocab(
+            words, FinalfusionHashIndexer(*vocab_description["indexer"]))
+    elif vocab_type == "fasttext":
+        vocab = FastTextVocab(words,
+                              FastTextIndexer(*vocab_description["indexer"]))
+    else:
+        ngrams = vocab_description["ngrams"]
+        min_n, max_n = vocab_description["indexer"]
+        vocab = ExplicitVocab(
+            words,
+            ExplicitIndexer(
+                ngrams, min_n, max_n,
+                dict(zip(ngrams, vocab_description["ngram_indices"]))))
+    norms = None
+    if "norms" in arrays:
+        norms = arrays["norms"].view(Norms)
+    metadata = None
+    if description["metadata"] is not None:
+        metadata = Metadata(toml.loads(description["metadata"]))
+    embeddings = Embeddings(storage, vocab, norms, metadata, origin)
+    if description["n_probe"] is not None:
+        embeddings.similarity_index = IVFIndex(arrays["ivf_centroids"],
+                                               arrays["ivf_indptr"],
+                                               arrays["ivf_indices"],
+                                               description["n_probe"])
+    return embeddings
+
+
+def _open_segment(name: Optional[str],
+                  size: Optional[int] = None) -> 'SharedMemory':
+    """
+    Helper method to create a segment of the given size or to open an existing segment.
+
+    Opened segments are not registered with the resource tracker on Python 3.13 and later.
+    """
+    if sys.version_info < (3, 8):
+        raise RuntimeError("Shared embeddings require Python 3.8 or later")
+    # pylint: disable=import-outside-toplevel,redefined-outer-name
+    from multiprocessing.shared_memory import SharedMemory
+    if size is not None:
+        return SharedMemory(name, create=True, size=size)
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name, track=False)  # pylint: disable=unexpected-keyword-arg
+    return SharedMemory(name)
+
+
+def _buffer(shm: 'SharedMemory') -> memoryview:
+    """
+    Helper method to get the buffer of an open segment.
+    """
+    if shm.buf is None:
+        raise ValueError(f"Segment '{shm.name}' is closed")
+    return shm.buf
+
+
+def _align(pos: int) -> int:
+    """
+    Helper method to round a position up to the array alignment.
+    """
+    return -(-pos // _ALIGNMENT) * _ALIGNMENT
+
+
+__all__ = ['SharedEmbeddings', 'share_embeddings', 'attach_embeddings']
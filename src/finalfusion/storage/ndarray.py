@@ -5,13 +5,14 @@ Finalfusion storage
 import struct
 from os import PathLike
 import sys
-from typing import BinaryIO, Tuple, Union, Iterator
+from typing import BinaryIO, Dict, Tuple, Union, Iterator, Optional
 
 import numpy as np
 
 from finalfusion.io import ChunkIdentifier, TypeId, FinalfusionFormatError, find_chunk, \
     _pad_float32, _read_required_binary, _write_binary, _serialize_array_as_le, \
-    _read_array_as_native
+    _read_array_as_native, _mmap_source, _PickledMmap
+from finalfusion.storage.quantized import PQ, QuantizedArray
 from finalfusion.storage.storage import Storage
 
 
@@ -21,6 +22,11 @@ class NdArray(np.ndarray, Storage):
 
     Wraps an numpy matrix, either in-memory or memory-mapped.
 
+    The matrix holds float32 or float16 values. float16 storage halves the size of the matrix in
+    memory and on disk. Rows that are retrieved through indexing or iteration are converted to
+    float32, so only the gathered rows are upcast and computations on them accumulate in
+    float32. Slicing keeps the float16 buffer.
+
     Examples
     --------
     >>> storage = NdArray(np.array([[1., 0.5], [0.5, 1.], [0.3, 0.4]],
@@ -37,6 +43,13 @@ class NdArray(np.ndarray, Storage):
     >>> # Indexing with arrays, lists or ints returns numpy.ndarray
     >>> storage[0]
     array([1. , 0.5], dtype=float32)
+    >>> # float16 storage returns float32 rows
+    >>> half = NdArray(storage.astype(np.float16))
+    >>> half.dtype
+    dtype('float16')
+    >>> half[[1, 2]]
+    array([[0.5       , 1.        ],
+           [0.30004883, 0.39990234]], dtype=float32)
     """
     def __new__(cls, array: np.ndarray):
         """
@@ -50,11 +63,11 @@ class NdArray(np.ndarray, Storage):
         Raises
         ------
         TypeError
-            If the array is not a 2-dimensional float32 array.
+            If the array is not a 2-dimensional float32 or float16 array.
         """
-        if not np.issubdtype(array.dtype, np.float32) or array.ndim != 2:
+        if array.dtype.type not in (np.float32, np.float16) or array.ndim != 2:
             raise TypeError(
-                f"expected 2-d float32 array, not {array.ndim}-d {array.dtype}"
+                f"expected 2-d float32 or float16 array, not {array.ndim}-d {array.dtype}"
             )
         return array.view(cls)
 
@@ -68,8 +81,8 @@ class NdArray(np.ndarray, Storage):
 
     @staticmethod
     def read_chunk(file: BinaryIO) -> 'NdArray':
-        rows, cols = NdArray._read_array_header(file)
-        array = _read_array_as_native(file, np.float32, rows * cols)
+        rows, cols, dtype = NdArray._read_array_header(file)
+        array = _read_array_as_native(file, dtype, rows * cols)
         array = np.reshape(array, (rows, cols))
         return NdArray(array)
 
@@ -82,23 +95,23 @@ class NdArray(np.ndarray, Storage):
         if sys.byteorder == "big":
             raise NotImplementedError(
                 "Memmapping arrays is not supported on big endian platforms")
-        rows, cols = NdArray._read_array_header(file)
+        rows, cols, dtype = NdArray._read_array_header(file)
         offset = file.tell()
-        file.seek(rows * cols * struct.calcsize('f'), 1)
+        file.seek(rows * cols * dtype.itemsize, 1)
         array = np.memmap(file.name,
-                          dtype='<f4',
+                          dtype=dtype.newbyteorder('<'),
                           mode='r',
                           offset=offset,
                           shape=(rows, cols))
         return NdArray(array)
 
     @staticmethod
-    def _read_array_header(file: BinaryIO) -> Tuple[int, int]:
+    def _read_array_header(file: BinaryIO) -> Tuple[int, int, np.dtype]:
         """
         Helper method to read the header of an NdArray chunk.
 
-        The method reads the shape tuple, verifies the TypeId and seeks the file to the start
-        of the array. The shape tuple is returned.
+        The method reads the shape tuple and the TypeId and seeks the file to the start
+        of the array. The shape and the data type of the array are returned.
 
         Parameters
         ----------
@@ -107,41 +120,198 @@ class NdArray(np.ndarray, Storage):
 
         Returns
         -------
-        shape : Tuple[int, int]
-            Shape of the storage.
+        header : Tuple[int, int, np.dtype]
+            Rows, columns and data type of the storage.
 
         Raises
         ------
         FinalfusionFormatError
-            If the TypeId does not match TypeId.f32
+            If the TypeId is neither TypeId.f32 nor TypeId.f16
         """
         rows, cols = _read_required_binary(file, "<QI")
-        type_id = TypeId(_read_required_binary(file, "<I")[0])
-        if TypeId.f32 != type_id:
+        type_id = _read_required_binary(file, "<I")[0]
+        if type_id not in _DTYPES:
             raise FinalfusionFormatError(
-                f"Invalid Type, expected {TypeId.f32}, got {type_id}")
+                f"Invalid Type, expected {TypeId.f32} or {TypeId.f16}, got {type_id}"
+            )
         file.seek(_pad_float32(file.tell()), 1)
-        return rows, cols
+        return rows, cols, _DTYPES[type_id]
 
     def write_chunk(self, file: BinaryIO):
         _write_binary(file, "<I", int(self.chunk_identifier()))
         padding = _pad_float32(file.tell())
-        chunk_len = struct.calcsize("<QII") + padding + struct.calcsize(
-            f'<{self.size}f')
+        chunk_len = struct.calcsize(
+            "<QII") + padding + self.size * self.dtype.itemsize
         # pylint: disable=unpacking-non-sequence
         rows, cols = self.shape
-        _write_binary(file, "<QQII", chunk_len, rows, cols, int(TypeId.f32))
+        type_id = TypeId.f16 if self.dtype == np.float16 else TypeId.f32
+        _write_binary(file, "<QQII", chunk_len, rows, cols, int(type_id))
         _write_binary(file, f"{padding}x")
         _serialize_array_as_le(file, self)
 
+    def quantize(  # pylint: disable=too-many-arguments
+            self,
+            n_subquantizers: Optional[int] = None,
+            n_centroids: int = 256,
+            n_iterations: int = 25,
+            sample_size: Optional[int] = None,
+            opq: bool = False,
+            normalize: bool = True,
+            n_threads: int = 1,
+            seed: Optional[int] = None) -> QuantizedArray:
+        """
+        Quantize the array.
+
+        Trains a product quantizer through :meth:`PQ.train` on a sample of the rows and
+        quantizes all rows with it. Rows are quantized in blocks and norms are computed in blocks.
+
+        The quantizer is trained on a float32 sample in memory. With the default ``sample_size``,
+        the sample is the full matrix: with ``normalize`` or float16 storage, the matrix is copied
+        once as a whole, otherwise memory-mapped arrays are paged in completely. Pass a
+        ``sample_size`` to bound the memory used for training.
+
+        If ``normalize`` is set, the rows are quantized as unit vectors and their norms are
+        stored in the QuantizedArray, reconstructed embeddings are scaled by these norms. This
+        typically reduces the reconstruction error of embeddings with varying norms.
+
+        Parameters
+        ----------
+        n_subquantizers : int, optional
+            Number of subquantizers, defaults to half the number of columns. Needs to divide
+            the number of columns.
+        n_centroids : int
+            Number of centroids per subquantizer, at most 256.
+        n_iterations : int
+            Number of k-means iterations. With ``opq``, the number of projection updates.
+        sample_size : int, optional
+            Number of rows the quantizer is trained on. Defaults to all rows.
+        opq : bool
+            Toggles training an optimized product quantizer with a projection.
+        normalize : bool
+            Toggles quantizing normalized rows and storing their norms.
+        n_threads : int
+            Number of threads used for training and quantization.
+        seed : int, optional
+            Seed for sampling rows and initializing centroids.
+
+        Returns
+        -------
+        quantized : QuantizedArray
+            The quantized array.
+
+        Raises
+        ------
+        ValueError
+            If the quantizer configuration is invalid, see :meth:`PQ.train`.
+
+        Examples
+        --------
+        >>> storage = NdArray(np.random.rand(100, 10).astype(np.float32))
+        >>> quantized = storage.quantize(n_subquantizers=5, n_centroids=16, seed=0)
+        >>> quantized.shape
+        (100, 10)
+        >>> quantized.quantized_len
+        5
+        """
+        if n_subquantizers is None:
+            n_subquantizers = max(1, self.shape[1] // 2)
+        rng = np.random.RandomState(seed)
+        norms = self._row_norms() if normalize else None
+        pq = PQ.train(self._training_sample(sample_size, norms, rng),
+                      n_subquantizers,
+                      n_centroids=n_centroids,
+                      n_iterations=n_iterations,
+                      opq=opq,
+                      n_threads=n_threads,
+                      seed=rng.randint(np.iinfo(np.int32).max))
+        return QuantizedArray(pq, self._quantize_rows(pq, norms, n_threads),
+                              norms)
+
+    def _row_norms(self) -> np.ndarray:
+        """
+        Helper method to compute the float32 l2 norms of all rows in blocks.
+        """
+        norms = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), _QUANTIZE_BLOCK_ROWS):
+            end = min(start + _QUANTIZE_BLOCK_ROWS, len(self))
+            block = self[start:end].view(np.ndarray).astype(np.float32,
+                                                            copy=False)
+            norms[start:end] = np.linalg.norm(block, axis=1)
+        return norms
+
+    def _quantize_rows(self, pq: PQ, norms: Optional[np.ndarray],
+                       n_threads: int) -> np.ndarray:
+        """
+        Helper method to quantize all rows in blocks, rows are divided by ``norms`` if given.
+        """
+        quantized = np.empty((len(self), len(pq.subquantizers)),
+                             dtype=np.uint8)
+        for start in range(0, len(self), _QUANTIZE_BLOCK_ROWS):
+            end = min(start + _QUANTIZE_BLOCK_ROWS, len(self))
+            block = self[start:end].view(np.ndarray)
+            if norms is not None:
+                block = block / _nonzero(norms[start:end, None])
+            quantized[start:end] = pq.quantize(block, n_threads=n_threads)
+        return quantized
+
+    def _training_sample(self, sample_size: Optional[int],
+                         norms: Optional[np.ndarray],
+                         rng: np.random.RandomState) -> np.ndarray:
+        """
+        Helper method to draw the rows that the quantizer is trained on.
+
+        Without ``norms``, the full matrix is returned as a view. With ``norms``, the sampled rows
+        are divided by their norms, which creates a single float32 copy of the sample.
+        """
+        matrix = self.view(np.ndarray)
+        if sample_size is not None and sample_size < len(self):
+            sample = np.sort(rng.choice(len(self), sample_size, replace=False))
+            matrix = matrix[sample]
+            if norms is not None:
+                norms = norms[sample]
+        if norms is not None:
+            matrix = matrix / _nonzero(norms[:, None])
+        return matrix
+
     def __getitem__(self, index) -> Union['NdArray', np.ndarray]:
         if isinstance(index, slice):
-            return super().__getitem__(index)
-        return np.ndarray.__getitem__(self, index).view(np.ndarray)
+            sliced = super().__getitem__(index)  # type: np.ndarray
+            return sliced
+        rows = np.ndarray.__getitem__(self, index).view(
+            np.ndarray)  # type: np.ndarray
+        if self.dtype == np.float16:
+            return rows.astype(np.float32)
+        return rows
 
     def __iter__(self) -> Iterator[np.ndarray]:
+        if self.dtype == np.float16:
+            return (row.astype(np.float32) for row in self.view(np.ndarray))
         return iter(self.view(np.ndarray))
 
+    def __reduce__(self):
+        # memory-mapped arrays are pickled as their file region and mapped again when unpickled
+        source = _mmap_source(self)
+        if source is None:
+            return super().__reduce__()
+        return NdArray, (_PickledMmap(source), )
+
+
+def _nonzero(norms: np.ndarray) -> np.ndarray:
+    """
+    Helper method to replace zero norms by one, so that zero vectors can be divided by their norm.
+    """
+    return np.where(norms == 0, 1, norms)
+
+
+# Data types of the storage buffer by their TypeId.
+_DTYPES = {
+    TypeId.f16: np.dtype(np.float16),
+    TypeId.f32: np.dtype(np.float32)
+}  # type: Dict[int, np.dtype]
+
+# Number of rows that are quantized at once.
+_QUANTIZE_BLOCK_ROWS = 65536
+
 
 def load_ndarray(file: Union[str, bytes, int, PathLike],
                  mmap: bool = False) -> NdArray:
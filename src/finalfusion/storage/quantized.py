@@ -8,13 +8,16 @@ the size of embedding matrices.
 
 import struct
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from os import PathLike
-from typing import Tuple, Optional, Union, BinaryIO, Iterator, Sequence, cast
+from typing import Tuple, Optional, Union, BinaryIO, Iterator, Sequence, List, cast
 
 import numpy as np
 
+from finalfusion._util import _kmeans, _nearest_centroids
 from finalfusion.io import _pad_float32, ChunkIdentifier, TypeId, FinalfusionFormatError, \
-    find_chunk, _read_required_binary, _write_binary, _serialize_array_as_le, _read_array_as_native
+    find_chunk, _read_required_binary, _write_binary, _serialize_array_as_le, \
+    _read_array_as_native, _pickle_array
 from finalfusion.storage.storage import Storage
 
 
@@ -56,6 +59,105 @@ class PQ:
                 0] == self._reconstructed_len == projection.shape[1]
         self._projection = projection
 
+    @staticmethod
+    def train(  # pylint: disable=too-many-arguments
+            data: np.ndarray,
+            n_subquantizers: int,
+            n_centroids: int = 256,
+            n_iterations: int = 25,
+            opq: bool = False,
+            n_threads: int = 1,
+            seed: Optional[int] = None) -> 'PQ':
+        """
+        Train a product quantizer.
+
+        The columns of ``data`` are split into ``n_subquantizers`` subspaces of equal size and
+        the centroids of each subspace are trained through k-means.
+
+        If ``opq`` is set, an optimized product quantizer is trained: the data is rotated by a
+        projection matrix that is initialized through eigenvalue allocation and refined by
+        alternating between k-means steps and solving the orthogonal Procrustes problem. This
+        usually reduces the reconstruction error, but every quantized vector has to be
+        projected during reconstruction.
+
+        Subquantizers are trained in parallel using ``n_threads`` threads.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            2-d float32 array holding the training vectors.
+        n_subquantizers : int
+            Number of subquantizers, needs to divide the number of columns.
+        n_centroids : int
+            Number of centroids per subquantizer, at most 256.
+        n_iterations : int
+            Number of k-means iterations. With ``opq``, the number of projection updates.
+        opq : bool
+            Toggles training an optimized product quantizer with a projection.
+        n_threads : int
+            Number of threads.
+        seed : int, optional
+            Seed for initializing centroids.
+
+        Returns
+        -------
+        pq : PQ
+            The trained product quantizer.
+
+        Raises
+        ------
+        ValueError
+            If the number of subquantizers does not divide the number of columns, the number of
+            centroids is not between 1 and 256 or exceeds the number of training vectors or if
+            ``n_threads`` is not positive.
+        """
+        n_rows, dims = data.shape
+        if n_subquantizers <= 0 or dims % n_subquantizers != 0:
+            raise ValueError(
+                f"n_subquantizers needs to divide dims ({dims}), not {n_subquantizers}"
+            )
+        if not 0 < n_centroids <= min(256, n_rows):
+            raise ValueError(
+                f"n_centroids needs to be between 1 and {min(256, n_rows)}, not {n_centroids}"
+            )
+        if n_threads <= 0:
+            raise ValueError(
+                f"n_threads needs to be positive, not {n_threads}")
+        data = np.asarray(data, dtype=np.float32)
+        rng = np.random.RandomState(seed)
+        with ThreadPoolExecutor(n_threads) as executor:
+            if not opq:
+                return PQ(
+                    _train_subquantizers(data, n_subquantizers, n_centroids,
+                                         n_iterations, rng, executor), None)
+            return _train_opq(data, n_subquantizers, n_centroids, n_iterations,
+                              rng, executor)
+
+    def quantize(self, vectors: np.ndarray, n_threads: int = 1) -> np.ndarray:
+        """
+        Quantize vectors.
+
+        Each subvector is assigned to the closest centroid of its subquantizer. Vectors are
+        projected first if the quantizer uses a projection.
+
+        Parameters
+        ----------
+        vectors : numpy.ndarray
+            2-d float32 array with ``reconstructed_len`` columns.
+        n_threads : int
+            Number of threads, subquantizers are assigned in parallel.
+
+        Returns
+        -------
+        quantized : numpy.ndarray
+            2-d uint8 array holding one centroid index per subquantizer and vector.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self._projection is not None:
+            vectors = vectors.dot(self._projection)
+        with ThreadPoolExecutor(n_threads) as executor:
+            return _quantize(self, vectors, executor)
+
     @property
     def n_centroids(self) -> int:
         """
@@ -109,6 +211,31 @@ class PQ:
         """
         return self._quantizers
 
+    def lookup_tables(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Compute lookup tables for asymmetric distance computation.
+
+        The tables hold the dot products of each query's subvectors with the centroids of the
+        corresponding subquantizer. The dot product of a query and a reconstructed vector is the
+        sum of the table entries of the vector's centroids. If the quantizer uses a projection,
+        the queries are projected into the quantized space first.
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            2-d float32 array of queries with ``reconstructed_len`` columns.
+
+        Returns
+        -------
+        tables : numpy.ndarray
+            3-d float32 array with shape ``(n_queries, n_subquantizers, n_centroids)``.
+        """
+        if self._projection is not None:
+            queries = queries.dot(self._projection)
+        n_subquantizers, _, sub_len = self._quantizers.shape
+        queries = queries.reshape(len(queries), n_subquantizers, sub_len)
+        return np.einsum('qsd,scd->qsc', queries, self._quantizers)
+
     def reconstruct(self, quantized: np.ndarray,
                     out: np.ndarray = None) -> np.ndarray:
         """
@@ -233,6 +360,31 @@ class QuantizedArray(Storage):
             return out
         return np.multiply(self._norms[key, None], out, out=out)
 
+    def lookup_dot(self, lookup_tables: np.ndarray) -> np.ndarray:
+        """
+        Compute the dot products of queries with all embeddings through lookup tables.
+
+        The embeddings are not reconstructed, each dot product is the sum of one table lookup
+        per subquantizer, scaled by the norm of the embedding.
+
+        Parameters
+        ----------
+        lookup_tables : numpy.ndarray
+            Lookup tables of the queries from :meth:`PQ.lookup_tables`.
+
+        Returns
+        -------
+        dot_products : numpy.ndarray
+            2-d float32 array with shape ``(n_queries, n_embeddings)``.
+        """
+        dots = np.zeros((len(self), len(lookup_tables)), dtype=np.float32)
+        for subquantizer, codes in enumerate(self._quantized_embeddings.T):
+            dots += np.ascontiguousarray(
+                lookup_tables[:, subquantizer].T)[codes]
+        if self._norms is not None:
+            dots *= self._norms[:, None]
+        return dots.T
+
     @property
     def quantized_len(self) -> int:
         """
@@ -258,6 +410,31 @@ class QuantizedArray(Storage):
         """
         return self._quantizer
 
+    @property
+    def quantized_embeddings(self) -> np.ndarray:
+        """
+        Get the quantized embeddings.
+
+        Returns
+        -------
+        quantized_embeddings : numpy.ndarray
+            2-d uint8 array with the centroid indices of each embedding.
+        """
+        return self._quantized_embeddings
+
+    @property
+    def norms(self) -> Optional[np.ndarray]:
+        """
+        Get the norms of the quantized embeddings.
+
+        Returns
+        -------
+        norms : numpy.ndarray, optional
+            The norms that reconstructed embeddings are scaled by, None if the embeddings are not
+            scaled.
+        """
+        return self._norms
+
     def __getitem__(self, key) -> Union[np.ndarray, 'QuantizedArray']:
         if key is None:
             raise TypeError("None is not a valid key.")
@@ -273,6 +450,11 @@ class QuantizedArray(Storage):
     def __iter__(self) -> Iterator[np.ndarray]:
         return map(self._quantizer.reconstruct, self._quantized_embeddings)
 
+    def __reduce__(self):
+        return QuantizedArray, (self._quantizer,
+                                _pickle_array(self._quantized_embeddings),
+                                _pickle_array(self._norms))
+
     def __len__(self) -> int:
         return len(self._quantized_embeddings)
 
@@ -387,6 +569,104 @@ class QuantizedArray(Storage):
         return quantizer, (n_embeddings, quantized_len), norms
 
 
+def _train_subquantizers(  # pylint: disable=too-many-arguments
+        data: np.ndarray,
+        n_subquantizers: int,
+        n_centroids: int,
+        n_iterations: int,
+        rng: np.random.RandomState,
+        executor: ThreadPoolExecutor,
+        quantizers: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Helper method to train the subquantizers on the subspaces of data in parallel.
+
+    Returns the quantizers as 3-d array with shape ``(n_subquantizers, n_centroids, sub_len)``.
+    If quantizers are passed, k-means starts from these centroids.
+    """
+    sub_len = data.shape[1] // n_subquantizers
+    seeds = rng.randint(np.iinfo(np.int32).max, size=n_subquantizers)
+
+    def train(subquantizer: int) -> np.ndarray:
+        sub_data = np.ascontiguousarray(
+            data[:, subquantizer * sub_len:(subquantizer + 1) * sub_len])
+        return _kmeans(
+            sub_data, n_centroids, n_iterations,
+            np.random.RandomState(seeds[subquantizer]),
+            None if quantizers is None else quantizers[subquantizer])
+
+    return np.stack(list(executor.map(train, range(n_subquantizers))))
+
+
+def _train_opq(  # pylint: disable=too-many-arguments
+        data: np.ndarray, n_subquantizers: int, n_centroids: int,
+        n_iterations: int, rng: np.random.RandomState,
+        executor: ThreadPoolExecutor) -> PQ:
+    """
+    Helper method to train an optimized product quantizer.
+
+    The projection is initialized through eigenvalue allocation, every iteration runs one
+    k-means step on the projected data and updates the projection.
+    """
+    projection = _eigenvalue_allocation(data, n_subquantizers)
+    quantizers = None
+    for _ in range(n_iterations):
+        projected = data.dot(projection)
+        quantizers = _train_subquantizers(projected, n_subquantizers,
+                                          n_centroids, 1, rng, executor,
+                                          quantizers)
+        pq = PQ(quantizers, None)
+        reconstructed = pq.reconstruct(_quantize(pq, projected, executor))
+        # orthogonal Procrustes: argmin_R |data R - reconstructed|
+        u, _, v_t = np.linalg.svd(data.T.dot(reconstructed))
+        projection = u.dot(v_t).astype(np.float32)
+    quantizers = _train_subquantizers(data.dot(projection), n_subquantizers,
+                                      n_centroids, 1, rng, executor,
+                                      quantizers)
+    return PQ(quantizers, projection)
+
+
+def _quantize(pq: PQ, projected: np.ndarray,
+              executor: ThreadPoolExecutor) -> np.ndarray:
+    """
+    Helper method to quantize projected vectors, subquantizers are assigned in parallel.
+    """
+    n_subquantizers, _, sub_len = pq.subquantizers.shape
+    quantized = np.empty((len(projected), n_subquantizers), dtype=np.uint8)
+
+    def assign(subquantizer: int):
+        sub_data = projected[:, subquantizer * sub_len:(subquantizer + 1) *
+                             sub_len]
+        quantized[:, subquantizer] = _nearest_centroids(
+            sub_data, pq.subquantizers[subquantizer])
+
+    # consume the iterator to propagate exceptions
+    list(executor.map(assign, range(n_subquantizers)))
+    return quantized
+
+
+def _eigenvalue_allocation(data: np.ndarray,
+                           n_subquantizers: int) -> np.ndarray:
+    """
+    Helper method to compute an initial OPQ projection.
+
+    The principal components are distributed over the subquantizers such that the product of
+    the variances in each subspace is balanced. Returns the projection matrix whose columns are
+    the principal components ordered by subspace.
+    """
+    eigenvalues, eigenvectors = np.linalg.eigh(np.cov(data, rowvar=False))
+    sub_len = data.shape[1] // n_subquantizers
+    subspaces = [[] for _ in range(n_subquantizers)]  # type: List[List[int]]
+    log_products = np.zeros(n_subquantizers)
+    for component in np.argsort(-eigenvalues):
+        log_products[[len(dims) == sub_len for dims in subspaces]] = np.inf
+        subspace = np.argmin(log_products)
+        subspaces[subspace].append(component)
+        log_products[subspace] += np.log(
+            max(eigenvalues[component],
+                np.finfo(np.float32).tiny))
+    return eigenvectors[:, np.concatenate(subspaces)].astype(np.float32)
+
+
 def load_quantized_array(file: Union[str, bytes, int, PathLike],
                          mmap: bool = False) -> QuantizedArray:
     """
@@ -1,4 +1,6 @@
-from typing import Any, Optional, List, Dict, Union, Tuple, Iterator
+from typing import Any, Optional, List, Dict, Union, Tuple, Iterator, Sequence
+
+import numpy as np
 
 
 def __pyx_unpickle_ExplicitIndexer(__pyx_type, long__pyx_checksum, __pyx_state) -> Any: ...
@@ -22,6 +24,8 @@ class ExplicitIndexer:
     def max_n(self) -> int: ...
     def subword_indices(self, word: str, offset: int = 0, bracket: bool = True, with_ngrams: bool = False)\
             -> List[Union[int, Tuple[str, int]]]: ...
+    def subword_indices_batch(self, words: Sequence[str], offset: int = 0, bracket: bool = True)\
+            -> Tuple[np.ndarray, np.ndarray]: ...
     def __call__(self, *args, **kwargs) -> Optional[int]: ...
     def __getitem__(self, ngram: str) -> int: ...
     def __iter__(self) -> Iterator[str]: ...
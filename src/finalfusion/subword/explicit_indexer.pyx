@@ -2,8 +2,11 @@
 # cython: embedsignature=True
 # cython: infer_types=True
 
+from itertools import chain
 from typing import List, Optional, Dict, Iterable
 
+import numpy as np
+
 from libc.stdint cimport uint32_t, uint64_t
 
 cdef class ExplicitIndexer:
@@ -174,6 +177,40 @@ cdef class ExplicitIndexer:
                         ngrams.append(idx + offset)
         return ngrams
 
+    def subword_indices_batch(self, words, uint64_t offset=0, bracket=True):
+        """
+        Get the subword indices for a batch of words.
+
+        The indices are returned in compressed sparse row format: the indices of ``words[i]``
+        are stored in ``indices[indptr[i]:indptr[i + 1]]`` in the same order as returned by
+        `subword_indices`.
+
+        Parameters
+        ----------
+        words : Sequence[str]
+            The strings to extract n-grams from
+        offset : int
+            The offset to add to the index, e.g. the length of the word-vocabulary.
+        bracket : bool
+            Toggles bracketing the input strings with `<` and `>`
+
+        Returns
+        -------
+        (indptr, indices) : Tuple[numpy.ndarray, numpy.ndarray]
+            Row pointers and n-gram indices, both as 1-d uint64 arrays.
+
+        Raises
+        ------
+        TypeError
+            If `words` contains None.
+        """
+        cdef list word_indices = [self.subword_indices(word, offset, bracket) for word in words]
+        indptr = np.zeros(len(word_indices) + 1, dtype=np.uint64)
+        np.cumsum(np.fromiter(map(len, word_indices), dtype=np.uint64, count=len(word_indices)),
+                  out=indptr[1:])
+        indices = np.fromiter(chain.from_iterable(word_indices), dtype=np.uint64, count=indptr[-1])
+        return indptr, indices
+
     def __getitem__(self, ngram: str) -> int:
         return self.ngram_index[ngram]
 
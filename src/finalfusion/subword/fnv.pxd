@@ -1,6 +1,6 @@
 from libc.stdint cimport uint32_t, uint64_t
 
-cdef extern from "fnv.h":
+cdef extern from "fnv.h" nogil:
     ctypedef uint64_t Fnv64_t;
     cdef Fnv64_t FNV1A_64_INIT;
     Fnv64_t fnv_64a_buf(void* buf, size_t len, Fnv64_t hashval);
@@ -1,4 +1,6 @@
-from typing import Any, List, Tuple, Union
+from typing import Any, List, Tuple, Union, Sequence
+
+import numpy as np
 
 
 def __pyx_unpickle_FastTextIndexer(__pyx_type, long__pyx_checksum, __pyx_state) -> Any: ...
@@ -9,6 +11,8 @@ class FastTextIndexer:
     def __init__(self, n_buckets: int = 2_000_000, min_n: int = 3, max_n: int = 6): ...
     def subword_indices(self, word: str, offset: int = 0, bracket: bool = True, with_ngrams: bool = False)\
             -> List[Union[int, Tuple[str, int]]]: ...
+    def subword_indices_batch(self, words: Sequence[str], offset: int = 0, bracket: bool = True)\
+            -> Tuple[np.ndarray, np.ndarray]: ...
     @property
     def upper_bound(self) -> int: ...
     @property
@@ -27,6 +31,8 @@ class FinalfusionHashIndexer:
     def __init__(self, bucket_exp: int = 21, min_n: int = 3, max_n: int = 6): ...
     def subword_indices(self, word: str, offset: int = 0, bracket: bool = True, with_ngrams: bool = False)\
             -> List[Union[int, Tuple[str, int]]]: ...
+    def subword_indices_batch(self, words: Sequence[str], offset: int = 0, bracket: bool = True)\
+            -> Tuple[np.ndarray, np.ndarray]: ...
     @property
     def upper_bound(self) -> int: ...
     @property
@@ -4,6 +4,9 @@
 cimport cython
 from cpython cimport array
 from libc.stdint cimport int8_t, uint8_t, uint32_t, uint64_t, UINT32_MAX
+from libc.stdlib cimport malloc, free
+
+import numpy as np
 
 from .fnv cimport Fnv64_t, FNV1A_64_INIT, fnv_64a_buf, Fnv32_t, FNV1_32_INIT
 from .endian cimport htole32, htole64
@@ -13,6 +16,7 @@ from .endian cimport htole32, htole64
 # cdef array.array result = array.array('Q')
 # array.resize(result, n_ngrams)
 # downside of this is returning an array in place of list. Speedup ~30%
+# subword_indices_batch follows this approach for batches of words and returns numpy arrays.
 
 cdef class FinalfusionHashIndexer:
     """
@@ -142,6 +146,66 @@ cdef class FinalfusionHashIndexer:
                         ngrams.append(h)
         return ngrams
 
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def subword_indices_batch(self, words, uint64_t offset=0, bracket=True):
+        """
+        Get the subword indices for a batch of words.
+
+        The indices are returned in compressed sparse row format: the indices of ``words[i]``
+        are stored in ``indices[indptr[i]:indptr[i + 1]]`` in the same order as returned by
+        `subword_indices`. The words are encoded in bulk, the n-grams are hashed without holding
+        the GIL.
+
+        Parameters
+        ----------
+        words : Sequence[str]
+            The strings to extract n-grams from
+        offset : int
+            The offset to add to the index, e.g. the length of the word-vocabulary.
+        bracket : bool
+            Toggles bracketing the input strings with `<` and `>`
+
+        Returns
+        -------
+        (indptr, indices) : Tuple[numpy.ndarray, numpy.ndarray]
+            Row pointers and n-gram indices, both as 1-d uint64 arrays.
+
+        Raises
+        ------
+        TypeError
+            If `words` contains None.
+        """
+        cdef list prepared = prepare_words(words, bracket)
+        cdef Py_ssize_t n_words = len(prepared)
+        # little endian UTF-32 code units are hashed directly, see fifu_hash_ngram
+        cdef bytes b_chars = "".join(prepared).encode("utf-32-le", errors="surrogatepass")
+        cdef const uint8_t* chars = b_chars
+        cdef uint64_t[::1] char_offsets = cumulative_lengths(prepared)
+        indptr = ngram_indptr(char_offsets, self._min_n, self._max_n)
+        indices = np.empty(indptr[n_words], dtype=np.uint64)
+        cdef uint64_t[::1] indices_view = indices
+        cdef uint64_t[::1] indptr_view = indptr
+        cdef Py_ssize_t i, j, k, start, length, pos
+        cdef uint32_t max_n
+        with nogil:
+            for k in range(n_words):
+                start = char_offsets[k]
+                length = char_offsets[k + 1] - start
+                pos = indptr_view[k]
+                if length < self._min_n:
+                    continue
+                max_n = min(length, self._max_n)
+                # iterate over starting points
+                for i in range(length + 1 - self._min_n):
+                    # iterate over ngram lengths, long to short
+                    for j in range(max_n, self._min_n - 1, -1):
+                        if j + i <= length:
+                            indices_view[pos] = (fifu_hash_utf32(chars + 4 * (start + i), j)
+                                                 & self.mask) + offset
+                            pos += 1
+        return indptr, indices
+
     def __eq__(self, other):
         return isinstance(other, FinalfusionHashIndexer) and \
                self.min_n == other.min_n and \
@@ -274,6 +338,75 @@ cdef class FastTextIndexer:
                         ngrams.append(h)
         return ngrams
 
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    @cython.cdivision(True)
+    def subword_indices_batch(self, words, uint64_t offset=0, bracket=True):
+        """
+        Get the subword indices for a batch of words.
+
+        The indices are returned in compressed sparse row format: the indices of ``words[i]``
+        are stored in ``indices[indptr[i]:indptr[i + 1]]`` in the same order as returned by
+        `subword_indices`. The words are encoded in bulk, the n-grams are hashed without holding
+        the GIL.
+
+        Parameters
+        ----------
+        words : Sequence[str]
+            The strings to extract n-grams from
+        offset : int
+            The offset to add to the index, e.g. the length of the word-vocabulary.
+        bracket : bool
+            Toggles bracketing the input strings with `<` and `>`
+
+        Returns
+        -------
+        (indptr, indices) : Tuple[numpy.ndarray, numpy.ndarray]
+            Row pointers and n-gram indices, both as 1-d uint64 arrays.
+
+        Raises
+        ------
+        TypeError
+            If `words` contains None.
+        """
+        cdef list prepared = prepare_words(words, bracket)
+        cdef Py_ssize_t n_words = len(prepared)
+        cdef list encoded = [word.encode("utf-8") for word in prepared]
+        cdef bytes b_words = b"".join(encoded)
+        cdef const uint8_t* b_words_ptr = b_words
+        cdef uint64_t[::1] char_offsets = cumulative_lengths(prepared)
+        cdef uint64_t[::1] byte_offsets = cumulative_lengths(encoded)
+        indptr = ngram_indptr(char_offsets, self._min_n, self._max_n)
+        indices = np.empty(indptr[n_words], dtype=np.uint64)
+        cdef uint64_t[::1] indices_view = indices
+        cdef uint64_t[::1] indptr_view = indptr
+        cdef Py_ssize_t max_bytes = max(map(len, encoded), default=0)
+        cdef unsigned int* boundaries = <unsigned int*> malloc((max_bytes + 1) * sizeof(unsigned int))
+        if boundaries == NULL:
+            raise MemoryError()
+        cdef Py_ssize_t i, j, k, length, pos
+        cdef const uint8_t* b_word
+        cdef uint32_t max_n
+        try:
+            with nogil:
+                for k in range(n_words):
+                    b_word = b_words_ptr + byte_offsets[k]
+                    length = char_offsets[k + 1] - char_offsets[k]
+                    pos = indptr_view[k]
+                    utf8_boundaries(b_word, byte_offsets[k + 1] - byte_offsets[k], boundaries)
+                    max_n = min(self._max_n, length)
+                    # iterate over starting points by character
+                    for i in range(length + 1 - self._min_n):
+                        # iterate over ngram lengths, long to short
+                        for j in range(max_n, self._min_n - 1, -1):
+                            if j + i <= length:
+                                indices_view[pos] = ft_hash_ngram(b_word, boundaries[i], boundaries[i + j]) \
+                                                    % self._n_buckets + offset
+                                pos += 1
+        finally:
+            free(boundaries)
+        return indptr, indices
+
     @property
     def upper_bound(self) -> int:
         return self._n_buckets
@@ -290,21 +423,70 @@ cdef class FastTextIndexer:
 
 
 cdef array.array find_utf8_boundaries(const uint8_t* w, const Py_ssize_t n_bytes):
-    cdef unsigned int b
-    cdef Py_ssize_t i = 0
-    cdef unsigned int mask = 0xC0
-    cdef unsigned int cont = 0x80
     cdef array.array offsets = array.array('I')
     # n_bytes + 1 to store n_bytes as final boundary
     array.resize(offsets, n_bytes + 1)
+    utf8_boundaries(w, n_bytes, offsets.data.as_uints)
+    return offsets
+
+cdef Py_ssize_t utf8_boundaries(const uint8_t* w, const Py_ssize_t n_bytes, unsigned int* offsets) noexcept nogil:
+    """
+    Write the byte offsets of the characters in w and n_bytes as final boundary to offsets.
+
+    offsets needs to hold at least n_bytes + 1 values. Returns the number of characters.
+    """
+    cdef Py_ssize_t b
+    cdef Py_ssize_t i = 0
+    cdef unsigned int mask = 0xC0
+    cdef unsigned int cont = 0x80
     for b in range(n_bytes):
         # byte w[b] is not a continuation byte, therefore beginning of char; store offset
         if (w[b] & mask) != cont:
-            offsets.data.as_uints[i] = b
+            offsets[i] = <unsigned int> b
             i += 1
-    offsets.data.as_uints[i] = <unsigned int> n_bytes
+    offsets[i] = <unsigned int> n_bytes
+    return i
+
+cdef list prepare_words(words, bracket):
+    """
+    Check the words and bracket them with `<` and `>` if requested.
+    """
+    cdef list prepared = []
+    cdef str word
+    for word in words:
+        if word is None:
+            raise TypeError("Can't extract ngrams for None type")
+        prepared.append(f"<{word}>" if bracket else word)
+    return prepared
+
+cdef cumulative_lengths(list items):
+    """
+    Get the cumulative lengths of items as uint64 array with a leading 0.
+    """
+    offsets = np.zeros(len(items) + 1, dtype=np.uint64)
+    np.cumsum(np.fromiter(map(len, items), dtype=np.uint64, count=len(items)), out=offsets[1:])
     return offsets
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef ngram_indptr(const uint64_t[::1] char_offsets, const uint32_t min_n, const uint32_t max_n):
+    """
+    Get the row pointers of the n-grams of words with the given character offsets.
+    """
+    cdef Py_ssize_t n_words = char_offsets.shape[0] - 1
+    indptr = np.zeros(n_words + 1, dtype=np.uint64)
+    cdef uint64_t[::1] indptr_view = indptr
+    cdef Py_ssize_t i, k, length
+    cdef uint64_t n_ngrams = 0
+    with nogil:
+        for k in range(n_words):
+            length = char_offsets[k + 1] - char_offsets[k]
+            # ngrams starting at i have lengths min_n..min(max_n, length - i)
+            for i in range(length + 1 - min_n):
+                n_ngrams += min(<Py_ssize_t> max_n, length - i) - <Py_ssize_t> min_n + 1
+            indptr_view[k + 1] = n_ngrams
+    return indptr
+
 cdef uint32_t PRIME32 = 16777619
 
 cdef uint64_t fifu_hash_ngram(str word, const Py_ssize_t start, const Py_ssize_t length):
@@ -321,7 +503,18 @@ cdef uint64_t fifu_hash_ngram(str word, const Py_ssize_t start, const Py_ssize_t
         h = fnv_64a_buf(&c, 4, h)
     return h
 
-cdef uint64_t ft_hash_ngram(const uint8_t* b_word, const Py_ssize_t start, const Py_ssize_t end):
+cdef uint64_t fifu_hash_utf32(const uint8_t* chars, const Py_ssize_t length) noexcept nogil:
+    """
+    Hash an n-gram of length characters given as little endian UTF-32 code units.
+
+    Equivalent to fifu_hash_ngram, which hashes the little endian code points one by one.
+    """
+    cdef Fnv64_t h = FNV1A_64_INIT
+    cdef uint64_t u_length = htole64(length)
+    h = fnv_64a_buf(<uint8_t*> &u_length, 8, h)
+    return fnv_64a_buf(<void*> chars, 4 * length, h)
+
+cdef uint64_t ft_hash_ngram(const uint8_t* b_word, const Py_ssize_t start, const Py_ssize_t end) noexcept nogil:
     cdef Py_ssize_t i
     cdef Fnv32_t h = FNV1_32_INIT
     # iterate over bytes in range start..end and hash each byte
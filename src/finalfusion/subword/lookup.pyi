@@ -0,0 +1,5 @@
+import numpy as np
+
+
+def sum_rows(matrix: np.ndarray, indptr: np.ndarray, indices: np.ndarray, normalize: np.ndarray,
+             out: np.ndarray) -> None: ...
@@ -0,0 +1,82 @@
+# cython: language_level=3
+# cython: embedsignature=True
+# cython: infer_types=True
+
+cimport cython
+from libc.math cimport sqrtf
+from libc.stdint cimport uint8_t, uint64_t
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def sum_rows(const float[:, ::1] matrix,
+             const uint64_t[::1] indptr,
+             const uint64_t[::1] indices,
+             const uint8_t[::1] normalize,
+             float[:, ::1] out):
+    """
+    Sum segments of matrix rows into an output matrix.
+
+    The row indices of the i-th segment are stored in ``indices[indptr[i]:indptr[i + 1]]``, their
+    rows are summed into ``out[i]``. If ``normalize[i]`` is set, the sum is l2-normalized. Rows
+    of ``out`` with empty segments are left untouched.
+
+    Rows are gathered and summed without holding the GIL, so concurrent calls from multiple
+    threads run in parallel.
+
+    Parameters
+    ----------
+    matrix : numpy.ndarray
+        C-contiguous float32 matrix to gather rows from.
+    indptr : numpy.ndarray
+        Segment pointers with ``len(out) + 1`` entries as uint64 array.
+    indices : numpy.ndarray
+        Row indices of the segments as uint64 array.
+    normalize : numpy.ndarray
+        Toggles l2-normalization of the sums as uint8 array with ``len(out)`` entries.
+    out : numpy.ndarray
+        C-contiguous float32 output matrix with as many columns as ``matrix``.
+
+    Raises
+    ------
+    ValueError
+        If the shapes of the arguments don't match or a row index is out of bounds.
+    """
+    cdef Py_ssize_t n_segments = out.shape[0]
+    cdef Py_ssize_t dims = out.shape[1]
+    if matrix.shape[1] != dims:
+        raise ValueError(f"matrix has {matrix.shape[1]} columns, out has {dims}")
+    if indptr.shape[0] != n_segments + 1 or normalize.shape[0] != n_segments:
+        raise ValueError(f"indptr and normalize need to describe {n_segments} segments")
+    if indptr[n_segments] > <uint64_t> indices.shape[0]:
+        raise ValueError("indptr points past the end of indices")
+    cdef uint64_t n_rows = matrix.shape[0]
+    cdef Py_ssize_t i, k
+    cdef uint64_t j, row
+    cdef float norm
+    cdef bint out_of_bounds = False
+    with nogil:
+        for i in range(n_segments):
+            if indptr[i] == indptr[i + 1]:
+                continue
+            out[i, :] = 0
+            for j in range(indptr[i], indptr[i + 1]):
+                row = indices[j]
+                if row >= n_rows:
+                    out_of_bounds = True
+                    break
+                for k in range(dims):
+                    out[i, k] += matrix[row, k]
+            if out_of_bounds:
+                break
+            if normalize[i]:
+                norm = 0
+                for k in range(dims):
+                    norm += out[i, k] * out[i, k]
+                norm = sqrtf(norm)
+                if norm > 0:
+                    for k in range(dims):
+                        out[i, k] /= norm
+    if out_of_bounds:
+        raise ValueError(f"row index out of bounds for matrix with {n_rows} rows")
+
+__all__ = ['sum_rows']
@@ -11,7 +11,8 @@ from finalfusion.vocab.subword import FinalfusionBucketVocab, load_finalfusion_b
 from finalfusion.vocab.vocab import Vocab
 
 
-def load_vocab(file: Union[str, bytes, int, PathLike]) -> Vocab:
+def load_vocab(file: Union[str, bytes, int, PathLike],
+               mmap: bool = False) -> Vocab:
     """
     Load any vocabulary from a finalfusion file.
 
@@ -27,6 +28,8 @@ def load_vocab(file: Union[str, bytes, int, PathLike]) -> Vocab:
     ----------
     file: str, bytes, int, PathLike
         Path to file containing a finalfusion vocab chunk.
+    mmap : bool
+        Toggles memory mapping the words of the vocabulary.
 
     Returns
     -------
@@ -47,13 +50,13 @@ def load_vocab(file: Union[str, bytes, int, PathLike]) -> Vocab:
         if chunk is None:
             raise ValueError('File did not contain a vocabulary')
         if chunk == ChunkIdentifier.SimpleVocab:
-            return SimpleVocab.read_chunk(inf)
+            return SimpleVocab.load(inf, mmap)
         if chunk == ChunkIdentifier.BucketSubwordVocab:
-            return FinalfusionBucketVocab.read_chunk(inf)
+            return FinalfusionBucketVocab.load(inf, mmap)
         if chunk == ChunkIdentifier.FastTextSubwordVocab:
-            return FastTextVocab.read_chunk(inf)
+            return FastTextVocab.load(inf, mmap)
         if chunk == ChunkIdentifier.ExplicitSubwordVocab:
-            return ExplicitVocab.read_chunk(inf)
+            return ExplicitVocab.load(inf, mmap)
         raise ValueError(f'Unexpected chunk type {chunk}.')
 
 
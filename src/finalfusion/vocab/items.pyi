@@ -0,0 +1,10 @@
+import mmap
+from typing import BinaryIO, Dict, List, Tuple, Union
+
+import numpy as np
+
+
+def read_items(file: BinaryIO, length: int) -> List[str]: ...
+def read_items_with_indices(file: BinaryIO, length: int) -> Tuple[List[str], Dict[str, int]]: ...
+def scan_items(buffer: Union[bytes, bytearray, memoryview, mmap.mmap], offset: int, length: int)\
+        -> Tuple[np.ndarray, np.ndarray, int]: ...
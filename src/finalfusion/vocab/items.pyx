@@ -0,0 +1,158 @@
+# cython: language_level=3
+# cython: embedsignature=True
+# cython: infer_types=True
+
+from libc.stdint cimport int64_t, uint32_t, uint64_t
+
+import numpy as np
+
+from finalfusion.io import FinalfusionFormatError
+
+# Number of bytes that are read from the file at once.
+cdef Py_ssize_t BLOCK_SIZE = 1 << 20
+
+def read_items(file, Py_ssize_t length):
+    """
+    Read the length-prefixed items of a vocabulary chunk.
+
+    The file is read in large blocks, length prefixes are parsed and items are decoded straight
+    from the block. Afterwards, the file is positioned after the last item.
+
+    Parameters
+    ----------
+    file : BinaryIO
+        Input file positioned before the first item.
+    length : int
+        Number of items to read.
+
+    Returns
+    -------
+    items : list
+        The decoded items.
+
+    Raises
+    ------
+    FinalfusionFormatError
+        If the file ends before all items were read.
+    """
+    items, _ = _read_items(file, length, False)
+    return items
+
+def read_items_with_indices(file, Py_ssize_t length):
+    """
+    Read the length-prefixed items of a vocabulary chunk that are each followed by an u64 index.
+
+    The file is read in large blocks, length prefixes and indices are parsed and items are
+    decoded straight from the block. Afterwards, the file is positioned after the last item.
+
+    Parameters
+    ----------
+    file : BinaryIO
+        Input file positioned before the first item.
+    length : int
+        Number of items to read.
+
+    Returns
+    -------
+    (items, index) : Tuple[list, dict]
+        The decoded items and the mapping from items to their indices.
+
+    Raises
+    ------
+    FinalfusionFormatError
+        If the file ends before all items were read.
+    """
+    return _read_items(file, length, True)
+
+def scan_items(const unsigned char[:] buffer, Py_ssize_t offset, Py_ssize_t length):
+    """
+    Find the length-prefixed items of a vocabulary chunk in a buffer.
+
+    Parameters
+    ----------
+    buffer : buffer
+        Buffer holding the vocabulary chunk, e.g. a memory-mapped file.
+    offset : int
+        Offset of the first item in the buffer.
+    length : int
+        Number of items.
+
+    Returns
+    -------
+    (starts, lengths, end) : Tuple[numpy.ndarray, numpy.ndarray, int]
+        The offsets and byte lengths of the items as int64 arrays and the offset after the last
+        item.
+
+    Raises
+    ------
+    FinalfusionFormatError
+        If the buffer ends before all items were found.
+    """
+    starts = np.empty(length, dtype=np.int64)
+    lengths = np.empty(length, dtype=np.int64)
+    cdef int64_t[:] starts_view = starts
+    cdef int64_t[:] lengths_view = lengths
+    cdef Py_ssize_t buffer_len = buffer.shape[0]
+    cdef Py_ssize_t pos = offset
+    cdef Py_ssize_t i
+    cdef uint32_t item_len
+    cdef bint truncated = False
+    with nogil:
+        for i in range(length):
+            if pos + 4 > buffer_len:
+                truncated = True
+                break
+            item_len = load_le32(&buffer[pos])
+            pos += 4
+            if pos + item_len > buffer_len:
+                truncated = True
+                break
+            starts_view[i] = pos
+            lengths_view[i] = item_len
+            pos += item_len
+    if truncated:
+        raise FinalfusionFormatError('Could not read vocabulary items')
+    return starts, lengths, pos
+
+cdef tuple _read_items(file, Py_ssize_t length, bint with_indices):
+    cdef list items = []
+    cdef dict index = {}
+    cdef bytes buffer = b""
+    cdef const char *data
+    cdef Py_ssize_t buffer_len = 0
+    cdef Py_ssize_t pos = 0
+    cdef Py_ssize_t n_items = 0
+    cdef Py_ssize_t record_len
+    cdef Py_ssize_t index_len = 8 if with_indices else 0
+    cdef uint32_t item_len
+    while n_items < length:
+        block = file.read(BLOCK_SIZE)
+        if not block:
+            raise FinalfusionFormatError('Could not read vocabulary items')
+        buffer = buffer[pos:] + block
+        data = buffer
+        buffer_len = len(buffer)
+        pos = 0
+        while n_items < length and pos + 4 <= buffer_len:
+            item_len = load_le32(<const unsigned char *> data + pos)
+            record_len = 4 + item_len + index_len
+            if pos + record_len > buffer_len:
+                break
+            item = data[pos + 4:pos + 4 + item_len].decode("utf-8")
+            items.append(item)
+            if with_indices:
+                index[item] = load_le64(<const unsigned char *> data + pos + 4 + item_len)
+            pos += record_len
+            n_items += 1
+    # return the bytes that were read past the last item
+    file.seek(pos - buffer_len, 1)
+    return items, index
+
+cdef inline uint32_t load_le32(const unsigned char *data) noexcept nogil:
+    return data[0] | (<uint32_t> data[1] << 8) | (<uint32_t> data[2] << 16) | \
+           (<uint32_t> data[3] << 24)
+
+cdef inline uint64_t load_le64(const unsigned char *data) noexcept nogil:
+    return load_le32(data) | (<uint64_t> load_le32(data + 4) << 32)
+
+__all__ = ['read_items', 'read_items_with_indices', 'scan_items']
@@ -3,11 +3,11 @@ Finalfusion SimpleVocab
 """
 import struct
 from os import PathLike
-from typing import List, Optional, Union, BinaryIO, Dict
+from typing import Optional, Union, BinaryIO, Sequence, Mapping
 
 from finalfusion.io import ChunkIdentifier, find_chunk, _write_binary, _read_required_binary
 from finalfusion.vocab.vocab import Vocab, _validate_items_and_create_index, _read_items,\
-    _write_words_binary
+    _write_words_binary, _mmap_items
 
 
 class SimpleVocab(Vocab):
@@ -17,7 +17,7 @@ class SimpleVocab(Vocab):
     SimpleVocabs provide a simple string to index mapping and index to string
     mapping.
     """
-    def __init__(self, words: List[str]):
+    def __init__(self, words: Sequence[str]):
         """
         Initialize a SimpleVocab.
 
@@ -40,11 +40,11 @@ class SimpleVocab(Vocab):
         self._words = words
 
     @property
-    def words(self) -> List[str]:
+    def words(self) -> Sequence[str]:
         return self._words
 
     @property
-    def word_index(self) -> Dict[str, int]:
+    def word_index(self) -> Mapping[str, int]:
         return self._index
 
     @property
@@ -55,12 +55,21 @@ class SimpleVocab(Vocab):
             ) -> Optional[Union[list, int]]:
         return self.word_index.get(item, default)
 
+    def __reduce__(self):
+        # the word index is rebuilt when unpickling
+        return SimpleVocab, (self.words, )
+
     @staticmethod
     def read_chunk(file: BinaryIO) -> 'SimpleVocab':
         length = _read_required_binary(file, "<Q")[0]
         words = _read_items(file, length)
         return SimpleVocab(words)
 
+    @staticmethod
+    def mmap_chunk(file: BinaryIO) -> 'SimpleVocab':
+        length = _read_required_binary(file, "<Q")[0]
+        return SimpleVocab(_mmap_items(file, length))
+
     def write_chunk(self, file: BinaryIO):
         _write_binary(file, "<I", int(self.chunk_identifier()))
         b_word_len_sum = sum(len(bytes(word, "utf-8")) for word in self.words)
@@ -76,7 +85,8 @@ class SimpleVocab(Vocab):
         return ChunkIdentifier.SimpleVocab
 
 
-def load_simple_vocab(file: Union[str, bytes, int, PathLike]) -> SimpleVocab:
+def load_simple_vocab(file: Union[str, bytes, int, PathLike],
+                      mmap: bool = False) -> SimpleVocab:
     """
     Load a SimpleVocab from the given finalfusion file.
 
@@ -84,6 +94,8 @@ def load_simple_vocab(file: Union[str, bytes, int, PathLike]) -> SimpleVocab:
     ----------
     file : str
         Path to file containing a SimpleVocab chunk.
+    mmap : bool
+        Toggles memory mapping the words.
 
     Returns
     -------
@@ -94,6 +106,8 @@ def load_simple_vocab(file: Union[str, bytes, int, PathLike]) -> SimpleVocab:
         chunk = find_chunk(inf, [ChunkIdentifier.SimpleVocab])
         if chunk is None:
             raise ValueError('File did not contain a SimpleVocab}')
+        if mmap:
+            return SimpleVocab.mmap_chunk(inf)
         return SimpleVocab.read_chunk(inf)
 
 
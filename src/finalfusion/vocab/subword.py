@@ -4,13 +4,20 @@ Finalfusion Subword Vocabularies
 
 import struct
 from abc import abstractmethod
+from itertools import chain
 from os import PathLike
-from typing import List, Optional, Tuple, Any, Union, Dict, BinaryIO, cast
+from typing import List, Optional, Tuple, Any, Union, Dict, BinaryIO, Sequence, Mapping, cast
+
+import numpy as np
 
 from finalfusion.io import ChunkIdentifier, find_chunk, _write_binary, _read_required_binary
 from finalfusion.subword import ExplicitIndexer, FastTextIndexer, FinalfusionHashIndexer, ngrams
 from finalfusion.vocab.vocab import Vocab, _validate_items_and_create_index, \
-    _calculate_binary_list_size, _write_words_binary, _read_items, _read_items_with_indices
+    _calculate_binary_list_size, _write_words_binary, _read_items, _read_items_with_indices, \
+    _mmap_items
+
+# Number of words whose n-grams are extracted at once by bucket to explicit conversion.
+_EXPLICIT_BATCH_WORDS = 65536
 
 
 class SubwordVocab(Vocab):
@@ -120,6 +127,42 @@ class SubwordVocab(Vocab):
                                                     bracket=bracket,
                                                     with_ngrams=with_ngrams)
 
+    def subword_indices_batch(self, items: Sequence[str], bracket: bool = True
+                              ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the subword indices for a batch of items.
+
+        The indices are returned in compressed sparse row format: the subword indices of
+        ``items[i]`` are stored in ``indices[indptr[i]:indptr[i + 1]]``. As for
+        :meth:`~SubwordVocab.subword_indices`, the indices of known items are not included.
+
+        Parameters
+        ----------
+        items : Sequence[str]
+            The query items.
+        bracket : bool
+            Toggles bracketing the items with '<' and '>' before extraction.
+
+        Returns
+        -------
+        (indptr, indices) : Tuple[np.ndarray, np.ndarray]
+            Row pointers with ``len(items) + 1`` entries and the concatenated subword indices,
+            both as 1-d uint64 arrays.
+
+        Examples
+        --------
+        >>> vocab = FinalfusionBucketVocab(["Some", "words"], FinalfusionHashIndexer(10))
+        >>> indptr, indices = vocab.subword_indices_batch(["on", "foo"])
+        >>> indptr
+        array([0, 3, 9], dtype=uint64)
+        >>> indices[indptr[1]:indptr[2]].tolist() == vocab.subword_indices("foo")
+        True
+        """
+        return self.subword_indexer.subword_indices_batch(items,
+                                                          offset=len(
+                                                              self.words),
+                                                          bracket=bracket)
+
     def __getitem__(self, item: str) -> Union[int, List[int]]:
         idx = self.word_index.get(item)
         if idx is not None:
@@ -141,13 +184,17 @@ class SubwordVocab(Vocab):
                self.subword_indexer == other.subword_indexer and \
                super(SubwordVocab, self).__eq__(other)
 
+    def __reduce__(self):
+        # the word index is rebuilt when unpickling
+        return type(self), (self.words, self.subword_indexer)
+
 
 class FinalfusionBucketVocab(SubwordVocab):
     """
     Finalfusion Bucket Vocabulary.
     """
     def __init__(self,
-                 words: List[str],
+                 words: Sequence[str],
                  indexer: Optional[FinalfusionHashIndexer] = None):
         """
         Initialize a FinalfusionBucketVocab.
@@ -198,13 +245,13 @@ class FinalfusionBucketVocab(SubwordVocab):
         explicit_vocab : ExplicitVocab
             The converted vocabulary.
         """
-        return _bucket_to_explicit(self)
+        return _bucket_to_explicit(self)[0]
 
     def write_chunk(self, file: BinaryIO):
         _write_bucket_vocab(file, self)
 
     @property
-    def words(self) -> List[str]:
+    def words(self) -> Sequence[str]:
         return self._words
 
     @property
@@ -212,7 +259,7 @@ class FinalfusionBucketVocab(SubwordVocab):
         return self._indexer
 
     @property
-    def word_index(self) -> Dict[str, int]:
+    def word_index(self) -> Mapping[str, int]:
         return self._index
 
     @staticmethod
@@ -222,6 +269,13 @@ class FinalfusionBucketVocab(SubwordVocab):
         indexer = FinalfusionHashIndexer(buckets, min_n, max_n)
         return FinalfusionBucketVocab(words, indexer)
 
+    @staticmethod
+    def mmap_chunk(file: BinaryIO) -> 'FinalfusionBucketVocab':
+        length, min_n, max_n, buckets = _read_required_binary(file, "<QIII")
+        words = _mmap_items(file, length)
+        indexer = FinalfusionHashIndexer(buckets, min_n, max_n)
+        return FinalfusionBucketVocab(words, indexer)
+
     @staticmethod
     def chunk_identifier() -> ChunkIdentifier:
         return ChunkIdentifier.BucketSubwordVocab
@@ -232,7 +286,7 @@ class FastTextVocab(SubwordVocab):
     FastText vocabulary
     """
     def __init__(self,
-                 words: List[str],
+                 words: Sequence[str],
                  indexer: Optional[FastTextIndexer] = None):
         """
         Initialize a FastTextVocab.
@@ -281,18 +335,18 @@ class FastTextVocab(SubwordVocab):
         explicit_vocab : ExplicitVocab
             The converted vocabulary.
         """
-        return _bucket_to_explicit(self)
+        return _bucket_to_explicit(self)[0]
 
     @property
     def subword_indexer(self) -> FastTextIndexer:
         return self._indexer
 
     @property
-    def word_index(self) -> Dict[str, int]:
+    def word_index(self) -> Mapping[str, int]:
         return self._index
 
     @property
-    def words(self) -> List[str]:
+    def words(self) -> Sequence[str]:
         return self._words
 
     @staticmethod
@@ -302,6 +356,13 @@ class FastTextVocab(SubwordVocab):
         indexer = FastTextIndexer(buckets, min_n, max_n)
         return FastTextVocab(words, indexer)
 
+    @staticmethod
+    def mmap_chunk(file: BinaryIO) -> 'FastTextVocab':
+        length, min_n, max_n, buckets = _read_required_binary(file, "<QIII")
+        words = _mmap_items(file, length)
+        indexer = FastTextIndexer(buckets, min_n, max_n)
+        return FastTextVocab(words, indexer)
+
     def write_chunk(self, file: BinaryIO):
         _write_bucket_vocab(file, self)
 
@@ -314,7 +375,7 @@ class ExplicitVocab(SubwordVocab):
     """
     A vocabulary with explicitly stored n-grams.
     """
-    def __init__(self, words: List[str], indexer: ExplicitIndexer):
+    def __init__(self, words: Sequence[str], indexer: ExplicitIndexer):
         """
         Initialize an ExplicitVocab.
 
@@ -345,7 +406,7 @@ class ExplicitVocab(SubwordVocab):
         self._indexer = indexer
 
     @property
-    def word_index(self) -> Dict[str, int]:
+    def word_index(self) -> Mapping[str, int]:
         return self._index
 
     @property
@@ -353,7 +414,7 @@ class ExplicitVocab(SubwordVocab):
         return self._indexer
 
     @property
-    def words(self) -> List[str]:
+    def words(self) -> Sequence[str]:
         return self._words
 
     @staticmethod
@@ -369,6 +430,21 @@ class ExplicitVocab(SubwordVocab):
         indexer = ExplicitIndexer(ngram_list, min_n, max_n, ngram_index)
         return ExplicitVocab(words, indexer)
 
+    @staticmethod
+    def mmap_chunk(file: BinaryIO) -> 'ExplicitVocab':
+        """
+        Memory map an ExplicitVocab chunk.
+
+        Only the words are memory mapped, the n-grams are read into an
+        :class:`.ExplicitIndexer`.
+        """
+        length, ngram_length, min_n, max_n = _read_required_binary(
+            file, "<QQII")
+        words = _mmap_items(file, length)
+        ngram_list, ngram_index = _read_items_with_indices(file, ngram_length)
+        indexer = ExplicitIndexer(ngram_list, min_n, max_n, ngram_index)
+        return ExplicitVocab(words, indexer)
+
     def write_chunk(self, file) -> None:
         chunk_length = _calculate_binary_list_size(self.words)
         chunk_length += _calculate_binary_list_size(
@@ -388,7 +464,8 @@ class ExplicitVocab(SubwordVocab):
             _write_binary(file, "<Q", self.subword_indexer.ngram_index[ngram])
 
 
-def load_finalfusion_bucket_vocab(file: Union[str, bytes, int, PathLike]
+def load_finalfusion_bucket_vocab(file: Union[str, bytes, int, PathLike],
+                                  mmap: bool = False
                                   ) -> FinalfusionBucketVocab:
     """
     Load a FinalfusionBucketVocab from the given finalfusion file.
@@ -398,6 +475,8 @@ def load_finalfusion_bucket_vocab(file: Union[str, bytes, int, PathLike]
     file : str, bytes, int, PathLike
         Path to file containing a FinalfusionBucketVocab chunk.
 
+    mmap : bool
+        Toggles memory mapping the words.
     Returns
     -------
     vocab : FinalfusionBucketVocab
@@ -407,11 +486,13 @@ def load_finalfusion_bucket_vocab(file: Union[str, bytes, int, PathLike]
         chunk = find_chunk(inf, [ChunkIdentifier.BucketSubwordVocab])
         if chunk is None:
             raise ValueError('File did not contain a FinalfusionBucketVocab}')
+        if mmap:
+            return FinalfusionBucketVocab.mmap_chunk(inf)
         return FinalfusionBucketVocab.read_chunk(inf)
 
 
-def load_fasttext_vocab(file: Union[str, bytes, int, PathLike]
-                        ) -> FastTextVocab:
+def load_fasttext_vocab(file: Union[str, bytes, int, PathLike],
+                        mmap: bool = False) -> FastTextVocab:
     """
     Load a FastTextVocab from the given finalfusion file.
 
@@ -420,6 +501,8 @@ def load_fasttext_vocab(file: Union[str, bytes, int, PathLike]
     file : str, bytes, int, PathLike
         Path to file containing a FastTextVocab chunk.
 
+    mmap : bool
+        Toggles memory mapping the words.
     Returns
     -------
     vocab : FastTextVocab
@@ -429,11 +512,13 @@ def load_fasttext_vocab(file: Union[str, bytes, int, PathLike]
         chunk = find_chunk(inf, [ChunkIdentifier.FastTextSubwordVocab])
         if chunk is None:
             raise ValueError('File did not contain a FastTextVocab}')
+        if mmap:
+            return FastTextVocab.mmap_chunk(inf)
         return FastTextVocab.read_chunk(inf)
 
 
-def load_explicit_vocab(file: Union[str, bytes, int, PathLike]
-                        ) -> ExplicitVocab:
+def load_explicit_vocab(file: Union[str, bytes, int, PathLike],
+                        mmap: bool = False) -> ExplicitVocab:
     """
     Load a ExplicitVocab from the given finalfusion file.
 
@@ -442,6 +527,8 @@ def load_explicit_vocab(file: Union[str, bytes, int, PathLike]
     file : str, bytes, int, PathLike
         Path to file containing a ExplicitVocab chunk.
 
+    mmap : bool
+        Toggles memory mapping the words.
     Returns
     -------
     vocab : ExplicitVocab
@@ -451,26 +538,44 @@ def load_explicit_vocab(file: Union[str, bytes, int, PathLike]
         chunk = find_chunk(inf, [ChunkIdentifier.ExplicitSubwordVocab])
         if chunk is None:
             raise ValueError('File did not contain a FastTextVocab}')
+        if mmap:
+            return ExplicitVocab.mmap_chunk(inf)
         return ExplicitVocab.read_chunk(inf)
 
 
 def _bucket_to_explicit(vocab: Union[FinalfusionBucketVocab, FastTextVocab]
-                        ) -> 'ExplicitVocab':
-    ngram_index = dict()
-    idx_index = dict()  # type: Dict[int, int]
-    ngram_list = []
-    for word in vocab.words:
-        token_ngrams = vocab.subwords(word)
-        for ngram in token_ngrams:
-            if ngram not in ngram_index:
-                ngram_list.append(ngram)
-                idx = vocab.subword_indexer(ngram)
-                if idx not in idx_index:
-                    idx_index[idx] = len(idx_index)
-                ngram_index[ngram] = idx_index[idx]
-    indexer = ExplicitIndexer(ngram_list, vocab.min_n, vocab.max_n,
-                              ngram_index)
-    return ExplicitVocab(vocab.words, indexer)
+                        ) -> Tuple['ExplicitVocab', np.ndarray]:
+    """
+    Convert a bucket vocab to an explicit vocab.
+
+    Returns the explicit vocab and the bucket of each of its n-gram indices. N-grams are
+    extracted and hashed in batches of words, n-grams and buckets keep the order of their first
+    occurrence.
+    """
+    ngram_buckets = dict()  # type: Dict[str, int]
+    indexer = vocab.subword_indexer
+    for start in range(0, len(vocab.words), _EXPLICIT_BATCH_WORDS):
+        words = vocab.words[start:start + _EXPLICIT_BATCH_WORDS]
+        _, buckets = indexer.subword_indices_batch(words)
+        batch_ngrams = chain.from_iterable(
+            ngrams(word, vocab.min_n, vocab.max_n) for word in words)
+        # n-grams that were seen before keep their position and bucket
+        ngram_buckets.update(zip(batch_ngrams, buckets.tolist()))
+    ngram_list = list(ngram_buckets)
+    buckets = np.fromiter(ngram_buckets.values(),
+                          dtype=np.uint64,
+                          count=len(ngram_list))
+    unique_buckets, first, inverse = np.unique(buckets,
+                                               return_index=True,
+                                               return_inverse=True)
+    # number the buckets by their first occurrence
+    order = np.argsort(first)
+    bucket_rank = np.empty_like(order)
+    bucket_rank[order] = np.arange(len(order))
+    ngram_index = dict(zip(ngram_list, bucket_rank[inverse].tolist()))
+    explicit_indexer = ExplicitIndexer(ngram_list, vocab.min_n, vocab.max_n,
+                                       ngram_index)
+    return ExplicitVocab(vocab.words, explicit_indexer), unique_buckets[order]
 
 
 def _write_bucket_vocab(file: BinaryIO,
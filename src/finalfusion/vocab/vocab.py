@@ -2,11 +2,16 @@
 Finalfusion Vocabulary interface
 """
 import abc
+import mmap
+import os
 import struct
 from typing import List, Optional, Dict, Tuple, BinaryIO, Iterable, Any, Union, Sequence, \
-    Iterator, Collection
+    Iterator, Collection, Mapping, overload
 
-from finalfusion.io import Chunk, _read_required_binary, _write_binary
+import numpy as np
+
+from finalfusion.io import Chunk, _write_binary
+from finalfusion.vocab.items import read_items, read_items_with_indices, scan_items
 
 
 class Vocab(Chunk, Collection[str]):
@@ -18,24 +23,24 @@ class Vocab(Chunk, Collection[str]):
     """
     @property
     @abc.abstractmethod
-    def words(self) -> List[str]:
+    def words(self) -> Sequence[str]:
         """
         Get the list of known words
 
         Returns
         -------
-        words : List[str]
+        words : Sequence[str]
             list of known words
         """
     @property
     @abc.abstractmethod
-    def word_index(self) -> Dict[str, int]:
+    def word_index(self) -> Mapping[str, int]:
         """
         Get the index of known words
 
         Returns
         -------
-        dict : Dict[str, int]
+        dict : Mapping[str, int]
             index of known words
         """
     @property
@@ -71,6 +76,69 @@ class Vocab(Chunk, Collection[str]):
             * A list if the vocab can provide subword indices for a unknown item.
             * The provided `default` item if the vocab can't provide indices.
         """
+    @classmethod
+    def load(  # pylint: disable=redefined-outer-name
+            cls,
+            file: BinaryIO,
+            mmap: bool = False) -> 'Vocab':
+        """
+        Load a vocabulary chunk.
+
+        Parameters
+        ----------
+        file : BinaryIO
+            Finalfusion file positioned after the header of the vocabulary chunk.
+        mmap : bool
+            Toggles memory mapping the words of the vocabulary.
+
+        Returns
+        -------
+        vocab : Vocab
+            The vocabulary.
+        """
+        return cls.mmap_chunk(file) if mmap else cls.read_chunk(file)
+
+    @staticmethod
+    @abc.abstractmethod
+    def read_chunk(file: BinaryIO) -> 'Vocab':
+        """
+        Read a vocabulary chunk.
+
+        Parameters
+        ----------
+        file : BinaryIO
+            Finalfusion file positioned after the header of the vocabulary chunk.
+
+        Returns
+        -------
+        vocab : Vocab
+            The vocabulary.
+        """
+    @classmethod
+    def mmap_chunk(cls, file: BinaryIO) -> 'Vocab':
+        """
+        Memory map a vocabulary chunk.
+
+        The words are not decoded while loading, they remain offsets into the memory-mapped
+        file and are decoded on access. Words are looked up through a table of word hashes that
+        is built on the first lookup. Since the memory map is read-only, its pages are shared
+        by all processes that map the file, e.g. forked workers.
+
+        Vocabularies that don't support memory mapping read the chunk through
+        :meth:`Vocab.read_chunk`.
+
+        Parameters
+        ----------
+        file : BinaryIO
+            Finalfusion file positioned after the header of the vocabulary chunk.
+
+        Returns
+        -------
+        vocab : Vocab
+            The vocabulary backed by a memory map of the file.
+        """
+        return cls.read_chunk(file)
+
     def __getitem__(self, item: str) -> Union[int, List[int]]:
         return self.word_index[item]
 
@@ -127,12 +195,7 @@ def _read_items(file: BinaryIO, length: int) -> List[str]:
     words : List[str]
         The word list
     """
-    items = []
-    for _ in range(length):
-        item_length = _read_required_binary(file, "<I")[0]
-        word = file.read(item_length).decode("utf-8")
-        items.append(word)
-    return items
+    return read_items(file, length)
 
 
 def _read_items_with_indices(file: BinaryIO,
@@ -152,26 +215,202 @@ def _read_items_with_indices(file: BinaryIO,
     words : List[str]
         The word list
     """
-    items = []
-    index = dict()
-    for _ in range(length):
-        item_length = _read_required_binary(file, "<I")[0]
-        item = file.read(item_length).decode("utf-8")
-        idx = _read_required_binary(file, "<Q")[0]
-        items.append(item)
-        index[item] = idx
-    return items, index
+    return read_items_with_indices(file, length)
+
+
+def _mmap_items(file: BinaryIO, length: int) -> '_MmapWords':
+    """
+    Helper method to memory map items of a vocabulary chunk.
+
+    The file is positioned after the items.
+
+    Parameters
+    ----------
+    file : BinaryIO
+        input file
+    length : int
+        number of items to map
+
+    Returns
+    -------
+    words : _MmapWords
+        The memory-mapped words
+    """
+    buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    offset = file.tell()
+    starts, lengths, end = scan_items(buffer, offset, length)
+    file.seek(end)
+    source = None
+    if isinstance(file.name, str):
+        source = os.path.abspath(file.name), offset
+    return _MmapWords(buffer, starts, lengths, source=source)
+
+
+def _reopen_items(path: str, offset: int, length: int) -> '_MmapWords':
+    """
+    Helper method to memory map the items at the given offset of a file again.
+    """
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        return _mmap_items(file, length)
+
+
+class _MmapWords(Sequence[str]):
+    """
+    Words of a memory-mapped vocabulary chunk.
+
+    The words are stored as offsets and lengths into the buffer and decoded on access. The buffer
+    is either a memory map or a uint8 array. The hash table used for lookups can be passed in if it
+    was built before.
+
+    If the path and offset of the items in a file are given as ``source``, the words are pickled
+    as a reference to the file and mapped again when unpickled.
+    """
+    def __init__(self,
+                 buffer: Union[mmap.mmap, np.ndarray],
+                 starts: np.ndarray,
+                 lengths: np.ndarray,
+                 table: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                 source: Optional[Tuple[str, int]] = None):
+        self._buffer = buffer
+        self._starts = starts
+        self._lengths = lengths
+        self._table = table
+        self._source = source
+
+    def item_bytes(self, idx: int) -> bytes:
+        """
+        Get the UTF-8 encoded word at the given index.
+        """
+        start = self._starts[idx]
+        return bytes(self._buffer[start:start + self._lengths[idx]])
+
+    def hashes(self) -> np.ndarray:
+        """
+        Compute the FNV-1a hashes of all words.
+
+        The hashes are computed column-wise over the bytes of all words that are long enough.
+        """
+        bytes_ = np.frombuffer(self._buffer, dtype=np.uint8)
+        hashes = np.full(len(self), _FNV1A_OFFSET, dtype=np.uint64)
+        active = np.arange(len(self))
+        pos = 0
+        while len(active) != 0:
+            active = active[self._lengths[active] > pos]
+            hashes[active] ^= bytes_[self._starts[active] + pos]
+            hashes[active] *= np.uint64(_FNV1A_PRIME)
+            pos += 1
+        return hashes
+
+    def hash_table(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the sorted word hashes and the word indices in hash order.
+
+        The table is built on the first call.
+        """
+        if self._table is None:
+            hashes = self.hashes()
+            order = np.argsort(hashes, kind="stable")
+            self._table = hashes[order], order
+        return self._table
+
+    @overload
+    def __getitem__(self, idx: int) -> str:
+        ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> List[str]:
+        ...
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return self.item_bytes(idx).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[idx] for idx in range(len(self)))
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Sequence) or len(self) != len(other):
+            return False
+        return all(word == other_word for word, other_word in zip(self, other))
+
+    def __reduce__(self):
+        if self._source is None:
+            return _MmapWords, (self._buffer, self._starts, self._lengths,
+                                self._table)
+        return _reopen_items, (*self._source, len(self))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(n_words={len(self)})"
+
+
+class _MmapWordIndex(Mapping[str, int]):
+    """
+    Word index of memory-mapped words.
+
+    Lookups hash the query and binary search the sorted word hashes, candidates with the same
+    hash are compared byte-wise. The hash table is built on the first lookup.
+    """
+    def __init__(self, words: _MmapWords):
+        self._words = words
+
+    def __getitem__(self, item: str) -> int:
+        if not isinstance(item, str):
+            raise KeyError(item)
+        try:
+            encoded = item.encode("utf-8")
+        except UnicodeEncodeError:
+            raise KeyError(item) from None
+        sorted_hashes, order = self._words.hash_table()
+        item_hash = np.uint64(_fnv1a(encoded))
+        pos = int(np.searchsorted(sorted_hashes, item_hash))
+        while pos < len(sorted_hashes) and sorted_hashes[pos] == item_hash:
+            if self._words.item_bytes(order[pos]) == encoded:
+                return int(order[pos])
+            pos += 1
+        raise KeyError(item)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._words)
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(n_words={len(self)})"
+
+
+def _fnv1a(data: bytes) -> int:
+    """
+    Helper method to compute the 64 bit FNV-1a hash of bytes.
+    """
+    hash_ = _FNV1A_OFFSET
+    for byte in data:
+        hash_ = ((hash_ ^ byte) * _FNV1A_PRIME) & 0xffffffffffffffff
+    return hash_
+
+
+_FNV1A_OFFSET = 0xcbf29ce484222325
+_FNV1A_PRIME = 0x100000001b3
 
 
-def _calculate_binary_list_size(items: List[str]):
+def _calculate_binary_list_size(items: Sequence[str]):
     size = sum(len(bytes(item, "utf-8")) for item in items)
     size += struct.calcsize("<Q")
     size += len(items) * struct.calcsize("<I")
     return size
 
 
-def _validate_items_and_create_index(items: Sequence[str]) -> Dict[str, int]:
-    index = dict((item, idx) for idx, item in enumerate(items))
+def _validate_items_and_create_index(items: Sequence[str]
+                                     ) -> Mapping[str, int]:
+    if isinstance(items, _MmapWords):
+        # memory-mapped words are indexed lazily and not checked for duplicates
+        return _MmapWordIndex(items)
+    index = dict(zip(items, range(len(items))))
     n_unique_items = len(index)
     assert len(items) == n_unique_items,\
         f"Vocab items cannot be duplicated. List: {len(items)}, Unique: {n_unique_items}"
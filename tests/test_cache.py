@@ -0,0 +1,99 @@
+import threading
+
+import numpy as np
+import pytest
+
+from finalfusion.cache import EmbeddingCache
+
+
+def test_cache_lru():
+    cache = EmbeddingCache(2, capacity=2)
+    cache.put("a", np.array([1, 0]), 1.)
+    cache.put("b", np.array([0, 1]), 2.)
+    assert cache.get("a")[1] == 1.
+    cache.put("c", np.array([1, 1]), 3.)
+    assert "b" not in cache
+    assert np.allclose(cache.get("a")[0], [1, 0])
+    out = np.zeros(2, dtype=np.float32)
+    embedding, norm = cache.get("c", out=out)
+    assert embedding is out
+    assert np.allclose(out, [1, 1])
+    assert norm == 3.
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.get("a") is None
+
+
+def test_cache_returns_copies():
+    cache = EmbeddingCache(2, capacity=1)
+    cache.put("a", np.array([1, 0]), 1.)
+    embedding, _ = cache.get("a")
+    embedding[:] = 5
+    assert np.allclose(cache.get("a")[0], [1, 0])
+
+
+def test_cache_size():
+    assert EmbeddingCache(3, memory_budget=160).capacity == 10
+    with pytest.raises(ValueError):
+        EmbeddingCache(3)
+    with pytest.raises(ValueError):
+        EmbeddingCache(3, capacity=10, memory_budget=160)
+    with pytest.raises(ValueError):
+        EmbeddingCache(3, memory_budget=10)
+    with pytest.raises(ValueError):
+        EmbeddingCache(0, capacity=10)
+
+
+def test_embeddings_oov_cache(bucket_vocab_embeddings_fifu):
+    embeds = bucket_vocab_embeddings_fifu
+    words = ["unknown", "words", "unknown", "again", "unknown"]
+    expected = [embeds.embedding_with_norm(word) for word in words]
+    embeds.oov_cache = EmbeddingCache(embeds.dims, capacity=1)
+    for word, (embedding, norm) in zip(words, expected):
+        cached_embedding, cached_norm = embeds.embedding_with_norm(word)
+        assert np.allclose(cached_embedding, embedding)
+        assert np.isclose(cached_norm, norm)
+        assert np.allclose(embeds[word], embedding)
+        assert np.allclose(embeds.embedding(word), embedding)
+    assert embeds.oov_cache.hits == 10
+    assert embeds.oov_cache.misses == 5
+    assert embeds.oov_cache.evictions == 4
+    known = embeds.vocab.words[0]
+    assert np.allclose(embeds[known], embeds.storage[0])
+    assert known not in embeds.oov_cache
+    embeds.oov_cache = None
+    assert embeds.oov_cache is None
+
+
+def test_embeddings_oov_cache_threads(bucket_vocab_embeddings_fifu):
+    embeds = bucket_vocab_embeddings_fifu
+    words = [f"oov{i}" for i in range(20)]
+    expected = np.array([embeds.embedding(word) for word in words])
+    embeds.oov_cache = EmbeddingCache(embeds.dims, capacity=8)
+    errors = []
+
+    def lookup():
+        for _ in range(10):
+            for word, embedding in zip(words, expected):
+                if not np.allclose(embeds.embedding(word), embedding):
+                    errors.append(word)
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    cache = embeds.oov_cache
+    assert cache.hits + cache.misses == 4 * 10 * len(words)
+
+
+def test_embeddings_oov_cache_errors(bucket_vocab_embeddings_fifu):
+    with pytest.raises(TypeError):
+        bucket_vocab_embeddings_fifu.oov_cache = {}
+    with pytest.raises(ValueError):
+        bucket_vocab_embeddings_fifu.oov_cache = EmbeddingCache(
+            bucket_vocab_embeddings_fifu.dims + 1, capacity=1)
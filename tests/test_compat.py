@@ -1,8 +1,17 @@
+import io
+import os
+import pickle
+import threading
+
 import numpy as np
+import pytest
 from finalfusion import Embeddings
+import finalfusion._util
+import finalfusion.compat.fasttext
+import finalfusion.compat.text
 
 from finalfusion.compat import write_word2vec, load_word2vec, write_text, write_text_dims, load_text, load_text_dims, \
-    write_fasttext, load_fasttext
+    write_fasttext, load_fasttext, load_text_stream
 from finalfusion.norms import Norms
 from finalfusion.storage import NdArray
 from finalfusion.vocab import SimpleVocab
@@ -16,6 +25,16 @@ def test_w2v_roundtrip(embeddings_w2v, tmp_path):
     assert np.allclose(w2v.storage, embeddings_w2v.storage)
 
 
+def test_w2v_truncated(tests_root, tmp_path):
+    with open(tests_root / "data" / "embeddings.w2v", "rb") as inf:
+        data = inf.read()
+    filename = tmp_path / "truncated.w2v"
+    with open(filename, "wb") as outf:
+        outf.write(data[:-5])
+    with pytest.raises(EOFError):
+        load_word2vec(filename)
+
+
 def test_bucket_to_w2v_roundtrip(bucket_vocab_embeddings_fifu, tmp_path):
     filename = tmp_path / "bucket_to_w2v.w2v"
     write_word2vec(filename, bucket_vocab_embeddings_fifu)
@@ -45,6 +64,112 @@ def test_textdims_roundtrip(embeddings_text_dims, tmp_path):
     assert np.allclose(text.storage, embeddings_text_dims.storage)
 
 
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_text_blocks(embeddings_text, embeddings_text_dims, tests_root,
+                     monkeypatch, n_workers):
+    monkeypatch.setattr(finalfusion.compat.text, "_TEXT_BLOCK_BYTES", 64)
+    text = load_text(tests_root / "data" / "embeddings.txt",
+                     n_workers=n_workers)
+    assert text.vocab == embeddings_text.vocab
+    assert np.allclose(text.storage, embeddings_text.storage)
+    assert np.allclose(text.norms, embeddings_text.norms)
+    text_dims = load_text_dims(tests_root / "data" / "embeddings.dims.txt",
+                               n_workers=n_workers)
+    assert text_dims.vocab == embeddings_text_dims.vocab
+    assert np.allclose(text_dims.storage, embeddings_text_dims.storage)
+    # the parallel matrix views shared memory, it can still be pickled
+    storage = pickle.loads(pickle.dumps(text_dims.storage))
+    assert np.allclose(storage, embeddings_text_dims.storage)
+
+
+def test_text_stream(embeddings_text, embeddings_text_dims, tests_root,
+                     monkeypatch):
+    monkeypatch.setattr(finalfusion.compat.text, "_TEXT_BLOCK_BYTES", 64)
+    with open(tests_root / "data" / "embeddings.txt", "rb") as inf:
+        text = load_text_stream(inf)
+    assert text.vocab == embeddings_text.vocab
+    assert np.allclose(text.storage, embeddings_text.storage)
+    assert np.allclose(text.norms, embeddings_text.norms)
+    with open(tests_root / "data" / "embeddings.dims.txt",
+              encoding="utf8") as inf:
+        lines = (line.rstrip("\n") for line in inf)
+        text_dims = load_text_stream(lines, dims=True)
+    assert text_dims.vocab == embeddings_text_dims.vocab
+    assert np.allclose(text_dims.storage, embeddings_text_dims.storage)
+    with pytest.raises(ValueError):
+        load_text_stream([])
+
+
+def test_text_pipe(embeddings_text, tests_root):
+    read_fd, write_fd = os.pipe()
+    with open(tests_root / "data" / "embeddings.txt", "rb") as inf:
+        data = inf.read()
+
+    def write():
+        with os.fdopen(write_fd, "wb") as outf:
+            outf.write(data)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    text = load_text(read_fd)
+    writer.join()
+    assert text.vocab == embeddings_text.vocab
+    assert np.allclose(text.storage, embeddings_text.storage)
+
+
+def test_text_stringio():
+    text = load_text_stream(io.StringIO("a 1 2\nb 3 4\n"))
+    assert text.vocab.words == ["a", "b"]
+    assert np.allclose(text.storage * text.norms[:, None], [[1, 2], [3, 4]])
+    text_dims = load_text_stream(io.StringIO("1 2\nä 0 2\n"), dims=True)
+    assert text_dims.vocab.words == ["ä"]
+    assert np.allclose(text_dims.norms, [2])
+
+
+def test_text_malformed(tmp_path):
+    filename = tmp_path / "malformed.txt"
+    filename.write_text("a 1 2\nb 3\n", encoding="utf8")
+    with pytest.raises(ValueError):
+        load_text(filename)
+    filename.write_text("2 2\na 1 2\n", encoding="utf8")
+    with pytest.raises(ValueError):
+        load_text_dims(filename)
+    with pytest.raises(ValueError):
+        load_text(filename, n_workers=0)
+    # the total number of components matches, but not the components per line
+    filename.write_text("a 1 2 3\nb 4 5\nc 6 7 8 9\n", encoding="utf8")
+    with pytest.raises(ValueError):
+        load_text(filename)
+    with pytest.raises(ValueError):
+        load_text_stream(["a 1 2 3", "b 4 5", "c 6 7 8 9"])
+    filename.write_text("a 1 2\nb 3 x\n", encoding="utf8")
+    with pytest.raises(ValueError):
+        load_text(filename)
+
+
+def test_text_shortest_repr(tmp_path):
+    matrix = np.array([[0.1, -2.5, 1e-8]], dtype=np.float32)
+    embeds = Embeddings(storage=NdArray(matrix), vocab=SimpleVocab(["a"]))
+    filename = tmp_path / "shortest.txt"
+    write_text(filename, embeds)
+    assert filename.read_text(encoding="utf8") == "a 0.1 -2.5 1e-08\n"
+
+
+def test_write_blocks_quantized(embeddings_pq_read, tmp_path, monkeypatch):
+    monkeypatch.setattr(finalfusion._util, "_WRITE_BLOCK_ROWS", 3)
+    storage = np.asarray(embeddings_pq_read.storage)
+    filename = tmp_path / "quantized.txt"
+    write_text_dims(filename, embeddings_pq_read)
+    text = load_text_dims(filename)
+    assert text.vocab == embeddings_pq_read.vocab
+    assert np.allclose(text.storage * text.norms[:, None], storage)
+    filename = tmp_path / "quantized.w2v"
+    write_word2vec(filename, embeddings_pq_read)
+    w2v = load_word2vec(filename)
+    assert w2v.vocab == embeddings_pq_read.vocab
+    assert np.allclose(w2v.storage * w2v.norms[:, None], storage)
+
+
 def test_nonascii_whitespace_text_roundtrip(tmp_path):
     vocab = ["\u00A0"]
     storage = np.ones((1, 5), dtype=np.float32)
@@ -61,7 +186,22 @@ def test_nonascii_whitespace_text_roundtrip(tmp_path):
     assert np.allclose(embeds.norms, text.norms)
 
 
-def test_fasttext_roundtrip(embeddings_ft, tmp_path):
+def test_fasttext_blocks(embeddings_ft, tests_root, monkeypatch):
+    monkeypatch.setattr(finalfusion.compat.fasttext, "_FT_VOCAB_BLOCK_BYTES",
+                        7)
+    monkeypatch.setattr(finalfusion.compat.fasttext, "_PRECOMPUTE_BLOCK_WORDS",
+                        10)
+    ft = load_fasttext(tests_root / "data" / "fasttext.bin", n_threads=2)
+    assert ft.vocab == embeddings_ft.vocab
+    assert np.allclose(ft.storage, embeddings_ft.storage)
+    assert np.allclose(ft.norms, embeddings_ft.norms)
+    with pytest.raises(ValueError):
+        load_fasttext(tests_root / "data" / "fasttext.bin", n_threads=0)
+
+
+@pytest.mark.parametrize("block_rows", [7, 8192])
+def test_fasttext_roundtrip(embeddings_ft, tmp_path, monkeypatch, block_rows):
+    monkeypatch.setattr(finalfusion._util, "_WRITE_BLOCK_ROWS", block_rows)
     filename = tmp_path / "ft_roundtrip.bin"
     write_fasttext(filename, embeddings_ft)
     ft = load_fasttext(filename)
@@ -1,13 +1,16 @@
+import pickle
 import sys
 
 import numpy as np
 import pytest
+import finalfusion.vocab.subword
 from finalfusion import load_finalfusion, Embeddings
+from finalfusion.cache import EmbeddingCache
 from finalfusion.io import FinalfusionFormatError
 from finalfusion.norms import Norms
-from finalfusion.storage import NdArray
-from finalfusion.subword import FinalfusionHashIndexer
-from finalfusion.vocab import SimpleVocab
+from finalfusion.storage import NdArray, QuantizedArray
+from finalfusion.subword import FinalfusionHashIndexer, ngrams
+from finalfusion.vocab import SimpleVocab, FinalfusionBucketVocab
 from finalfusion.metadata import Metadata
 
 TEST_NORMS = [
@@ -215,6 +218,39 @@ def test_buckets_to_explicit(bucket_vocab_embeddings_fifu):
             explicit.storage[2 + explicit_indexer(ngram)])
 
 
+def test_buckets_to_explicit_collisions(monkeypatch):
+    words = ["allerdings", "groß", "tübingen", "berlin", "dingsda"]
+    vocab = FinalfusionBucketVocab(words, FinalfusionHashIndexer(bucket_exp=4))
+    storage = NdArray(
+        np.arange(vocab.upper_bound * 3, dtype=np.float32).reshape(-1, 3))
+    # convert in several batches to check that ngrams and buckets keep their order across batches
+    monkeypatch.setattr(finalfusion.vocab.subword, "_EXPLICIT_BATCH_WORDS", 2)
+    explicit = Embeddings(storage, vocab).bucket_to_explicit()
+
+    # reference: ngrams in order of their first occurrence, colliding ngrams share the index of
+    # their bucket, buckets are numbered by their first occurrence
+    ngram_list, ngram_index, bucket_index = [], {}, {}
+    for word in words:
+        for ngram in ngrams(word, 3, 6):
+            if ngram in ngram_index:
+                continue
+            bucket = vocab.subword_indexer(ngram)
+            ngram_list.append(ngram)
+            ngram_index[ngram] = bucket_index.setdefault(
+                bucket, len(bucket_index))
+    assert len(bucket_index) < len(ngram_list)
+
+    indexer = explicit.vocab.subword_indexer
+    assert explicit.vocab.words == words
+    assert indexer.ngrams == ngram_list
+    assert indexer.ngram_index == ngram_index
+    assert explicit.vocab.upper_bound == len(words) + len(bucket_index)
+    assert np.array_equal(explicit.storage[:len(words)], storage[:len(words)])
+    for bucket, idx in bucket_index.items():
+        assert np.array_equal(explicit.storage[len(words) + idx],
+                              storage[len(words) + bucket])
+
+
 def test_buckets_to_explicit_roundtrip(bucket_vocab_embeddings_fifu, tmp_path):
     filename = tmp_path / "bucket_to_explicit_embeds.fifu"
     explicit = bucket_vocab_embeddings_fifu.bucket_to_explicit()
@@ -296,3 +332,140 @@ def test_embeddings_pq_roundtrip_mmap(pq_check, embeddings_pq_read, tmp_path):
     # iterates over the storage without converting to np.ndarray
     for a, b in zip(pq_check.storage, e2.storage):
         assert np.allclose(a, b, atol=0.05)
+
+
+def test_embedding_batch(embeddings_fifu, bucket_vocab_embeddings_fifu):
+    for embeds in (embeddings_fifu, bucket_vocab_embeddings_fifu):
+        words = embeds.vocab.words + ["OOV", "", "Tübingen"]
+        batch, mask = embeds.embedding_batch(words)
+        assert batch.shape == (len(words), embeds.dims)
+        for word, row, found in zip(words, batch, mask):
+            embed = embeds.embedding(word)
+            assert found == (embed is not None)
+            if embed is None:
+                assert np.allclose(row, 0)
+            else:
+                assert np.allclose(row, embed)
+
+
+def test_embedding_batch_out_default(bucket_vocab_embeddings_fifu):
+    words = ["", "OOV", bucket_vocab_embeddings_fifu.vocab.words[0]]
+    out = np.full((3, bucket_vocab_embeddings_fifu.dims), 5, dtype=np.float32)
+    out2, mask = bucket_vocab_embeddings_fifu.embedding_batch(words,
+                                                              out=out,
+                                                              default=1)
+    assert out is out2
+    assert mask.tolist() == [False, True, True]
+    assert np.allclose(out[0], 1)
+    assert np.allclose(out[1], bucket_vocab_embeddings_fifu.embedding("OOV"))
+    with pytest.raises(AssertionError):
+        bucket_vocab_embeddings_fifu.embedding_batch(words, out=out[:2])
+
+
+def test_embedding_batch_pq(embeddings_pq_read):
+    words = embeddings_pq_read.vocab.words[:10]
+    batch, mask = embeddings_pq_read.embedding_batch(words)
+    assert mask.all()
+    for word, row in zip(words, batch):
+        assert np.allclose(row, embeddings_pq_read.embedding(word))
+
+
+def test_embedding_batch_float16(bucket_vocab_embeddings_fifu):
+    embeds = bucket_vocab_embeddings_fifu
+    half = Embeddings(NdArray(embeds.storage.astype(np.float16)), embeds.vocab,
+                      embeds.norms)
+    words = embeds.vocab.words + ["OOV", "", "Tübingen"]
+    batch, mask = half.embedding_batch(words)
+    expected, expected_mask = embeds.embedding_batch(words)
+    assert batch.dtype == np.float32
+    assert np.array_equal(mask, expected_mask)
+    assert np.allclose(batch, expected, atol=1e-3)
+    for word, row, found in zip(words, batch, mask):
+        if found:
+            embed = half.embedding(word)
+            assert embed.dtype == np.float32
+            assert np.allclose(row, embed)
+    assert half.bucket_to_explicit().storage.dtype == np.float16
+    quantized = half.quantize(n_subquantizers=5, n_centroids=4, seed=0)
+    assert quantized.storage.norms.dtype == np.float32
+
+
+def test_quantize(embeddings_fifu, embeddings_pq_read, tmp_path):
+    quantized = embeddings_fifu.quantize(n_subquantizers=2,
+                                         n_centroids=4,
+                                         seed=0)
+    assert isinstance(quantized.storage, QuantizedArray)
+    assert quantized.vocab is embeddings_fifu.vocab
+    assert quantized.metadata is None
+    filename = tmp_path / "quantized.fifu"
+    quantized.write(filename)
+    loaded = load_finalfusion(filename)
+    assert np.allclose(np.asarray(loaded.storage),
+                       np.asarray(quantized.storage))
+    with pytest.raises(TypeError):
+        embeddings_pq_read.quantize()
+
+
+def test_embeddings_mmap_vocab(tests_root, embeddings_fifu):
+    embeds = load_finalfusion(tests_root / "data" / "embeddings.fifu",
+                              mmap=True,
+                              mmap_vocab=True)
+    assert embeds.vocab == embeddings_fifu.vocab
+    for word in embeddings_fifu.vocab:
+        assert np.allclose(embeds[word], embeddings_fifu[word])
+    assert embeds.embedding("unknown") is None
+    assert embeds.word_similarity("one", 3) == embeddings_fifu.word_similarity(
+        "one", 3)
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_pickle_embeddings(tests_root, embeddings_fifu, mmap):
+    embeds = load_finalfusion(tests_root / "data" / "embeddings.fifu",
+                              mmap=mmap,
+                              mmap_vocab=mmap,
+                              lazy=True)
+    embeds.oov_cache = EmbeddingCache(embeds.dims, capacity=2)
+    data = pickle.dumps(embeds)
+    if mmap:
+        assert embeds.storage.tobytes() not in data
+    unpickled = pickle.loads(data)
+    assert unpickled.vocab == embeddings_fifu.vocab
+    assert np.array_equal(unpickled.storage, embeddings_fifu.storage)
+    assert np.array_equal(unpickled.norms, embeddings_fifu.norms)
+    assert unpickled.metadata == embeddings_fifu.metadata
+    assert unpickled.origin == embeds.origin
+    assert unpickled.oov_cache.capacity == 2
+    assert len(unpickled.oov_cache) == 0
+    for word in embeddings_fifu.vocab:
+        assert np.allclose(unpickled[word], embeddings_fifu[word])
+
+
+def test_embeddings_lazy(tests_root, embeddings_fifu):
+    embeds = load_finalfusion(tests_root / "data" / "embeddings.fifu",
+                              lazy=True)
+    assert embeds._storage is None
+    assert embeds.vocab == embeddings_fifu.vocab
+    assert embeds._storage is None
+    for word in embeddings_fifu.vocab:
+        assert np.allclose(embeds[word], embeddings_fifu[word])
+    assert np.allclose(embeds.norms, embeddings_fifu.norms)
+    assert embeds.metadata == embeddings_fifu.metadata
+    assert embeds.similarity_index is None
+
+
+def test_embeddings_lazy_set_norms(tests_root, embeddings_fifu):
+    embeds = load_finalfusion(tests_root / "data" / "embeddings.fifu",
+                              mmap=True,
+                              lazy=True)
+    embeds.norms = None
+    assert embeds.norms is None
+    with pytest.raises(TypeError):
+        embeds.embedding_with_norm("one")
+    assert np.allclose(embeds["one"], embeddings_fifu["one"])
+
+
+def test_embeddings_lazy_without_storage(embeddings_fifu, tmp_path):
+    filename = tmp_path / "vocab.fifu"
+    embeddings_fifu.vocab.write(filename)
+    with pytest.raises(FinalfusionFormatError):
+        load_finalfusion(filename, lazy=True)
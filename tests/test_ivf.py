@@ -0,0 +1,173 @@
+import io
+import pickle
+import struct
+
+import numpy as np
+import pytest
+
+import finalfusion
+from finalfusion import Embeddings
+from finalfusion.io import FinalfusionFormatError, Header
+from finalfusion.ivf import IVFIndex, load_ivf_index
+from finalfusion.storage import NdArray
+from finalfusion.vocab import SimpleVocab
+
+
+def test_ivf_build(similarity_fifu):
+    index = IVFIndex.build(similarity_fifu.storage[:similarity_fifu.n_words],
+                           n_lists=5,
+                           seed=42)
+    assert index.n_lists == 5
+    assert index.n_probe == 5
+    assert index.n_rows == similarity_fifu.n_words
+    assert index.centroids.shape == (5, similarity_fifu.dims)
+    assert np.array_equal(np.sort(index.list_indices),
+                          np.arange(similarity_fifu.n_words))
+
+
+def test_ivf_exhaustive_probe(similarity_fifu):
+    exact = similarity_fifu.word_similarity("Berlin", 10)
+    exact_analogy = similarity_fifu.analogy("Berlin",
+                                            "Potsdam",
+                                            "Hamburg",
+                                            k=5)
+    similarity_fifu.similarity_index = IVFIndex.build(
+        similarity_fifu.storage[:similarity_fifu.n_words],
+        n_lists=5,
+        n_probe=5,
+        seed=42)
+    approx = similarity_fifu.word_similarity("Berlin", 10)
+    assert [r.word for r in approx] == [r.word for r in exact]
+    assert np.allclose([r.similarity for r in approx],
+                       [r.similarity for r in exact])
+    approx_analogy = similarity_fifu.analogy("Berlin",
+                                             "Potsdam",
+                                             "Hamburg",
+                                             k=5)
+    assert len(exact_analogy) == 5
+    assert [r.word for r in approx_analogy] == [r.word for r in exact_analogy]
+    assert similarity_fifu.similarity_index_recall(
+        similarity_fifu.storage[:10]) == 1.
+
+
+def test_ivf_recall():
+    rng = np.random.RandomState(0)
+    matrix = rng.standard_normal((2000, 16)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    embeds = Embeddings(NdArray(matrix),
+                        SimpleVocab([str(i) for i in range(2000)]))
+    embeds.similarity_index = IVFIndex.build(embeds.storage,
+                                             n_lists=32,
+                                             n_probe=1,
+                                             seed=0)
+    queries = matrix[:50]
+    low_recall = embeds.similarity_index_recall(queries, k=10)
+    embeds.similarity_index.n_probe = 8
+    high_recall = embeds.similarity_index_recall(queries, k=10)
+    assert 0 < low_recall < high_recall <= 1
+    words, sims = embeds.embedding_similarity_batch(queries,
+                                                    k=10,
+                                                    skips=[{str(i)}
+                                                           for i in range(50)])
+    assert words.shape == sims.shape == (50, 10)
+    assert all(str(i) not in words[i] for i in range(50))
+    assert np.all(np.diff(sims, axis=1) <= 0)
+
+
+def test_ivf_pq(tests_root):
+    embeds = finalfusion.load_finalfusion(tests_root / "data" / "pq.fifu")
+    exact = embeds.word_similarity("Berlin", 5)
+    embeds.similarity_index = IVFIndex.build(embeds.storage[:embeds.n_words],
+                                             n_lists=4,
+                                             n_probe=4,
+                                             seed=0)
+    assert [r.word for r in embeds.word_similarity("Berlin", 5)
+            ] == [r.word for r in exact]
+
+
+def test_ivf_fewer_candidates_than_k():
+    matrix = np.eye(4, dtype=np.float32)
+    embeds = Embeddings(NdArray(matrix), SimpleVocab(["a", "b", "c", "d"]))
+    embeds.similarity_index = IVFIndex.build(embeds.storage,
+                                             n_lists=4,
+                                             n_probe=1,
+                                             seed=0)
+    words, sims = embeds.embedding_similarity_batch(matrix[:1], k=3)
+    assert words[0, 0] == "a"
+    assert list(words[0, 1:]) == [None, None]
+    assert np.all(np.isneginf(sims[0, 1:]))
+
+
+def test_similarity_index_setter(similarity_fifu):
+    with pytest.raises(TypeError):
+        similarity_fifu.similarity_index = "index"
+    with pytest.raises(ValueError):
+        similarity_fifu.similarity_index = IVFIndex.build(
+            similarity_fifu.storage[:10], n_lists=2)
+    with pytest.raises(ValueError):
+        similarity_fifu.similarity_index_recall(similarity_fifu.storage[:10])
+    index = IVFIndex.build(similarity_fifu.storage[:similarity_fifu.n_words],
+                           n_lists=2)
+    similarity_fifu.similarity_index = index
+    assert similarity_fifu.similarity_index is index
+    similarity_fifu.similarity_index = None
+    assert similarity_fifu.similarity_index is None
+    with pytest.raises(ValueError):
+        index.n_probe = 0
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_ivf_write_read_roundtrip(similarity_fifu, tmp_path, mmap):
+    index = IVFIndex.build(similarity_fifu.storage[:similarity_fifu.n_words],
+                           n_lists=5,
+                           n_probe=2,
+                           seed=42)
+    similarity_fifu.similarity_index = index
+    filename = tmp_path / "similarity_ivf.fifu"
+    similarity_fifu.write(filename)
+    embeds = finalfusion.load_finalfusion(filename, mmap=mmap)
+    loaded = embeds.similarity_index
+    assert loaded.n_probe == 2
+    assert np.array_equal(loaded.centroids, index.centroids)
+    assert np.array_equal(loaded.list_indptr, index.list_indptr)
+    assert np.array_equal(loaded.list_indices, index.list_indices)
+    assert embeds.word_similarity("Berlin",
+                                  5) == similarity_fifu.word_similarity(
+                                      "Berlin", 5)
+    assert np.array_equal(
+        load_ivf_index(filename, mmap=mmap).list_indices, index.list_indices)
+    unpickled = pickle.loads(pickle.dumps(loaded))
+    assert unpickled.n_probe == 2
+    assert isinstance(unpickled.list_indices, np.memmap) == mmap
+    assert np.array_equal(unpickled.list_indices, index.list_indices)
+
+
+def test_ivf_read_invalid_type(similarity_fifu, tmp_path):
+    index = IVFIndex.build(similarity_fifu.storage[:similarity_fifu.n_words],
+                           n_lists=5,
+                           seed=42)
+    filename = tmp_path / "invalid_type.ivf"
+    with open(filename, "wb") as outf:
+        index.write_chunk(outf)
+    data = bytearray(filename.read_bytes())
+    # the type id of the centroids follows the chunk header, rows, lists, dims and probes
+    struct.pack_into("<I", data, 32, 42)
+    with pytest.raises(FinalfusionFormatError):
+        IVFIndex.read_chunk(io.BytesIO(bytes(data[12:])))
+
+
+def test_load_skips_unknown_chunks(similarity_fifu, tmp_path):
+    filename = tmp_path / "similarity_unknown.fifu"
+    chunks = similarity_fifu.chunks()
+    with open(filename, "wb") as outf:
+        Header([chunk.chunk_identifier()
+                for chunk in chunks] + [42]).write_chunk(outf)
+        for chunk in chunks:
+            chunk.write_chunk(outf)
+        outf.write(struct.pack("<IQ", 42, 3))
+        outf.write(b"abc")
+    embeds = finalfusion.load_finalfusion(filename)
+    assert embeds.similarity_index is None
+    assert np.allclose(embeds.storage, similarity_fifu.storage)
+    with pytest.raises(ValueError):
+        load_ivf_index(filename)
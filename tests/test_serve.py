@@ -0,0 +1,124 @@
+import asyncio
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from finalfusion.scripts.serve import EmbeddingServer
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 7),
+                                reason="ffp-serve requires Python 3.7")
+
+
+async def _request(port, method, path, body=None, length=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = b"" if body is None else json.dumps(body).encode("utf-8")
+    length = len(payload) if length is None else length
+    writer.write(f"{method} {path} HTTP/1.1\r\n"
+                 f"Content-Length: {length}\r\n"
+                 "Connection: close\r\n\r\n".encode("latin-1") + payload)
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def _serve(embeddings, requests, **kwargs):
+    async def run():
+        server = EmbeddingServer(embeddings, **kwargs)
+        listening = await server.start(port=0)
+        port = listening.sockets[0].getsockname()[1]
+        try:
+            return await asyncio.gather(*(_request(port, *request)
+                                          for request in requests))
+        finally:
+            listening.close()
+            await listening.wait_closed()
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+def test_serve_queries(analogy_fifu):
+    words = analogy_fifu.vocab.words
+    (lookup_status, lookup), (missing_status, _), (sim_status, sim), \
+        (analogy_status, analogy) = _serve(analogy_fifu, [
+            ("POST", "/lookup", {"word": words[0]}),
+            ("POST", "/lookup", {"word": "unknown"}),
+            ("POST", "/similarity", {"word": words[1], "k": 3}),
+            ("POST", "/analogy", {"words": words[:3], "k": 2}),
+        ])
+    assert lookup_status == 200
+    assert np.allclose(lookup["embedding"], analogy_fifu[words[0]])
+    assert missing_status == 404
+    assert sim_status == 200
+    expected = analogy_fifu.word_similarity(words[1], k=3)
+    assert [n["word"] for n in sim["neighbours"]] == [r.word for r in expected]
+    assert np.allclose([n["similarity"] for n in sim["neighbours"]],
+                       [r.similarity for r in expected])
+    assert analogy_status == 200
+    assert [n["word"] for n in analogy["neighbours"]
+            ] == [r.word for r in analogy_fifu.analogy(*words[:3], k=2)]
+
+
+def test_serve_concurrent_similarity(analogy_fifu):
+    words = analogy_fifu.vocab.words[:8]
+    results = _serve(analogy_fifu, [("POST", "/similarity", {
+        "word": word,
+        "k": 1 + i % 3
+    }) for i, word in enumerate(words)],
+                     max_wait=0.05)
+    for i, (word, (status, result)) in enumerate(zip(words, results)):
+        assert status == 200
+        assert [n["word"] for n in result["neighbours"]] == [
+            r.word for r in analogy_fifu.word_similarity(word, 1 + i % 3)
+        ]
+
+
+def test_serve_stats(analogy_fifu):
+    async def run():
+        server = EmbeddingServer(analogy_fifu, max_wait=0.05)
+        listening = await server.start(port=0)
+        port = listening.sockets[0].getsockname()[1]
+        try:
+            await asyncio.gather(
+                *(_request(port, "POST", "/lookup", {"word": word})
+                  for word in analogy_fifu.vocab.words[:8]))
+            return await _request(port, "GET", "/stats")
+        finally:
+            listening.close()
+            await listening.wait_closed()
+            await server.stop()
+
+    status, stats = asyncio.run(run())
+    assert status == 200
+    lookup = stats["endpoints"]["lookup"]
+    assert lookup["requests"] == 8
+    assert lookup["errors"] == 0
+    assert lookup["mean_batch_size"] > 1
+    assert 0 < lookup["latency_ms"]["p50"] <= lookup["latency_ms"]["max"]
+
+
+def test_serve_errors(analogy_fifu):
+    results = _serve(analogy_fifu, [
+        ("POST", "/lookup", {
+            "words": "a"
+        }),
+        ("POST", "/similarity", {
+            "word": "a",
+            "k": 0
+        }),
+        ("POST", "/analogy", {
+            "words": ["a", "b"]
+        }),
+        ("GET", "/lookup"),
+        ("POST", "/unknown", {}),
+        ("POST", "/lookup", {
+            "word": "a"
+        }, -1),
+    ])
+    assert [status for status, _ in results] == [400, 400, 400, 405, 404, 400]
+    assert all("error" in result for _, result in results)
+    with pytest.raises(ValueError):
+        EmbeddingServer(analogy_fifu, max_batch_size=0)
@@ -0,0 +1,106 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+SharedMemory = pytest.importorskip(
+    "multiprocessing.shared_memory").SharedMemory
+
+# pylint: disable=wrong-import-position
+from finalfusion.ivf import IVFIndex
+from finalfusion.shared import attach_embeddings, share_embeddings
+
+
+def _check_attached(embeds, attached):
+    assert type(attached.storage) == type(embeds.storage)
+    assert type(attached.vocab) == type(embeds.vocab)
+    assert attached.vocab == embeds.vocab
+    assert np.allclose(np.asarray(attached.storage),
+                       np.asarray(embeds.storage))
+    if embeds.norms is None:
+        assert attached.norms is None
+    else:
+        assert np.allclose(attached.norms, embeds.norms)
+    assert attached.metadata == embeds.metadata
+    for word in embeds.vocab.words[:10]:
+        assert attached.vocab.word_index[word] == embeds.vocab.word_index[word]
+        assert np.allclose(attached[word], embeds[word])
+    unknown = embeds.embedding("unknown-Ünicode")
+    if unknown is None:
+        assert attached.embedding("unknown-Ünicode") is None
+    else:
+        assert np.allclose(attached.embedding("unknown-Ünicode"), unknown)
+
+
+def test_share_embeddings(embeddings_fifu, bucket_vocab_embeddings_fifu,
+                          embeddings_w2v, embeddings_ft, embeddings_pq_read):
+    for embeds in [
+            embeddings_fifu, bucket_vocab_embeddings_fifu, embeddings_w2v,
+            embeddings_ft, embeddings_pq_read
+    ]:
+        with share_embeddings(embeds) as shared:
+            _check_attached(embeds, attach_embeddings(shared.name))
+
+
+def test_share_explicit_embeddings(bucket_vocab_embeddings_fifu):
+    embeds = bucket_vocab_embeddings_fifu.bucket_to_explicit()
+    with share_embeddings(embeds) as shared:
+        attached = attach_embeddings(shared.name)
+    _check_attached(embeds, attached)
+    assert attached.vocab.subword_indexer.ngram_index == \
+        embeds.vocab.subword_indexer.ngram_index
+
+
+def test_shared_embeddings_read_only(embeddings_fifu):
+    with share_embeddings(embeddings_fifu) as shared:
+        attached = attach_embeddings(shared.name)
+    assert not attached.storage.flags.writeable
+    assert not attached.norms.flags.writeable
+    with pytest.raises(ValueError):
+        attached.storage[0] = 0
+    storage = attached.storage
+    del attached
+    assert np.allclose(storage, embeddings_fifu.storage)
+
+
+def test_shared_similarity_index(similarity_fifu):
+    similarity_fifu.similarity_index = IVFIndex.build(similarity_fifu.storage,
+                                                      n_lists=4,
+                                                      n_probe=2,
+                                                      seed=42)
+    with share_embeddings(similarity_fifu) as shared:
+        attached = attach_embeddings(shared.name)
+    assert attached.similarity_index.n_probe == 2
+    assert attached.word_similarity("Berlin") == \
+        similarity_fifu.word_similarity("Berlin")
+
+
+def _attached_embedding(args):
+    name, word = args
+    return attach_embeddings(name)[word]
+
+
+def test_attach_from_workers(embeddings_fifu):
+    words = embeddings_fifu.vocab.words[:4]
+    with share_embeddings(embeddings_fifu) as shared:
+        with multiprocessing.Pool(2) as pool:
+            results = pool.map(_attached_embedding,
+                               [(shared.name, word) for word in words])
+    for word, result in zip(words, results):
+        assert np.allclose(result, embeddings_fifu[word])
+
+
+def test_attach_errors(embeddings_fifu):
+    with share_embeddings(embeddings_fifu) as shared:
+        name = shared.name
+        with pytest.raises(FileExistsError):
+            share_embeddings(embeddings_fifu, name=name)
+    with pytest.raises(FileNotFoundError):
+        attach_embeddings(name)
+    shm = SharedMemory(create=True, size=64)
+    try:
+        with pytest.raises(ValueError):
+            attach_embeddings(shm.name)
+    finally:
+        shm.close()
+        shm.unlink()
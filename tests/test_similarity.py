@@ -1,6 +1,10 @@
 import pytest
 import numpy
 
+from finalfusion import Embeddings, load_finalfusion
+from finalfusion.storage import NdArray
+from finalfusion.vocab import SimpleVocab
+
 SIMILARITY_ORDER_STUTTGART_10 = [
     "Karlsruhe",
     "Mannheim",
@@ -88,3 +92,91 @@ def test_embedding_similarity_incompatible_shapes(similarity_fifu):
     incompatible_embed = numpy.ones(1, dtype=numpy.float32)
     with pytest.raises(ValueError):
         similarity_fifu.embedding_similarity(incompatible_embed)
+
+
+@pytest.mark.parametrize("budget", [None, 1, 5000, 100000])
+def test_embedding_similarity_batch(similarity_fifu, budget, monkeypatch):
+    monkeypatch.setattr(similarity_fifu, "similarity_memory_budget", budget)
+    queries = ["Berlin", "Stuttgart"]
+    embeds, _ = similarity_fifu.embedding_batch(queries)
+    words, sims = similarity_fifu.embedding_similarity_batch(
+        embeds, k=40, skips=[{query} for query in queries])
+    assert words.shape == sims.shape == (2, 40)
+    assert words[0].tolist() == SIMILARITY_ORDER
+    assert words[1, :10].tolist() == SIMILARITY_ORDER_STUTTGART_10
+    for query, query_words, query_sims in zip(queries, words, sims):
+        expected = similarity_fifu.word_similarity(query, k=40)
+        assert numpy.allclose(query_sims, [r.similarity for r in expected])
+    words, sims = similarity_fifu.embedding_similarity_batch(embeds, k=1)
+    assert words.tolist() == [["Berlin"], ["Stuttgart"]]
+
+
+def test_embedding_similarity_batch_skip_all():
+    matrix = numpy.eye(3, dtype=numpy.float32)
+    embeds = Embeddings(NdArray(matrix), SimpleVocab(["a", "b", "c"]))
+    words, sims = embeds.embedding_similarity_batch(matrix[:1],
+                                                    k=5,
+                                                    skips=[{"b", "c"}])
+    assert words.tolist() == [["a", None, None]]
+    assert sims[0, 0] == 1
+    assert numpy.isneginf(sims[0, 1:]).all()
+
+
+def test_embedding_similarity_batch_incompatible_shapes(similarity_fifu):
+    with pytest.raises(ValueError):
+        similarity_fifu.embedding_similarity_batch(
+            numpy.ones(similarity_fifu.dims, dtype=numpy.float32))
+    with pytest.raises(ValueError):
+        similarity_fifu.embedding_similarity_batch(
+            numpy.ones((1, 1), dtype=numpy.float32))
+    with pytest.raises(ValueError):
+        similarity_fifu.embedding_similarity_batch(numpy.ones(
+            (2, similarity_fifu.dims), dtype=numpy.float32),
+                                                   skips=[set()])
+
+
+@pytest.mark.parametrize("budget", [1, 4096, None])
+def test_similarity_memory_budget(similarity_fifu, budget, monkeypatch):
+    monkeypatch.setattr(similarity_fifu, "similarity_memory_budget", budget)
+    assert similarity_fifu.similarity_memory_budget == budget
+    for idx, sim in enumerate(similarity_fifu.word_similarity("Berlin", 40)):
+        assert SIMILARITY_ORDER[idx] == sim.word
+    with pytest.raises(ValueError):
+        similarity_fifu.similarity_memory_budget = 0
+
+
+def test_similarity_memory_budget_pq(embeddings_pq_memmap, monkeypatch):
+    expected = embeddings_pq_memmap.word_similarity("Berlin", 20)
+    monkeypatch.setattr(embeddings_pq_memmap, "similarity_memory_budget", 4096)
+    result = embeddings_pq_memmap.word_similarity("Berlin", 20)
+    assert [r.word for r in result] == [r.word for r in expected]
+    assert numpy.allclose([r.similarity for r in result],
+                          [r.similarity for r in expected])
+
+
+def test_similarity_pq_lookup(embeddings_pq_read):
+    dense = Embeddings(NdArray(numpy.asarray(embeddings_pq_read.storage)),
+                       embeddings_pq_read.vocab)
+    for query in ["Berlin", "Stuttgart"]:
+        result = embeddings_pq_read.word_similarity(query, 10)
+        expected = dense.word_similarity(query, 10)
+        assert [r.word for r in result] == [r.word for r in expected]
+        assert numpy.allclose([r.similarity for r in result],
+                              [r.similarity for r in expected])
+
+
+def test_similarity_float16(similarity_fifu, tmp_path):
+    storage = similarity_fifu.storage
+    half = Embeddings(NdArray(storage.astype(numpy.float16)),
+                      similarity_fifu.vocab, similarity_fifu.norms)
+    half.write(tmp_path / "half.fifu")
+    half = load_finalfusion(tmp_path / "half.fifu", mmap=True)
+    assert half.storage.dtype == numpy.float16
+    results = half.word_similarity("Stuttgart", 10)
+    assert [r.word for r in results] == SIMILARITY_ORDER_STUTTGART_10
+    expected = similarity_fifu.word_similarity("Stuttgart", 10)
+    assert numpy.allclose([r.similarity for r in results],
+                          [r.similarity for r in expected],
+                          atol=1e-3)
+    _, sims = half.embedding_similarity_batch(half.storage[:2], k=1)
+    assert sims.dtype == numpy.float32
@@ -1,4 +1,5 @@
 import contextlib
+import pickle
 import sys
 import pytest
 import numpy as np
@@ -77,9 +78,34 @@ def test_from_matrix():
         _ = NdArray(np.tile(np.arange(0, 10), (10, 1)))
     with pytest.raises(TypeError):
         _ = NdArray(np.tile(np.arange(0, 10, dtype=np.float), (10, 1)))
+    assert NdArray(matrix.astype(np.float16)).dtype == np.float16
     assert np.allclose(matrix, s)
 
 
+@pytest.mark.parametrize("mmap", [False, True])
+def test_float16_roundtrip(tests_root, tmp_path, mmap):
+    if mmap and sys.byteorder == "big":
+        pytest.skip("MMap unsupported on BE")
+    filename = tmp_path / "write_half.fifu"
+    s = load_storage(tests_root / "data" / "embeddings.fifu")
+    s.write(tmp_path / "write_single.fifu")
+    half = NdArray(s.astype(np.float16))
+    half.write(filename)
+    assert filename.stat().st_size < (tmp_path /
+                                      "write_single.fifu").stat().st_size
+    s2 = load_storage(filename, mmap=mmap)
+    assert isinstance(s2, NdArray)
+    assert s2.dtype == np.float16
+    assert s2.shape == s.shape
+    assert np.array_equal(s2, half)
+    assert np.allclose(s2, s, atol=1e-3)
+    assert s2[0].dtype == np.float32
+    assert s2[[1, 2]].dtype == np.float32
+    assert s2[1:3].dtype == np.float16
+    assert all(row.dtype == np.float32 for row in s2)
+    assert np.allclose(np.array(list(s2)), half)
+
+
 def test_indexing():
     matrix = np.float32(
         np.random.random_sample(sorted(np.random.randint(10, 100, 2))))
@@ -234,3 +260,92 @@ def test_quantized_array_roundtrip(tests_root, tmp_path, pq_check):
     s2 = load_quantized_array(outfile)
     assert np.allclose(s, s2)
     assert np.allclose(s, pq_check.storage, atol=0.05)
+
+
+def test_quantized_array_lookup_dot(tests_root):
+    s = load_quantized_array(tests_root / "data" / "pq.fifu")
+    queries = np.random.rand(3, s.shape[1]).astype(np.float32)
+    tables = s.quantizer.lookup_tables(queries)
+    assert tables.shape == (3, s.quantized_len, s.quantizer.n_centroids)
+    assert np.allclose(s.lookup_dot(tables),
+                       queries.dot(np.asarray(s).T),
+                       atol=1e-5)
+    assert np.allclose(s[2:5].lookup_dot(tables),
+                       queries.dot(np.asarray(s[2:5]).T),
+                       atol=1e-5)
+
+
+@pytest.mark.parametrize("opq", [False, True])
+def test_quantize(tmp_path, opq):
+    rng = np.random.RandomState(42)
+    matrix = rng.standard_normal((500, 16)).astype(np.float32)
+    storage = NdArray(matrix)
+    quantized = storage.quantize(n_subquantizers=4,
+                                 n_centroids=64,
+                                 sample_size=400,
+                                 opq=opq,
+                                 n_threads=2,
+                                 seed=42)
+    assert quantized.shape == (500, 16)
+    assert quantized.quantized_len == 4
+    assert quantized.quantizer.n_centroids == 64
+    assert (quantized.quantizer.projection is not None) == opq
+    error = np.linalg.norm(np.asarray(quantized) -
+                           matrix) / np.linalg.norm(matrix)
+    assert error < 0.5
+    filename = tmp_path / "quantized.fifu"
+    quantized.write(filename)
+    assert np.allclose(load_quantized_array(filename), quantized)
+
+
+def test_quantize_normalize():
+    matrix = np.random.rand(100, 8).astype(np.float32)
+    matrix[3] = 0
+    quantized = NdArray(matrix).quantize(n_subquantizers=2,
+                                         n_centroids=16,
+                                         seed=0)
+    assert np.allclose(quantized.norms, np.linalg.norm(matrix, axis=1))
+    assert np.allclose(quantized[3], 0)
+    unnormalized = NdArray(matrix).quantize(n_subquantizers=2,
+                                            n_centroids=16,
+                                            normalize=False,
+                                            seed=0)
+    assert unnormalized.norms is None
+
+
+def test_quantize_invalid():
+    storage = NdArray(np.random.rand(100, 8).astype(np.float32))
+    with pytest.raises(ValueError):
+        storage.quantize(n_subquantizers=3)
+    with pytest.raises(ValueError):
+        storage.quantize(n_centroids=257)
+    with pytest.raises(ValueError):
+        storage.quantize(n_centroids=16, n_threads=0)
+
+
+@pytest.mark.skipif(sys.byteorder == "big", reason="MMap unsupported on BE")
+def test_pickle_mmap_array(tests_root):
+    s = load_ndarray(tests_root / "data" / "embeddings.fifu", mmap=True)
+    for storage in [s, s[2:5]]:
+        data = pickle.dumps(storage)
+        assert storage.tobytes() not in data
+        unpickled = pickle.loads(data)
+        assert isinstance(unpickled, NdArray)
+        assert isinstance(unpickled.base, np.memmap)
+        assert np.array_equal(unpickled, storage)
+    in_memory = pickle.loads(pickle.dumps(NdArray(np.array(s))))
+    assert isinstance(in_memory, NdArray)
+    assert np.array_equal(in_memory, s)
+
+
+@pytest.mark.skipif(sys.byteorder == "big", reason="MMap unsupported on BE")
+def test_pickle_quantized_array(tests_root):
+    s = load_quantized_array(tests_root / "data/pq.fifu", mmap=True)
+    data = pickle.dumps(s)
+    assert s.quantized_embeddings.tobytes() not in data
+    unpickled = pickle.loads(data)
+    assert isinstance(unpickled.quantized_embeddings, np.memmap)
+    assert np.array_equal(np.asarray(unpickled), np.asarray(s))
+    s = load_quantized_array(tests_root / "data/pq.fifu")
+    assert np.array_equal(np.asarray(pickle.loads(pickle.dumps(s))),
+                          np.asarray(s))
@@ -1,6 +1,8 @@
 import pytest
+import numpy
 
 from finalfusion.subword import ExplicitIndexer, FinalfusionHashIndexer, FastTextIndexer, ngrams
+from finalfusion.subword.lookup import sum_rows
 
 
 def test_subword_indices_finalfusion():
@@ -132,3 +134,50 @@ def test_explicit_assertions():
         ExplicitIndexer(["a", "b"], ngram_index={"a": 0, "b": 2})
     with pytest.raises(AssertionError):
         ExplicitIndexer(["a"], ngram_index={"a": 1})
+
+
+@pytest.mark.parametrize("indexer", [
+    FinalfusionHashIndexer(10),
+    FinalfusionHashIndexer(21, min_n=1, max_n=2),
+    FastTextIndexer(),
+    FastTextIndexer(100, min_n=1, max_n=8),
+    ExplicitIndexer(["<tü", "ber", "in>", "日本"], min_n=2),
+])
+def test_subword_indices_batch(indexer):
+    words = ["tübingen", "", "a", "Berlin", "日本語テキスト", "übersprüngen"]
+    for bracket in (True, False):
+        indptr, indices = indexer.subword_indices_batch(words,
+                                                        offset=7,
+                                                        bracket=bracket)
+        assert indptr.dtype == indices.dtype == numpy.uint64
+        assert len(indptr) == len(words) + 1
+        assert indptr[-1] == len(indices)
+        for i, word in enumerate(words):
+            assert indices[indptr[i]:indptr[i + 1]].tolist(
+            ) == indexer.subword_indices(word, offset=7, bracket=bracket)
+    indptr, indices = indexer.subword_indices_batch([])
+    assert indptr.tolist() == [0]
+    assert len(indices) == 0
+    with pytest.raises(TypeError):
+        _ = indexer.subword_indices_batch(["a", None])
+
+
+def test_sum_rows():
+    matrix = numpy.arange(12, dtype=numpy.float32).reshape(4, 3)
+    indptr = numpy.array([0, 1, 1, 4], dtype=numpy.uint64)
+    indices = numpy.array([2, 0, 1, 3], dtype=numpy.uint64)
+    normalize = numpy.array([0, 1, 1], dtype=numpy.uint8)
+    out = numpy.full((3, 3), -1, dtype=numpy.float32)
+    sum_rows(matrix, indptr, indices, normalize, out)
+    assert numpy.allclose(out[0], matrix[2])
+    assert numpy.allclose(out[1], -1)
+    expected = matrix[[0, 1, 3]].sum(0)
+    assert numpy.allclose(out[2], expected / numpy.linalg.norm(expected))
+    with pytest.raises(ValueError):
+        sum_rows(matrix, indptr, numpy.array([2, 0, 1, 4], dtype=numpy.uint64),
+                 normalize, out)
+    with pytest.raises(ValueError):
+        sum_rows(matrix, indptr[:-1], indices, normalize, out)
+    with pytest.raises(ValueError):
+        sum_rows(matrix, indptr, indices, normalize,
+                 numpy.zeros((3, 2), dtype=numpy.float32))
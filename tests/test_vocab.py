@@ -1,9 +1,13 @@
+import pickle
+
+import numpy as np
 import pytest
 import finalfusion.vocab
 
-from finalfusion.io import FinalfusionFormatError
+from finalfusion.io import FinalfusionFormatError, Header, _read_required_chunk_header
 from finalfusion.subword import FinalfusionHashIndexer, FastTextIndexer, ExplicitIndexer
-from finalfusion.vocab import FinalfusionBucketVocab, SimpleVocab, load_vocab, FastTextVocab, ExplicitVocab
+from finalfusion.vocab import FinalfusionBucketVocab, SimpleVocab, load_vocab, FastTextVocab, ExplicitVocab, \
+    Vocab
 
 
 def test_reading(tests_root):
@@ -174,3 +178,140 @@ def test_ff_buckets_lookup(tests_root):
         590, 648, 651, 707, 717, 761, 817, 820, 857, 860, 1007
     ]
     assert sorted(v.idx('tübingen')) == tuebingen_buckets
+
+
+def test_subword_indices_batch(tests_root):
+    vocab = load_vocab(tests_root / "data" / "ff_buckets.fifu")
+    explicit = vocab.to_explicit()
+    words = ["tübingen", "", "ab", "Berlin", vocab.words[0]]
+    for v in (vocab, explicit):
+        indptr, indices = v.subword_indices_batch(words)
+        assert indptr.dtype == indices.dtype == np.uint64
+        assert len(indptr) == len(words) + 1
+        assert indptr[-1] == len(indices)
+        for i, word in enumerate(words):
+            assert indices[indptr[i]:indptr[i +
+                                            1]].tolist() == v.subword_indices(
+                                                word)
+    indptr, indices = vocab.subword_indices_batch([])
+    assert indptr.tolist() == [0]
+    assert len(indices) == 0
+
+
+@pytest.mark.parametrize("vocab", [
+    SimpleVocab(["a", "groß", "tübingen", "", "ab"]),
+    FinalfusionBucketVocab(["a", "groß", "tübingen", "", "ab"]),
+    FastTextVocab(["a", "groß", "tübingen", "", "ab"]),
+    ExplicitVocab(["a", "groß", "tübingen", "", "ab"],
+                  ExplicitIndexer(["<gr", "ab>"]))
+])
+def test_mmap_vocab(vocab, tmp_path):
+    filename = tmp_path / "mmap_vocab.fifu"
+    vocab.write(filename)
+    mmap_vocab = load_vocab(filename, mmap=True)
+    assert type(mmap_vocab) == type(vocab)
+    assert mmap_vocab == vocab
+    assert list(mmap_vocab) == vocab.words
+    assert mmap_vocab.words[1:3] == ["groß", "tübingen"]
+    assert mmap_vocab.words[-1] == "ab"
+    for word in vocab.words:
+        assert mmap_vocab[word] == vocab[word]
+    assert mmap_vocab.word_index.get("b") is None
+    assert mmap_vocab.word_index.get("\udc00") is None
+    assert "b" not in mmap_vocab
+    assert mmap_vocab.idx("groß") == 1
+    assert mmap_vocab.idx("großer") == vocab.idx("großer")
+
+
+@pytest.mark.parametrize("vocab", [
+    SimpleVocab(["a", "groß", "tübingen", "", "ab"]),
+    FinalfusionBucketVocab(["a", "groß", "tübingen", "", "ab"]),
+    FastTextVocab(["a", "groß", "tübingen", "", "ab"]),
+    ExplicitVocab(["a", "groß", "tübingen", "", "ab"],
+                  ExplicitIndexer(["<gr", "ab>"]))
+])
+def test_pickle_vocab(vocab, tmp_path):
+    filename = tmp_path / "pickle_vocab.fifu"
+    vocab.write(filename)
+    mmap_vocab = load_vocab(filename, mmap=True)
+    data = pickle.dumps(mmap_vocab)
+    assert "tübingen".encode("utf-8") not in data
+    for pickled in [vocab, mmap_vocab]:
+        unpickled = pickle.loads(pickle.dumps(pickled))
+        assert type(unpickled) == type(vocab)
+        assert unpickled == vocab
+        assert unpickled["tübingen"] == 2
+        assert unpickled.idx("großer") == vocab.idx("großer")
+
+
+class _WrappedVocab(Vocab):
+    # a vocab outside of finalfusion that doesn't implement memory mapping
+    def __init__(self, inner: SimpleVocab):
+        self.inner = inner
+
+    @property
+    def words(self):
+        return self.inner.words
+
+    @property
+    def word_index(self):
+        return self.inner.word_index
+
+    @property
+    def upper_bound(self):
+        return self.inner.upper_bound
+
+    def idx(self, item, default=None):
+        return self.inner.idx(item, default)
+
+    @staticmethod
+    def chunk_identifier():
+        return SimpleVocab.chunk_identifier()
+
+    @staticmethod
+    def read_chunk(file):
+        return _WrappedVocab(SimpleVocab.read_chunk(file))
+
+    def write_chunk(self, file):
+        self.inner.write_chunk(file)
+
+
+def test_mmap_vocab_fallback(tmp_path):
+    filename = tmp_path / "fallback_vocab.fifu"
+    SimpleVocab(["a", "b"]).write(filename)
+    with open(filename, "rb") as inf:
+        Header.read_chunk(inf)
+        _read_required_chunk_header(inf)
+        vocab = _WrappedVocab.load(inf, mmap=True)
+    assert isinstance(vocab, _WrappedVocab)
+    assert vocab.words == ["a", "b"]
+
+
+def test_mmap_vocab_ff_buckets(tests_root):
+    v = load_vocab(tests_root / "data" / "ff_buckets.fifu")
+    mmap_vocab = load_vocab(tests_root / "data" / "ff_buckets.fifu", mmap=True)
+    assert mmap_vocab == v
+    assert all(mmap_vocab[word] == idx for idx, word in enumerate(v.words))
+    assert sorted(mmap_vocab.idx('tübingen')) == sorted(v.idx('tübingen'))
+
+
+def test_read_large_vocab(tmp_path):
+    # spans several read blocks
+    words = [f"wörter{i}" * (i % 7) + str(i) for i in range(100000)]
+    i = ExplicitIndexer(words[:50000])
+    v = ExplicitVocab(words, i)
+    filename = tmp_path / "large_vocab.fifu"
+    v.write(filename)
+    assert load_vocab(filename) == v
+    assert load_vocab(filename, mmap=True) == v
+
+
+def test_read_truncated_vocab(tmp_path):
+    filename = tmp_path / "truncated_vocab.fifu"
+    SimpleVocab([str(i) for i in range(100)]).write(filename)
+    with open(filename, "rb+") as f:
+        f.truncate(f.seek(0, 2) - 10)
+    with pytest.raises(FinalfusionFormatError):
+        load_vocab(filename)
+    with pytest.raises(FinalfusionFormatError):
+        load_vocab(filename, mmap=True)